@@ -1,10 +1,38 @@
+import argparse
+import array
+import atexit
+import bisect
+import collections
+import configparser
+import csv
+import glob
+import hashlib
+import heapq
+import ipaddress
+import itertools
+import json
 import math
+import multiprocessing
 import random
+import secrets
 import sys
 import os
+import pickle
+import queue
+import signal
+import socket
+import struct
+import subprocess
+import threading
+import time
+import zlib
+from multiprocessing import shared_memory
+from multiprocessing.managers import BaseManager
 
 import neat # type: ignore
 import pygame
+try: import numpy as np # Optional: vectorized map preprocessing, CarBatch engine and batched NN inference
+except ImportError: np = None
 
 # --- CONSTANTS ---
 WINDOW_WIDTH = 1600  # Increased
@@ -18,7 +46,7 @@ RIGHT_PANEL_AREA_WIDTH = 160
 GAME_AREA_WIDTH = WINDOW_WIDTH - GAME_AREA_X_OFFSET - RIGHT_PANEL_AREA_WIDTH
 GAME_AREA_HEIGHT = int(WINDOW_HEIGHT * 0.9); GAME_AREA_Y_OFFSET = (WINDOW_HEIGHT - GAME_AREA_HEIGHT) // 2
 CAR_SCALE_FACTOR = 0.8; CAR_SIZE_X = int(40 * CAR_SCALE_FACTOR); CAR_SIZE_Y = int(40 * CAR_SCALE_FACTOR)
-CAR_IMAGE_PATH = 'car1.png'; ORIGINAL_GAME_WIDTH_FOR_POS = 1280; ORIGINAL_GAME_HEIGHT_FOR_POS = 720
+CAR_IMAGE_PATH = 'car1.png'; MAP_IMAGE_PATH = 'map-d.png'; ORIGINAL_GAME_WIDTH_FOR_POS = 1280; ORIGINAL_GAME_HEIGHT_FOR_POS = 720
 INITIAL_POS_X_ORIGINAL = 660; INITIAL_POS_Y_ORIGINAL = 610
 INITIAL_POSITION = [
     int(INITIAL_POS_X_ORIGINAL * (GAME_AREA_WIDTH / ORIGINAL_GAME_WIDTH_FOR_POS)),
@@ -28,6 +56,9 @@ ANGLE_STEP = 10; ACTION_LABELS = ["Left", "Right", "Decelerate", "Accelerate"] #
 RADAR_ANGLES = [-90, -45, 0, 45, 90]
 MAX_RADAR_DISTANCE = int(200 * (GAME_AREA_WIDTH / ORIGINAL_GAME_WIDTH_FOR_POS) * 0.8)
 RADAR_NORMALIZATION_FACTOR = MAX_RADAR_DISTANCE
+RADAR_TABLE_ENABLED = False # --radar-table: read radars from a precomputed per-pixel/per-heading distance table
+RADAR_TABLE_HEADINGS = 72 # 5 degree heading quantization
+RADAR_TABLE_MAX_MEAN_ERROR = 0.03 * MAX_RADAR_DISTANCE # --check-radar-table tolerance vs the pixel-marching radar
 
 # --- COLOR CONSTANTS ---
 OBSTACLE_WHITE_MIN_RGB = (240, 240, 240)
@@ -37,18 +68,80 @@ FINISH_LINE_GREEN_COLOR_RGBA = (56, 111, 56, 255)
 ROAD_COLOR_RGBA = (0, 0, 0, 255)
 CENTER_LINE_COLOR_RGBA = (100, 100, 100, 255)
 
+# --- TERRAIN CODES (one uint8 per scaled map pixel, see TerrainGrid) ---
+TERRAIN_OUT_OF_BOUNDS = 0; TERRAIN_WALL = 1; TERRAIN_ROAD = 2
+TERRAIN_CENTER_LINE = 3; TERRAIN_FINISH_LINE = 4; TERRAIN_OTHER = 5
+
 BUTTON_COLOR = (40,45,70); BUTTON_HOVER_COLOR = (60,70,90); BUTTON_TEXT_COLOR = (200,220,255)
 RADAR_VIS_COLOR = (0,200,200); TEXT_COLOR = (200,200,220)
-INFO_TEXT_BACKGROUND_COLOR = (25,30,40,200); SELECTED_ACTION_COLOR = (0,255,150)
+INFO_TEXT_BACKGROUND_COLOR = (25,30,40,200); SELECTED_ACTION_COLOR = (0,255,150); WINDOW_BG_COLOR = (30,32,44)
 FPS = 60; GENERATION_TIME_LIMIT_SECONDS = 70; CONFIG_PATH = "./config.txt"
+ASSET_CACHE_DIR = ".asset_cache" # Derived map data (scaled pixels, terrain grid, radar tables), see AssetManager
 
 global_initial_speed = 5.0; global_min_speed = 2.0; global_max_speed = 10.0; global_speed_step = 1.5
 user_quit_simulation = False
 user_requested_speed_change = 0.0 # For button-based speed adjustments
+TIME_WARP_MODES = ["1", "4", "16", "max", "adaptive"] # Simulation steps per rendered frame (--time-warp, Time Warp +/- buttons)
+TIME_WARP_TARGET_FPS = 30 # adaptive: as many steps per frame as still hold this display FPS
+TIME_WARP_MAX_DISPLAY_FPS = 10 # max: redraw (and poll events) at least this often
+time_warp_mode = "1"
+RENDER_THREAD_ENABLED = False # --render-thread: step the simulation on its own thread, the window draws its latest SimulationSnapshot
+HEADLESS_MODE = False # --headless: no drawing, no display.flip, no clock.tick (SDL dummy video driver)
+HEADLESS_EVENT_POLL_INTERVAL = FPS # Headless runs only drain the event queue once per simulated second
+PHYSICS_ENGINE = "scalar" # --engine batch: step the whole population with CarBatch (NumPy)
+PARALLEL_WORKERS = 0 # --workers N: split each generation across N headless worker processes
+DISTRIBUTED_ADDRESS = None # --distributed HOST:PORT: serve each generation's batches to --worker processes over TCP
+DISTRIBUTED_AUTHKEY = None # --authkey: shared secret of the coordinator and its workers; a loopback coordinator without one generates and prints a random key
+DISTRIBUTED_AUTHKEY_ENV = "CAR_SIM_AUTHKEY" # --worker reads the key from this variable when --authkey is not given (how --local-workers get it, out of `ps`)
+DISTRIBUTED_LOCAL_WORKERS = 0 # --local-workers N: the coordinator also starts N --worker processes on this machine
+DISTRIBUTED_BATCH_SIZE = 16 # Genomes per distributed batch (one task on the queue)
+DISTRIBUTED_TASK_TIMEOUT_SECONDS = 300.0 # A batch without a result after this long is put back on the queue (lost worker)
+DISTRIBUTED_STRAGGLER_FACTOR = 3.0; DISTRIBUTED_STRAGGLER_MIN_SECONDS = 2.0 # ...or after this many times the slowest finished batch of the generation
+BATCHED_NN_ENABLED = True # BatchedNetworks whenever NumPy is available, --no-batched-nn for per-genome FeedForwardNetwork
+FITNESS_CACHE_ENABLED = True # --no-fitness-cache: re-simulate elites carried over unchanged instead of reusing their fitness (always re-simulated with --record)
+FITNESS_CACHE_SIZE = 4096 # FitnessCache entries (structural genome hash + simulation settings)
+COMPILED_NN_CACHE_SIZE = 4096 # CompiledNetworks kept by compile_genome (LRU, keyed by structural genome hash)
+MANUAL_REMOVAL_FITNESS = -1000.0 # Fitness of a car removed by clicking on it
+RECORD_TOP_K = 10 # --record-top K: cars per generation kept in the --record file, best fitness first (0 = every car)
+TRAJECTORY_CHUNK_FRAMES = FPS * 5 # Frames buffered per recorded chunk; recording memory is one chunk per recorder
+REPLAY_SPEEDS = [0.25, 0.5, 1, 2, 4, 8, 16, 32] # --replay playback speeds (Up/Down)
+REPLAY_SEEK_SECONDS = 5 # Left/Right in --replay
+STATS_LOG_PATH = "training_stats.jsonl" # --stats-log: one JSON line per generation, appended across runs ("" = keep only the in-memory window)
+STATS_WINDOW_GENERATIONS = 100 # Generation summaries StreamingStatsReporter keeps in memory
+STATS_LOG_BUFFER_BYTES = 64 * 1024; STATS_LOG_FLUSH_SECONDS = 30.0 # The log is written through this buffer and flushed at least this often
+CHECKPOINT_PATH = "checkpoint.bin" # --checkpoint: training state written atomically by TrainingCheckpointer, --resume reads it ("" = off)
+CHECKPOINT_EVERY_GENERATIONS = 5; CHECKPOINT_EVERY_SECONDS = 300.0 # A checkpoint is due after this many generations or seconds, whichever comes first
+BEST_GENOME_PATH = "best_genome.bin" # --export-best: best genome so far with its config, plus the compiled network as standalone .py ("" = off)
+PROFILER_ENABLED = False # --profile: per-phase timers (PhaseProfiler), stats panel overlay, --profile-output rows
+BENCHMARK_MAPS = ['map-d.png', 'map.png', 'map2.png', 'map12.png', 'map13.png'] # --benchmark: every case is map x population
+BENCHMARK_POPULATIONS = [50, 500, 5000]
+BENCHMARK_GENERATIONS = 2; BENCHMARK_SECONDS = 10; BENCHMARK_SEED = 0 # Generations per case, simulated seconds per generation
+BENCHMARK_REGRESSION_THRESHOLD = 0.10 # --bench-baseline fails if a case loses more than 10% car-steps/s
+BENCHMARK_ALLOC_CARS = 20; BENCHMARK_ALLOC_FRAMES = FPS # Scalar cars and traced frames of the --benchmark allocation check
+BENCHMARK_ALLOC_LIMIT_BYTES = 1024 # Traced growth/peak allowed while stepping them (a few recycled number objects; list-based cars needed ~4 KB)
+BENCHMARK_TRAJECTORY_CARS = 50; BENCHMARK_TRAJECTORY_MUTATIONS = 10 # --benchmark trajectory check: fixed-seed genomes and mutations each
+SWEEP_OUTPUT_DIR = "sweep_results" # --sweep-output: variant configs, per-run JSONL logs and summary.json of a --sweep
+SWEEP_GENERATIONS = 50; SWEEP_SECONDS = GENERATION_TIME_LIMIT_SECONDS # Defaults of a sweep spec's "generations" and "seconds_per_generation"
+# Module constants a sweep may override: only ones read at run time, nothing other constants were derived from at import
+SWEEP_FITNESS_CONSTANTS = ("DISTANCE_FITNESS_MULTIPLIER", "TIME_FITNESS_MULTIPLIER", "LANE_REWARD_FACTOR", "CENTER_LINE_PENALTY_FACTOR", "WRONG_LANE_PENALTY_FACTOR")
+BENCHMARK_NN_GENOMES = 100; BENCHMARK_NN_MUTATIONS = 20; BENCHMARK_NN_CALLS = 200 # --benchmark CompiledNetwork check: genomes, mutations each, timed calls per genome
+
+SIMULATION_DT = 1 # --dt N: frames of simulated time per physics step (N times fewer steps per simulated second)
+CONTROL_INTERVAL = 1 # --control-every N: physics steps per radar scan and NN decision
+SWEPT_COLLISION = False # --swept-collision (always on for --dt > 1): also check the corners between the old and the new pose
+COLLISION_MAX_STEP_PIXELS = 1.0 # Swept collision: no corner moves further than this between two checks (maps have 1px walls)
 
 STAGNATION_CHECK_INTERVAL = FPS // 2
 STAGNATION_THRESHOLD_DISTANCE = CAR_SIZE_X * 0.10
 STAGNATION_FRAMES_LIMIT = FPS * 25
+TRACK_PROGRESS_ENABLED = False # --track-progress: TrackProgressIndex per map, cars that stop advancing along the track are culled
+TRACK_PROGRESS_WINDOW_FRAMES = FPS * 3 # --progress-window: frames allowed without TRACK_PROGRESS_MIN_GAIN of new progress (0 = no limit)
+TRACK_PROGRESS_MIN_GAIN = CAR_SIZE_X * 0.5
+TRACK_BACKWARD_CULL_DISTANCE = CAR_SIZE_X * 3 # Cars this far behind their own best progress are driving backwards
+TRACK_BARRIER_OFFSET = 4; TRACK_BARRIER_WALL_THICKNESS = CAR_SIZE_X // 2 # Start line barrier for the progress BFS
+FITNESS_MODE = "distance" # --fitness progress: score best track progress instead of distance_driven
+EARLY_GENERATION_END = False # --end-when-beaten: end a generation once no live car can still beat its best fitness
+EARLY_END_PROGRESS_SLACK = 1.5 # Progress gained per frame can exceed the speed a little (pixel snapping, lane markings)
 
 DISTANCE_FITNESS_MULTIPLIER = 2.0; TIME_FITNESS_MULTIPLIER = 0.01
 LANE_REWARD_FACTOR = 0.025; CENTER_LINE_PENALTY_FACTOR = 0.018
@@ -62,7 +155,19 @@ CONNECTION_NEGATIVE_COLOR = (230,40,90); MAX_WEIGHT_FOR_THICKNESS = 2.5
 CONNECTION_MAX_THICKNESS = 5; CONNECTION_DASH_LEN = 5; CONNECTION_GAP_LEN = 3
 ARROW_COLOR = (220,220,240); ARROW_SIZE_FACTOR = 0.65
 ARROW_POINTS_UP_NORM = [(0,-0.5),(-0.35,0.25),(0,0.05),(0.35,0.25)]; ACTIVATION_THRESHOLD = 0.1
+NN_PANEL_CACHE_SIZE = 32 # Best-genome panels kept by NeatPanelCache (LRU)
 DEBUG_DRAW_CAR_CORNERS = True
+SPRITE_ATLAS_ANGLE_RESOLUTION = 1.0 # Degrees between pre-rotated car sprites (--sprite-angle-step)
+DIRTY_RECT_RENDERING = True # Windowed frames redraw and present only changed regions (FrameRenderer), --full-redraw to disable
+DIRTY_RECT_MAX_CAR_RECTS = 200 # Beyond this many car rects their bounding box is restored in one blit instead
+RENDER_LOD_TOP_K = 0 # --lod K: only the K fittest live cars and the selected one get sprite, radars and corners (0 = every car)
+RENDER_LOD_STYLE = "points" # --lod-style: the other cars as fitness-colored points, or one density "heatmap" blit
+LOD_POINT_SIZE = 3; LOD_POINT_COLOR_LOW = (200, 60, 60); LOD_POINT_COLOR_HIGH = (60, 230, 120) # Points are colored by fitness / best fitness
+LOD_HEATMAP_CELL = 8; LOD_HEATMAP_COLOR = (255, 170, 40) # Heatmap cell size in pixels; each car in a cell adds LOD_HEATMAP_ALPHA_STEP alpha
+LOD_HEATMAP_ALPHA_STEP = 64
+HIT_GRID_CELL_SIZE = max(CAR_SIZE_X, CAR_SIZE_Y) # CarHitGrid cells: a car rect overlaps at most four
+selected_car_key = None # Genome key of the car picked with a right click; --lod always draws it in full detail
+TEXT_SURFACE_CACHE_SIZE = 512 # Rendered HUD strings kept by render_text_cached (LRU)
 
 def is_color_in_range(pixel_rgba, min_rgb, max_rgb):
     r, g, b, _ = pixel_rgba
@@ -70,6 +175,202 @@ def is_color_in_range(pixel_rgba, min_rgb, max_rgb):
             min_rgb[1] <= g <= max_rgb[1] and
             min_rgb[2] <= b <= max_rgb[2])
 
+def classify_map_pixel(pixel_rgba):
+    # Same precedence as the old per-pixel probes: white obstacle, road, center line, finish line
+    if is_color_in_range(pixel_rgba, OBSTACLE_WHITE_MIN_RGB, OBSTACLE_WHITE_MAX_RGB): return TERRAIN_WALL
+    if tuple(pixel_rgba[0:3]) == ROAD_COLOR_RGBA[0:3]: return TERRAIN_ROAD
+    if tuple(pixel_rgba[0:3]) == CENTER_LINE_COLOR_RGBA[0:3]: return TERRAIN_CENTER_LINE
+    if tuple(pixel_rgba) == FINISH_LINE_GREEN_COLOR_RGBA: return TERRAIN_FINISH_LINE
+    return TERRAIN_OTHER
+
+class TerrainGrid:
+    """The scaled map classified once into one TERRAIN_* code per pixel (row-major bytearray).
+    Car probes read this grid instead of calling Surface.get_at every frame."""
+    def __init__(self, width, height, cells):
+        self.width, self.height, self.cells = width, height, cells
+        self.radar_table = None # Optional RadarTable, used by Car._update_radars when set
+        self.track_index = None # Optional TrackProgressIndex (--track-progress)
+        self.codes = np.frombuffer(cells, dtype=np.uint8).reshape(height, width) if np is not None else None
+
+    def codes_at(self, xs, ys):
+        # Vectorized at() for NumPy integer coordinate arrays
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        codes = np.full(xs.shape, TERRAIN_OUT_OF_BOUNDS, dtype=np.uint8)
+        codes[inside] = self.codes[ys[inside], xs[inside]]
+        return codes
+
+    def at(self, x, y):
+        if 0 <= x < self.width and 0 <= y < self.height: return self.cells[y * self.width + x]
+        return TERRAIN_OUT_OF_BOUNDS
+
+    @staticmethod
+    def from_surface(map_sfc):
+        width, height = map_sfc.get_size()
+        if np is None:
+            cells = bytearray(width * height)
+            for y in range(height):
+                row_start = y * width
+                for x in range(width): cells[row_start + x] = classify_map_pixel(map_sfc.get_at((x, y)))
+            return TerrainGrid(width, height, cells)
+        rgb = pygame.surfarray.array3d(map_sfc).transpose(1, 0, 2) # (w,h,3) -> (h,w,3)
+        alpha = pygame.surfarray.array_alpha(map_sfc).T
+        r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+        def rgb_equals(color): return (r == color[0]) & (g == color[1]) & (b == color[2])
+        is_wall = ((r >= OBSTACLE_WHITE_MIN_RGB[0]) & (r <= OBSTACLE_WHITE_MAX_RGB[0]) &
+                   (g >= OBSTACLE_WHITE_MIN_RGB[1]) & (g <= OBSTACLE_WHITE_MAX_RGB[1]) &
+                   (b >= OBSTACLE_WHITE_MIN_RGB[2]) & (b <= OBSTACLE_WHITE_MAX_RGB[2]))
+        codes = np.full((height, width), TERRAIN_OTHER, dtype=np.uint8)
+        # Assigned lowest precedence first so higher precedence classes overwrite
+        codes[rgb_equals(FINISH_LINE_GREEN_COLOR_RGBA) & (alpha == FINISH_LINE_GREEN_COLOR_RGBA[3])] = TERRAIN_FINISH_LINE
+        codes[rgb_equals(CENTER_LINE_COLOR_RGBA)] = TERRAIN_CENTER_LINE
+        codes[rgb_equals(ROAD_COLOR_RGBA)] = TERRAIN_ROAD
+        codes[is_wall] = TERRAIN_WALL
+        return TerrainGrid(width, height, bytearray(codes.tobytes()))
+
+class RadarTable:
+    """Distance to the nearest wall for every map pixel and RADAR_TABLE_HEADINGS quantized headings,
+    capped at MAX_RADAR_DISTANCE. Stored as a (headings, height, width) uint8 .npy in the asset cache
+    and memory mapped, so a radar reading is a single lookup instead of a pixel march."""
+    def __init__(self, distances):
+        self.distances = distances
+        self.num_headings = distances.shape[0]
+        self.heading_step = 360.0 / self.num_headings
+
+    def distance(self, x, y, radar_world_angle):
+        heading_idx = int(round((radar_world_angle % 360) / self.heading_step)) % self.num_headings
+        return float(self.distances[heading_idx, int(y), int(x)])
+
+    def distances_at(self, xs, ys, radar_world_angles):
+        heading_idx = np.rint((radar_world_angles % 360) / self.heading_step).astype(np.int64) % self.num_headings
+        return self.distances[heading_idx, ys.astype(np.int64), xs.astype(np.int64)].astype(np.float64)
+
+    @staticmethod
+    def build(terrain, num_headings=RADAR_TABLE_HEADINGS):
+        # Rays start at the pixel center, so for a fixed heading and step l every pixel samples the same
+        # (dx, dy) offset: one shifted wall mask per step marches the whole map at once.
+        h, w = terrain.height, terrain.width
+        blocked = terrain.codes == TERRAIN_WALL
+        distances = np.empty((num_headings, h, w), dtype=np.uint8)
+        for heading_idx in range(num_headings):
+            r_ang_r = math.radians(360 - heading_idx * 360.0 / num_headings)
+            cos_r, sin_r = math.cos(r_ang_r), math.sin(r_ang_r)
+            dist = np.full((h, w), MAX_RADAR_DISTANCE, dtype=np.uint8)
+            pending = np.ones((h, w), dtype=bool)
+            last_offset = None
+            for l in range(MAX_RADAR_DISTANCE):
+                dx, dy = math.floor(0.5 + cos_r * l), math.floor(0.5 + sin_r * l)
+                if (dx, dy) == last_offset: continue # Same samples as the previous step, nothing new can hit
+                last_offset = (dx, dy)
+                hit = np.ones((h, w), dtype=bool) # Samples that leave the map stop the ray
+                y0, y1, x0, x1 = max(0, -dy), min(h, h - dy), max(0, -dx), min(w, w - dx)
+                if y0 < y1 and x0 < x1: hit[y0:y1, x0:x1] = blocked[y0 + dy:y1 + dy, x0 + dx:x1 + dx]
+                hit &= pending
+                dist[hit] = l; pending &= ~hit
+                if not pending.any(): break
+            distances[heading_idx] = dist
+        return distances
+
+    @staticmethod
+    def load_or_build(terrain, table_path, num_headings=RADAR_TABLE_HEADINGS):
+        if os.path.exists(table_path):
+            try: return RadarTable(np.load(table_path, mmap_mode='r'))
+            except (OSError, ValueError) as e: print(f"WARNING: Radar table '{table_path}' unreadable, rebuilding: {e}")
+        print(f"Building radar table ({num_headings} headings, {terrain.width}x{terrain.height})...")
+        distances = RadarTable.build(terrain, num_headings)
+        tmp_path = f"{table_path}.{os.getpid()}.tmp.npy"
+        np.save(tmp_path, distances); os.replace(tmp_path, table_path)
+        return RadarTable(np.load(table_path, mmap_mode='r'))
+
+class TrackProgressIndex:
+    """Distance along the track from the start line for every drivable map pixel (-1 elsewhere): a chessboard
+    BFS over non-wall pixels from the car spawn point, with a barrier just behind the start so the search can
+    only go forward round the lap. A step never adds more than 1, so index distances never exceed the path
+    driven between two points. Pixels just behind the barrier read about lap_length; cars carry a lap counter
+    across that seam. Stored as an int32 .npy in the asset cache and memory mapped."""
+    def __init__(self, progress, start_xy, heading_deg=0.0):
+        self.progress = progress
+        self.height, self.width = progress.shape
+        behind_x, behind_y = TrackProgressIndex.offset_point(start_xy, heading_deg, -(TRACK_BARRIER_OFFSET + 2))
+        lap_length = self.at(behind_x, behind_y) # None for tracks that do not loop back to the start
+        self.lap_length = lap_length if lap_length > 0 else None
+
+    @staticmethod
+    def offset_point(start_xy, heading_deg, distance):
+        ang_r = math.radians(360 - heading_deg) # Same convention as the car's movement
+        return int(round(start_xy[0] + math.cos(ang_r) * distance)), int(round(start_xy[1] + math.sin(ang_r) * distance))
+
+    def at(self, x, y):
+        if 0 <= x < self.width and 0 <= y < self.height: return int(self.progress[y, x])
+        return -1
+
+    def at_many(self, xs, ys):
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        progress = np.full(xs.shape, -1, dtype=np.int64)
+        progress[inside] = self.progress[ys[inside], xs[inside]]
+        return progress
+
+    @staticmethod
+    def build(terrain, start_xy, heading_deg=0.0):
+        """Returns the (height, width) int32 progress array, or None if start_xy is not drivable."""
+        h, w = terrain.height, terrain.width
+        passable = np.zeros((h + 2, w + 2), dtype=bool) # One pixel border, so flat neighbour offsets never wrap
+        passable[1:-1, 1:-1] = (terrain.codes != TERRAIN_WALL) & (terrain.codes != TERRAIN_OUT_OF_BOUNDS)
+        start_x, start_y = start_xy
+        if not (0 <= start_x < w and 0 <= start_y < h) or not passable[start_y + 1, start_x + 1]: return None
+        # Barrier: two pixel thick line across the road behind the start. It crosses thin walls (lane markings)
+        # and stops at the first wall run at least TRACK_BARRIER_WALL_THICKNESS long or at the map edge.
+        ang_r = math.radians(360 - heading_deg); perp_x, perp_y = -math.sin(ang_r), math.cos(ang_r)
+        for back in (TRACK_BARRIER_OFFSET, TRACK_BARRIER_OFFSET + 1):
+            base_x, base_y = TrackProgressIndex.offset_point(start_xy, heading_deg, -back)
+            for direction in (1, -1):
+                wall_run, step = 0, 0
+                while wall_run < TRACK_BARRIER_WALL_THICKNESS:
+                    x, y = int(round(base_x + perp_x * step * direction)), int(round(base_y + perp_y * step * direction))
+                    if not (0 <= x < w and 0 <= y < h): break
+                    if passable[y + 1, x + 1]: passable[y + 1, x + 1] = False; wall_run = 0
+                    else: wall_run += 1
+                    step += 1
+        stride = w + 2
+        passable_flat = passable.ravel()
+        dist = np.full(passable_flat.size, -1, dtype=np.int32)
+        neighbour_offsets = np.array([-stride - 1, -stride, -stride + 1, -1, 1, stride - 1, stride, stride + 1])
+        frontier = np.array([(start_y + 1) * stride + start_x + 1]); dist[frontier] = 0
+        d = 0
+        while frontier.size: # Frontier-at-a-time BFS: every step is a handful of array ops
+            d += 1
+            neighbours = np.unique((frontier[:, None] + neighbour_offsets).ravel())
+            frontier = neighbours[passable_flat[neighbours] & (dist[neighbours] < 0)]
+            dist[frontier] = d
+        return dist.reshape(h + 2, w + 2)[1:-1, 1:-1].copy()
+
+    @staticmethod
+    def load_or_build(terrain, table_path, start_xy, heading_deg=0.0):
+        if os.path.exists(table_path):
+            try: return TrackProgressIndex(np.load(table_path, mmap_mode='r'), start_xy, heading_deg)
+            except (OSError, ValueError) as e: print(f"WARNING: Track progress index '{table_path}' unreadable, rebuilding: {e}")
+        print(f"Building track progress index ({terrain.width}x{terrain.height})...")
+        progress = TrackProgressIndex.build(terrain, start_xy, heading_deg)
+        if progress is None: return None
+        tmp_path = f"{table_path}.{os.getpid()}.tmp.npy"
+        np.save(tmp_path, progress); os.replace(tmp_path, table_path)
+        return TrackProgressIndex(np.load(table_path, mmap_mode='r'), start_xy, heading_deg)
+
+def verify_radar_table(terrain, radar_table, num_samples=2000, seed=0):
+    """Compares table readings against the pixel-marching radar at random non-wall positions and angles.
+    Returns (mean_abs_error, p95_abs_error, max_abs_error) in pixels."""
+    rng = random.Random(seed)
+    probe_car, marching_terrain = Car(None), TerrainGrid(terrain.width, terrain.height, terrain.cells)
+    errors = []
+    while len(errors) < num_samples:
+        cx, cy = rng.uniform(0, terrain.width - 1), rng.uniform(0, terrain.height - 1)
+        if terrain.at(int(cx), int(cy)) == TERRAIN_WALL: continue
+        probe_car.center[0], probe_car.center[1], probe_car.angle = cx, cy, rng.uniform(0, 360)
+        probe_car._update_radars(marching_terrain)
+        for deg_off, l_marched in zip(RADAR_ANGLES, probe_car.radar_lengths):
+            errors.append(abs(radar_table.distance(cx, cy, probe_car.angle + deg_off) - l_marched))
+    errors.sort()
+    return sum(errors) / len(errors), errors[int(len(errors) * 0.95)], errors[-1]
+
 def rotate_points(points, angle_degrees, origin=(0,0)):
     angle_rad = math.radians(angle_degrees); cos_a = math.cos(angle_rad); sin_a = math.sin(angle_rad)
     rotated_points = []
@@ -89,46 +390,28 @@ def draw_node_arrow(surface, center_x, center_y, radius, direction_angle_deg, co
         pygame.draw.polygon(surface, color, final_arrow_points)
         pygame.draw.lines(surface, (color[0]//2, color[1]//2, color[2]//2), True, final_arrow_points, 1)
 
-def draw_neat_visualization(screen, genome, config, in_vals, out_vals, viz_rect):
-    viz_surface = pygame.Surface(viz_rect.size, pygame.SRCALPHA)
-    viz_surface.fill(NN_PANEL_BG_COLOR)
-
-    if genome is None or config is None:
-        screen.blit(viz_surface, viz_rect.topleft)
-        return
-
+def layout_neat_visualization(genome, config, panel_size):
+    """Node positions and static fills/outlines for the NN panel (input and output nodes get the base fill)."""
+    panel_width, panel_height = panel_size
     input_keys = list(config.genome_config.input_keys)
     output_keys = list(config.genome_config.output_keys)
-
-    current_input_values = list(in_vals) if in_vals else [0.0] * len(input_keys)
-    current_output_values = list(out_vals) if out_vals else [0.0] * len(output_keys)
-
-    while len(current_input_values) < len(input_keys): current_input_values.append(0.0)
-    while len(current_output_values) < len(output_keys): current_output_values.append(0.0)
-
     node_positions, node_render_properties = {}, {}
-    margin_x, margin_y = viz_rect.width * 0.1, viz_rect.height * 0.05
-    drawable_width, drawable_height = viz_rect.width - 2 * margin_x, viz_rect.height - 2 * margin_y
+    margin_x, margin_y = panel_width * 0.1, panel_height * 0.05
+    drawable_width, drawable_height = panel_width - 2 * margin_x, panel_height - 2 * margin_y
 
     num_input_nodes = len(input_keys)
     y_input_nodes = margin_y + NODE_RADIUS
     for i, key_input in enumerate(input_keys):
         x_pos = margin_x + (drawable_width * (i + 0.5) / num_input_nodes if num_input_nodes > 0 else drawable_width * 0.5)
         node_positions[key_input] = (int(x_pos), int(y_input_nodes))
-        activation = current_input_values[i] if i < len(current_input_values) else 0.0
-        fill_color = NODE_ACTIVE_POSITIVE_FILL if activation > ACTIVATION_THRESHOLD else NODE_BASE_FILL_COLOR
-        node_render_properties[key_input] = {'fill': fill_color, 'dotted': False}
+        node_render_properties[key_input] = {'fill': NODE_BASE_FILL_COLOR, 'dotted': False}
 
     num_output_nodes = len(output_keys)
-    y_output_nodes = viz_rect.height - margin_y - NODE_RADIUS
+    y_output_nodes = panel_height - margin_y - NODE_RADIUS
     for i, key_output in enumerate(output_keys):
         x_pos = margin_x + (drawable_width * (i + 0.5) / num_output_nodes if num_output_nodes > 0 else drawable_width * 0.5)
         node_positions[key_output] = (int(x_pos), int(y_output_nodes))
-        activation = current_output_values[i] if i < len(current_output_values) else 0.0
-        fill_color = NODE_BASE_FILL_COLOR
-        if activation > ACTIVATION_THRESHOLD: fill_color = NODE_ACTIVE_POSITIVE_FILL
-        elif activation < -ACTIVATION_THRESHOLD: fill_color = NODE_ACTIVE_NEGATIVE_FILL
-        node_render_properties[key_output] = {'fill': fill_color, 'dotted': False}
+        node_render_properties[key_output] = {'fill': NODE_BASE_FILL_COLOR, 'dotted': False}
 
     hidden_keys = sorted([k for k in genome.nodes if k not in input_keys and k not in output_keys])
     num_hidden_nodes = len(hidden_keys)
@@ -154,6 +437,9 @@ def draw_neat_visualization(screen, genome, config, in_vals, out_vals, viz_rect)
             elif normalized_bias_effect < -ACTIVATION_THRESHOLD: fill_color, use_dotted_outline = NODE_ACTIVE_NEGATIVE_FILL, False
             node_render_properties[key_hidden] = {'fill': fill_color, 'dotted': use_dotted_outline}
 
+    return input_keys, output_keys, node_positions, node_render_properties
+
+def draw_nn_connections(surface, genome, node_positions):
     for conn_gene in genome.connections.values():
         if not conn_gene.enabled: continue
         input_node_key, output_node_key = conn_gene.key
@@ -167,53 +453,173 @@ def draw_neat_visualization(screen, genome, config, in_vals, out_vals, viz_rect)
         distance = math.hypot(dx, dy)
         if distance == 0: continue
         num_dashes = int(distance / (CONNECTION_DASH_LEN + CONNECTION_GAP_LEN))
-        if num_dashes <= 0: pygame.draw.line(viz_surface, line_color, point_input, point_output, line_thickness)
+        if num_dashes <= 0: pygame.draw.line(surface, line_color, point_input, point_output, line_thickness)
         else:
             for i_dash in range(num_dashes):
                 start_ratio = (i_dash * (CONNECTION_DASH_LEN + CONNECTION_GAP_LEN)) / distance
                 end_ratio = min((i_dash * (CONNECTION_DASH_LEN + CONNECTION_GAP_LEN) + CONNECTION_DASH_LEN) / distance, 1.0)
                 start_point_dash = (point_input[0] + dx * start_ratio, point_input[1] + dy * start_ratio)
                 end_point_dash = (point_input[0] + dx * end_ratio, point_input[1] + dy * end_ratio)
-                pygame.draw.line(viz_surface, line_color, start_point_dash, end_point_dash, line_thickness)
-
-    for node_key, node_pos in node_positions.items():
-        properties = node_render_properties.get(node_key, {'fill': NODE_BASE_FILL_COLOR, 'dotted': True})
-        pygame.draw.circle(viz_surface, properties['fill'], node_pos, NODE_RADIUS)
-        pygame.draw.circle(viz_surface, NODE_BORDER_COLOR, node_pos, NODE_RADIUS, NODE_BORDER_THICKNESS)
-        if properties['dotted']:
-            for i_dot in range(10):
-                angle_dot = 2 * math.pi * i_dot / 10
-                dot_x = int(node_pos[0] + (NODE_RADIUS - NODE_BORDER_THICKNESS/2) * math.cos(angle_dot))
-                dot_y = int(node_pos[1] + (NODE_RADIUS - NODE_BORDER_THICKNESS/2) * math.sin(angle_dot))
-                pygame.draw.circle(viz_surface, NODE_DOTTED_OUTLINE_COLOR, (dot_x, dot_y), 1)
-        arrow_direction_degrees = None
-        if node_key in input_keys: arrow_direction_degrees = 180
-        elif node_key in output_keys:
-            try:
-                node_index = output_keys.index(node_key)
-                if node_index == 0: arrow_direction_degrees = 270
-                elif node_index == 1: arrow_direction_degrees = 90
-                elif node_index == 2: arrow_direction_degrees = 180
-                elif node_index == 3: arrow_direction_degrees = 0
-            except ValueError: pass
-        if arrow_direction_degrees is not None:
-            draw_node_arrow(viz_surface, node_pos[0], node_pos[1], NODE_RADIUS - NODE_BORDER_THICKNESS, arrow_direction_degrees, ARROW_COLOR)
-    screen.blit(viz_surface, viz_rect.topleft)
+                pygame.draw.line(surface, line_color, start_point_dash, end_point_dash, line_thickness)
+
+def draw_nn_node(surface, node_key, node_pos, properties, input_keys, output_keys):
+    pygame.draw.circle(surface, properties['fill'], node_pos, NODE_RADIUS)
+    pygame.draw.circle(surface, NODE_BORDER_COLOR, node_pos, NODE_RADIUS, NODE_BORDER_THICKNESS)
+    if properties['dotted']:
+        for i_dot in range(10):
+            angle_dot = 2 * math.pi * i_dot / 10
+            dot_x = int(node_pos[0] + (NODE_RADIUS - NODE_BORDER_THICKNESS/2) * math.cos(angle_dot))
+            dot_y = int(node_pos[1] + (NODE_RADIUS - NODE_BORDER_THICKNESS/2) * math.sin(angle_dot))
+            pygame.draw.circle(surface, NODE_DOTTED_OUTLINE_COLOR, (dot_x, dot_y), 1)
+    arrow_direction_degrees = None
+    if node_key in input_keys: arrow_direction_degrees = 180
+    elif node_key in output_keys:
+        try:
+            node_index = output_keys.index(node_key)
+            if node_index == 0: arrow_direction_degrees = 270
+            elif node_index == 1: arrow_direction_degrees = 90
+            elif node_index == 2: arrow_direction_degrees = 180
+            elif node_index == 3: arrow_direction_degrees = 0
+        except ValueError: pass
+    if arrow_direction_degrees is not None:
+        draw_node_arrow(surface, node_pos[0], node_pos[1], NODE_RADIUS - NODE_BORDER_THICKNESS, arrow_direction_degrees, ARROW_COLOR)
+
+class NeatPanelCache:
+    """The NN panel split into a static layer (layout, connections, node borders, arrows), rendered once per
+    genome, config and panel size, and pre-drawn active input/output node sprites that are blitted over it
+    each frame. LRU bounded by NN_PANEL_CACHE_SIZE; entries hold their genome so the id() in the key
+    cannot be reused while the entry exists."""
+    def __init__(self, max_entries=NN_PANEL_CACHE_SIZE):
+        self.max_entries, self.entries = max_entries, collections.OrderedDict()
+
+    def get(self, genome, config, panel_size):
+        key = (genome.key, id(genome), id(config), tuple(panel_size))
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = self._render(genome, config, panel_size)
+            while len(self.entries) > self.max_entries: self.entries.popitem(last=False)
+        else: self.entries.move_to_end(key)
+        return entry
+
+    @staticmethod
+    def _render(genome, config, panel_size):
+        input_keys, output_keys, node_positions, node_render_properties = layout_neat_visualization(genome, config, panel_size)
+        static_layer = pygame.Surface(panel_size, pygame.SRCALPHA)
+        static_layer.fill(NN_PANEL_BG_COLOR)
+        draw_nn_connections(static_layer, genome, node_positions)
+        for node_key, node_pos in node_positions.items():
+            draw_nn_node(static_layer, node_key, node_pos, node_render_properties.get(node_key, {'fill': NODE_BASE_FILL_COLOR, 'dotted': True}), input_keys, output_keys)
+        # Nodes are opaque circles drawn over the connections, so an active node is just its sprite blitted on top
+        sprite_half = NODE_RADIUS + 1
+        def node_sprite(node_key, fill_color):
+            sprite = pygame.Surface((2 * sprite_half + 1, 2 * sprite_half + 1), pygame.SRCALPHA)
+            draw_nn_node(sprite, node_key, (sprite_half, sprite_half), {'fill': fill_color, 'dotted': False}, input_keys, output_keys)
+            return sprite
+        io_nodes = [(node_positions[key][0] - sprite_half, node_positions[key][1] - sprite_half) for key in input_keys + output_keys]
+        positive_sprites = [node_sprite(key, NODE_ACTIVE_POSITIVE_FILL) for key in input_keys + output_keys]
+        negative_sprites = [None] * len(input_keys) + [node_sprite(key, NODE_ACTIVE_NEGATIVE_FILL) for key in output_keys]
+        return {"genome": genome, "static_layer": static_layer, "num_inputs": len(input_keys), "io_nodes": io_nodes, "positive": positive_sprites, "negative": negative_sprites}
+
+nn_panel_cache = NeatPanelCache()
+
+def neat_visualization_blits(genome, config, in_vals, out_vals, viz_rect):
+    """The NN panel as (surface, screen position) pairs: the cached static layer plus the active node sprites."""
+    panel = nn_panel_cache.get(genome, config, viz_rect.size)
+    blits = [(panel["static_layer"], viz_rect.topleft)]
+    num_inputs = panel["num_inputs"]
+    # Only input/output nodes change per frame: inputs light up above ACTIVATION_THRESHOLD, outputs also below -ACTIVATION_THRESHOLD
+    activations = (list(in_vals or [])[:num_inputs] + [0.0] * num_inputs)[:num_inputs] + list(out_vals or [])
+    for i_node, (node_x, node_y) in enumerate(panel["io_nodes"]):
+        activation = activations[i_node] if i_node < len(activations) else 0.0
+        if activation > ACTIVATION_THRESHOLD: blits.append((panel["positive"][i_node], (viz_rect.x + node_x, viz_rect.y + node_y)))
+        elif i_node >= num_inputs and activation < -ACTIVATION_THRESHOLD: blits.append((panel["negative"][i_node], (viz_rect.x + node_x, viz_rect.y + node_y)))
+    return blits
+
+def draw_neat_visualization(screen, genome, config, in_vals, out_vals, viz_rect):
+    if genome is None or config is None:
+        viz_surface = pygame.Surface(viz_rect.size, pygame.SRCALPHA)
+        viz_surface.fill(NN_PANEL_BG_COLOR)
+        screen.blit(viz_surface, viz_rect.topleft)
+        return
+    screen.blits(neat_visualization_blits(genome, config, in_vals, out_vals, viz_rect), doreturn=False)
+
+def rotate_center(image_to_rotate, angle):
+    original_rect = image_to_rotate.get_rect()
+    rotated_image_intermediate = pygame.transform.rotate(image_to_rotate, angle)
+    rotated_image_rect = rotated_image_intermediate.get_rect(center=original_rect.center)
+    final_rotated_image = pygame.Surface(original_rect.size, pygame.SRCALPHA)
+    final_rotated_image.fill((0, 0, 0, 0))
+    blit_x = (original_rect.width - rotated_image_rect.width) // 2
+    blit_y = (original_rect.height - rotated_image_rect.height) // 2
+    final_rotated_image.blit(rotated_image_intermediate, (blit_x, blit_y))
+    return final_rotated_image
+
+class SpriteAtlas:
+    """The car sprite pre-rotated once every SPRITE_ATLAS_ANGLE_RESOLUTION degrees and shared by all cars.
+    Cars look up their image by quantized angle when drawn instead of rotating in the physics update."""
+    _atlas_cache = {} # id(sprite) -> (sprite, resolution, atlas), one atlas per scaled sprite
+
+    def __init__(self, sprite, angle_resolution=None):
+        self.angle_resolution = angle_resolution or SPRITE_ATLAS_ANGLE_RESOLUTION
+        self.num_angles = max(1, int(round(360.0 / self.angle_resolution)))
+        self.sprites = [rotate_center(sprite, i * 360.0 / self.num_angles) for i in range(self.num_angles)]
+
+    def get(self, angle):
+        return self.sprites[int(round(angle * self.num_angles / 360.0)) % self.num_angles]
+
+    @staticmethod
+    def for_sprite(sprite):
+        cached = SpriteAtlas._atlas_cache.get(id(sprite))
+        if cached is None or cached[0] is not sprite or cached[1] != SPRITE_ATLAS_ANGLE_RESOLUTION:
+            cached = (sprite, SPRITE_ATLAS_ANGLE_RESOLUTION, SpriteAtlas(sprite))
+            SpriteAtlas._atlas_cache[id(sprite)] = cached
+        return cached[2]
 
 class UserQuitException(Exception):pass
+def step_smoothing_factor(per_frame_factor):
+    # Exponential smoothing factor for one physics step of SIMULATION_DT frames (exactly the per-frame factor at dt 1)
+    return per_frame_factor if SIMULATION_DT == 1 else 1.0 - (1.0 - per_frame_factor) ** SIMULATION_DT
+
+CAR_CORNER_SIGNS = ((-1, -1), (1, -1), (1, 1), (-1, 1)) # Sprite corners relative to its center, in half car sizes
+
+def car_corner_points(center_x, center_y, angle, out):
+    # Writes the four corners of a car centred on (center_x, center_y) into out as x0, y0, ..., x3, y3
+    half_x, half_y = CAR_SIZE_X / 2, CAR_SIZE_Y / 2
+    angle_rad_for_point_rotation = math.radians(angle)
+    cos_a, sin_a = math.cos(angle_rad_for_point_rotation), math.sin(angle_rad_for_point_rotation)
+    i_out = 0
+    for sign_x, sign_y in CAR_CORNER_SIGNS:
+        rel_x, rel_y = sign_x * half_x, sign_y * half_y
+        out[i_out] = center_x + (rel_x * cos_a - rel_y * sin_a)
+        out[i_out + 1] = center_y + (rel_x * sin_a + rel_y * cos_a)
+        i_out += 2
+
 class Car:
-    def __init__(self,car_sfc):
-        self.sprite_original=car_sfc
-        self.rotated_sprite=self.sprite_original
-        self.position=list(INITIAL_POSITION)
+    """One car of the scalar engine. All per-frame state lives in __slots__ and fixed-size array('d')
+    buffers that update() overwrites in place, so stepping a car allocates nothing that outlives the
+    frame (--benchmark checks this with tracemalloc). Corners and radar ends are flat x, y pairs."""
+    __slots__ = ('sprite_atlas', 'position', 'angle', 'target_angle', 'speed', 'target_speed', 'center', 'corners', 'swept_corners',
+                 'radar_ends', 'radar_lengths', 'last_radar_data', 'last_nn_output', 'has_radar_data', 'has_nn_output', 'alive',
+                 'distance_driven', 'time_survived', 'stagnation_timer', 'last_pos_for_stagnation_check', 'frames_since_last_stagnation_check',
+                 'angle_smoothing_factor', 'speed_smoothing_factor', 'id', 'genome_key', 'frames_in_correct_lane', 'frames_on_center_line',
+                 'frames_in_wrong_lane_or_wall', 'track_raw_progress', 'track_laps', 'track_best_progress', 'track_progress_checkpoint',
+                 'frames_without_progress')
+
+    def __init__(self,sprite_atlas):
+        self.sprite_atlas=sprite_atlas # None for cars that are never drawn (headless workers, probes)
+        self.position=array.array('d', INITIAL_POSITION)
         self.angle = 0.0
         self.target_angle = self.angle
         self.speed=global_initial_speed
-        self.center=[self.position[0]+CAR_SIZE_X/2,self.position[1]+CAR_SIZE_Y/2]
-        self.corners,self.radars,self.last_radar_data,self.last_nn_output=[],[],[],[]
+        self.center=array.array('d', (self.position[0]+CAR_SIZE_X/2,self.position[1]+CAR_SIZE_Y/2))
+        self.corners,self.swept_corners=array.array('d', bytes(64)),array.array('d', bytes(64))
+        self.radar_ends,self.radar_lengths=array.array('d', bytes(16*len(RADAR_ANGLES))),array.array('d', bytes(8*len(RADAR_ANGLES)))
+        self.last_radar_data=array.array('d', [1.0]*len(RADAR_ANGLES)) # What the NN sees before the first radar scan
+        self.last_nn_output=array.array('d', bytes(8*len(ACTION_LABELS)))
+        self.has_radar_data,self.has_nn_output=False,False
         self.alive=True
         self.distance_driven,self.time_survived,self.stagnation_timer=0.0,0,0
-        self.last_pos_for_stagnation_check=list(self.position)
+        self.last_pos_for_stagnation_check=array.array('d', self.position)
         self.frames_since_last_stagnation_check=0
         self.angle_smoothing_factor=0.07
         self.target_speed = global_initial_speed
@@ -223,6 +629,8 @@ class Car:
         self.frames_in_correct_lane = 0
         self.frames_on_center_line = 0
         self.frames_in_wrong_lane_or_wall = 0
+        self.track_raw_progress, self.track_laps, self.track_best_progress = 0, 0, 0 # --track-progress
+        self.track_progress_checkpoint, self.frames_without_progress = 0, 0
 
     def get_rect_on_screen(self):
         car_r_ig=pygame.Rect(self.position[0],self.position[1],CAR_SIZE_X,CAR_SIZE_Y)
@@ -230,65 +638,86 @@ class Car:
 
     def draw(self,screen_surface):
         drw_px=self.position[0]+GAME_AREA_X_OFFSET;drw_py=self.position[1]+GAME_AREA_Y_OFFSET
-        sprite_rect = self.rotated_sprite.get_rect(center=(drw_px + CAR_SIZE_X / 2, drw_py + CAR_SIZE_Y / 2))
-        screen_surface.blit(self.rotated_sprite, sprite_rect.topleft)
-        if self.alive:self._draw_radars(screen_surface)
+        rotated_sprite = self.sprite_atlas.get(self.angle)
+        sprite_rect = rotated_sprite.get_rect(center=(drw_px + CAR_SIZE_X / 2, drw_py + CAR_SIZE_Y / 2))
+        drawn_rect = screen_surface.blit(rotated_sprite, sprite_rect.topleft)
+        if self.alive:drawn_rect.union_ip(self._draw_radars(screen_surface))
         if DEBUG_DRAW_CAR_CORNERS and self.alive:
-            for corner_x, corner_y in self.corners:
-                screen_corner_x = int(corner_x + GAME_AREA_X_OFFSET)
-                screen_corner_y = int(corner_y + GAME_AREA_Y_OFFSET)
-                pygame.draw.circle(screen_surface, (255, 255, 0, 180), (screen_corner_x, screen_corner_y), 3)
+            corners=self.corners
+            for i_corner in range(0,len(corners),2):
+                screen_corner_x = int(corners[i_corner] + GAME_AREA_X_OFFSET)
+                screen_corner_y = int(corners[i_corner+1] + GAME_AREA_Y_OFFSET)
+                drawn_rect.union_ip(pygame.draw.circle(screen_surface, (255, 255, 0, 180), (screen_corner_x, screen_corner_y), 3))
+        return drawn_rect # Everything this car touched on screen, for FrameRenderer's dirty rects
 
     def _draw_radars(self,screen_surface):
         cx_os,cy_os=self.center[0]+GAME_AREA_X_OFFSET,self.center[1]+GAME_AREA_Y_OFFSET
-        for r_end_p,_ in self.radars:
-            rex_os,rey_os=r_end_p[0]+GAME_AREA_X_OFFSET,r_end_p[1]+GAME_AREA_Y_OFFSET
-            pygame.draw.line(screen_surface,RADAR_VIS_COLOR,(int(cx_os),int(cy_os)),(int(rex_os),int(rey_os)),2)
-            pygame.draw.circle(screen_surface,RADAR_VIS_COLOR,(int(rex_os),int(rey_os)),4)
-
-    def _check_collision(self,g_map_sfc):
+        drawn_rect=pygame.Rect(int(cx_os),int(cy_os),0,0)
+        if not self.has_radar_data:return drawn_rect
+        radar_ends=self.radar_ends
+        for i_end in range(0,len(radar_ends),2):
+            rex_os,rey_os=radar_ends[i_end]+GAME_AREA_X_OFFSET,radar_ends[i_end+1]+GAME_AREA_Y_OFFSET
+            drawn_rect.union_ip(pygame.draw.line(screen_surface,RADAR_VIS_COLOR,(int(cx_os),int(cy_os)),(int(rex_os),int(rey_os)),2))
+            drawn_rect.union_ip(pygame.draw.circle(screen_surface,RADAR_VIS_COLOR,(int(rex_os),int(rey_os)),4))
+        return drawn_rect
+
+    def _check_swept_collision(self, terrain, old_center_x, old_center_y, old_angle):
+        # Corners at evenly spaced poses between the previous pose and the new one, so a step longer than a
+        # wall is thick cannot jump over it. The new pose itself is left to _check_collision.
+        turn = (self.angle - old_angle + 180) % 360 - 180
+        move_x, move_y = self.center[0] - old_center_x, self.center[1] - old_center_y
+        corner_travel = math.hypot(move_x, move_y) + math.hypot(CAR_SIZE_X / 2, CAR_SIZE_Y / 2) * math.radians(abs(turn))
+        substeps = math.ceil(corner_travel / COLLISION_MAX_STEP_PIXELS)
+        corners = self.swept_corners
+        for k in range(1, substeps):
+            t = k / substeps
+            car_corner_points(old_center_x + move_x * t, old_center_y + move_y * t, old_angle + turn * t, corners)
+            for i_corner in range(0, 8, 2):
+                terrain_code = terrain.at(int(corners[i_corner]), int(corners[i_corner + 1]))
+                if terrain_code == TERRAIN_WALL or terrain_code == TERRAIN_OUT_OF_BOUNDS:
+                    self.alive = False; return
+
+    def _check_collision(self,terrain):
         if not self.alive:return
-        for corner_idx, (px,py) in enumerate([(int(p[0]),int(p[1])) for p in self.corners]):
-            if not(0<=px<g_map_sfc.get_width() and 0<=py<g_map_sfc.get_height()):
+        corners=self.corners
+        for i_corner in range(0,8,2):
+            terrain_code = terrain.at(int(corners[i_corner]),int(corners[i_corner+1]))
+            if terrain_code == TERRAIN_WALL or terrain_code == TERRAIN_OUT_OF_BOUNDS:
                 self.alive=False;return
-            try:
-                pixel_color_at_corner = g_map_sfc.get_at((px,py))
-                if pixel_color_at_corner == FINISH_LINE_GREEN_COLOR_RGBA: pass
-                elif is_color_in_range(pixel_color_at_corner, OBSTACLE_WHITE_MIN_RGB, OBSTACLE_WHITE_MAX_RGB):
-                    self.alive=False;return
-            except IndexError: self.alive=False;return
-
-    def _update_radars(self,g_map_sfc):
-        self.radars.clear();self.last_radar_data.clear()
+
+    def _update_radars(self,terrain):
+        map_w, map_h, cells, radar_table = terrain.width, terrain.height, terrain.cells, terrain.radar_table
+        center_x, center_y = self.center[0], self.center[1]
+        radar_ends, radar_lengths, radar_data = self.radar_ends, self.radar_lengths, self.last_radar_data
+        i_radar = 0
         for deg_off in RADAR_ANGLES:
             radar_world_angle_math = self.angle + deg_off
             r_ang_r = math.radians(360 - radar_world_angle_math)
-            l=0.0
-            while l<MAX_RADAR_DISTANCE:
-                x=int(self.center[0]+math.cos(r_ang_r)*l)
-                y=int(self.center[1]+math.sin(r_ang_r)*l)
-                if not(0<=x<g_map_sfc.get_width() and 0<=y<g_map_sfc.get_height()):break
-                try:
-                    pixel_color_radar = g_map_sfc.get_at((x,y))
-                    if pixel_color_radar == FINISH_LINE_GREEN_COLOR_RGBA: pass
-                    elif is_color_in_range(pixel_color_radar, OBSTACLE_WHITE_MIN_RGB, OBSTACLE_WHITE_MAX_RGB): break
-                except IndexError:break
+            cos_r, sin_r = math.cos(r_ang_r), math.sin(r_ang_r)
+            l=0.0 if radar_table is None else radar_table.distance(center_x, center_y, radar_world_angle_math)
+            while radar_table is None and l<MAX_RADAR_DISTANCE:
+                x=int(center_x+cos_r*l)
+                y=int(center_y+sin_r*l)
+                if not(0<=x<map_w and 0<=y<map_h):break
+                if cells[y*map_w+x] == TERRAIN_WALL: break
                 l+=1.0
-            fx,fy=int(self.center[0]+math.cos(r_ang_r)*l),int(self.center[1]+math.sin(r_ang_r)*l)
-            self.radars.append([(fx,fy),l]);self.last_radar_data.append(l/RADAR_NORMALIZATION_FACTOR)
+            radar_ends[2*i_radar],radar_ends[2*i_radar+1]=int(center_x+cos_r*l),int(center_y+sin_r*l)
+            radar_lengths[i_radar],radar_data[i_radar]=l,l/RADAR_NORMALIZATION_FACTOR
+            i_radar += 1
+        self.has_radar_data=True
 
     def _check_stagnation(self):
-        self.frames_since_last_stagnation_check+=1
+        self.frames_since_last_stagnation_check+=SIMULATION_DT
         if self.frames_since_last_stagnation_check>=STAGNATION_CHECK_INTERVAL:
             moved_dist_since_last_check=math.hypot(self.position[0]-self.last_pos_for_stagnation_check[0],
                                                    self.position[1]-self.last_pos_for_stagnation_check[1])
             if moved_dist_since_last_check<STAGNATION_THRESHOLD_DISTANCE: self.stagnation_timer+=self.frames_since_last_stagnation_check
             else: self.stagnation_timer=0
-            self.last_pos_for_stagnation_check=list(self.position)
+            self.last_pos_for_stagnation_check[0],self.last_pos_for_stagnation_check[1]=self.position[0],self.position[1]
             self.frames_since_last_stagnation_check=0
         if self.stagnation_timer>=STAGNATION_FRAMES_LIMIT: self.alive=False
             
-    def _check_lane_position(self, g_map_sfc):
+    def _check_lane_position(self, terrain):
         if not self.alive: return
 
         offset_dist = CAR_SIZE_X * 0.38 
@@ -306,66 +735,78 @@ class Car:
         sample_x = int(self.center[0] + sample_offset_x)
         sample_y = int(self.center[1] + sample_offset_y)
 
-        if 0 <= sample_x < g_map_sfc.get_width() and 0 <= sample_y < g_map_sfc.get_height():
-            try:
-                pixel_color_sample = g_map_sfc.get_at((sample_x, sample_y))
-                if pixel_color_sample[0:3] == ROAD_COLOR_RGBA[0:3]: self.frames_in_correct_lane += 1
-                elif pixel_color_sample[0:3] == CENTER_LINE_COLOR_RGBA[0:3]: self.frames_on_center_line += 1
-                elif is_color_in_range(pixel_color_sample, OBSTACLE_WHITE_MIN_RGB, OBSTACLE_WHITE_MAX_RGB):
-                    self.frames_in_wrong_lane_or_wall += 1
-            except IndexError: self.frames_in_wrong_lane_or_wall += 1
-        else: self.frames_in_wrong_lane_or_wall += 1
-
-    def update(self,g_map_sfc):
+        terrain_code = terrain.at(sample_x, sample_y)
+        if terrain_code == TERRAIN_ROAD: self.frames_in_correct_lane += SIMULATION_DT
+        elif terrain_code == TERRAIN_CENTER_LINE: self.frames_on_center_line += SIMULATION_DT
+        elif terrain_code == TERRAIN_WALL or terrain_code == TERRAIN_OUT_OF_BOUNDS: self.frames_in_wrong_lane_or_wall += SIMULATION_DT
+
+    def update(self,terrain,sense=True):
+        # One physics step of SIMULATION_DT frames; sense=False skips the radar scan (--control-every)
         if not self.alive:return
         self._check_stagnation()
         if not self.alive: return
+        old_center_x, old_center_y, old_angle = self.center[0], self.center[1], self.angle
 
         ang_diff=(self.target_angle-self.angle+180)%360-180
-        max_angle_change_this_frame = ANGLE_STEP * 0.45
-        requested_angle_change = ang_diff * self.angle_smoothing_factor
+        max_angle_change_this_frame = ANGLE_STEP * 0.45 * SIMULATION_DT
+        requested_angle_change = ang_diff * step_smoothing_factor(self.angle_smoothing_factor)
         actual_angle_change = max(-max_angle_change_this_frame, min(requested_angle_change, max_angle_change_this_frame))
         self.angle = (self.angle + actual_angle_change) % 360
 
         speed_diff = self.target_speed - self.speed
-        self.speed += speed_diff * self.speed_smoothing_factor
+        self.speed += speed_diff * step_smoothing_factor(self.speed_smoothing_factor)
         self.speed = max(global_min_speed, min(self.speed, global_max_speed))
 
-        self.rotated_sprite=self._rotate_center(self.sprite_original,self.angle)
         ang_r_move=math.radians(360-self.angle)
-        self.position[0]+=math.cos(ang_r_move)*self.speed
-        self.position[1]+=math.sin(ang_r_move)*self.speed
-        self.position[0]=max(0,min(self.position[0], g_map_sfc.get_width()-CAR_SIZE_X))
-        self.position[1]=max(0,min(self.position[1], g_map_sfc.get_height()-CAR_SIZE_Y))
+        self.position[0]+=math.cos(ang_r_move)*self.speed*SIMULATION_DT
+        self.position[1]+=math.sin(ang_r_move)*self.speed*SIMULATION_DT
+        self.position[0]=max(0,min(self.position[0], terrain.width-CAR_SIZE_X))
+        self.position[1]=max(0,min(self.position[1], terrain.height-CAR_SIZE_Y))
 
-        self.distance_driven+=abs(self.speed);self.time_survived+=1
-        self.center=[self.position[0]+CAR_SIZE_X/2,self.position[1]+CAR_SIZE_Y/2]
+        self.distance_driven+=abs(self.speed)*SIMULATION_DT;self.time_survived+=SIMULATION_DT
+        self.center[0],self.center[1]=self.position[0]+CAR_SIZE_X/2,self.position[1]+CAR_SIZE_Y/2
+        car_corner_points(self.center[0], self.center[1], self.angle, self.corners)
 
-        half_x, half_y = CAR_SIZE_X / 2, CAR_SIZE_Y / 2
-        corners_relative_to_sprite_center = [(-half_x, -half_y), (half_x, -half_y), (half_x, half_y), (-half_x, half_y)]
-        self.corners.clear()
-        angle_rad_for_point_rotation = math.radians(self.angle)
-        cos_a, sin_a = math.cos(angle_rad_for_point_rotation), math.sin(angle_rad_for_point_rotation)
-        for rel_x, rel_y in corners_relative_to_sprite_center:
-            rotated_rel_x = rel_x * cos_a - rel_y * sin_a
-            rotated_rel_y = rel_x * sin_a + rel_y * cos_a
-            self.corners.append((self.center[0] + rotated_rel_x, self.center[1] + rotated_rel_y))
-
-        self._check_collision(g_map_sfc)
+        if SWEPT_COLLISION: self._check_swept_collision(terrain, old_center_x, old_center_y, old_angle)
+        self._check_collision(terrain)
         if not self.alive: return
-        self._update_radars(g_map_sfc)
-        self._check_lane_position(g_map_sfc)
-
-    def get_data_for_nn(self):return self.last_radar_data if self.last_radar_data and len(self.last_radar_data)==len(RADAR_ANGLES) else [1.0]*len(RADAR_ANGLES)
+        if sense: self._update_radars(terrain)
+        self._check_lane_position(terrain)
+        if terrain.track_index is not None: self._update_track_progress(terrain.track_index)
+
+    def _update_track_progress(self, track_index):
+        raw_progress = track_index.at(int(self.center[0]), int(self.center[1]))
+        lap_length = track_index.lap_length or 0
+        if raw_progress >= 0: # -1: the center is over a lane marking or a wall edge, keep the last reading
+            if lap_length and raw_progress - self.track_raw_progress < -lap_length / 2: self.track_laps += 1 # Crossed the start line forwards
+            elif lap_length and raw_progress - self.track_raw_progress > lap_length / 2: self.track_laps -= 1 # ...or backwards
+            self.track_raw_progress = raw_progress
+        progress = self.track_laps * lap_length + self.track_raw_progress
+        self.track_best_progress = max(self.track_best_progress, progress)
+        if self.track_best_progress >= self.track_progress_checkpoint + TRACK_PROGRESS_MIN_GAIN:
+            self.track_progress_checkpoint, self.frames_without_progress = self.track_best_progress, 0
+        else: self.frames_without_progress += SIMULATION_DT
+        if self.track_best_progress - progress > TRACK_BACKWARD_CULL_DISTANCE: self.alive = False # Driving backwards
+        elif TRACK_PROGRESS_WINDOW_FRAMES > 0 and self.frames_without_progress >= TRACK_PROGRESS_WINDOW_FRAMES: self.alive = False # Circling or stuck
+
+    def get_data_for_nn(self):return self.last_radar_data
     def is_alive(self):return self.alive
 
-    def get_fitness(self):
-        base_fit = self.distance_driven * DISTANCE_FITNESS_MULTIPLIER + self.time_survived * TIME_FITNESS_MULTIPLIER
+    def _modified_fitness(self):
+        travelled = self.track_best_progress if FITNESS_MODE == "progress" else self.distance_driven
+        base_fit = travelled * DISTANCE_FITNESS_MULTIPLIER + self.time_survived * TIME_FITNESS_MULTIPLIER
         lane_bonus = self.frames_in_correct_lane * LANE_REWARD_FACTOR
         lane_penalty = (self.frames_on_center_line * CENTER_LINE_PENALTY_FACTOR) + \
                        (self.frames_in_wrong_lane_or_wall * WRONG_LANE_PENALTY_FACTOR)
-        modified_fitness = base_fit + lane_bonus - lane_penalty
-        if self.distance_driven < CAR_SIZE_X * 4 or self.time_survived < FPS * 3.5:
+        return travelled, base_fit + lane_bonus - lane_penalty
+
+    def fitness_upper_bound(self, remaining_frames):
+        # Best fitness still reachable: every remaining frame at max speed, in the correct lane, no penalties
+        return max(0, self._modified_fitness()[1] + remaining_frames * max_fitness_gain_per_frame())
+
+    def get_fitness(self):
+        travelled, modified_fitness = self._modified_fitness()
+        if travelled < CAR_SIZE_X * 4 or self.time_survived < FPS * 3.5:
             early_death_penalty_factor = 0.08
             if (self.frames_in_wrong_lane_or_wall * WRONG_LANE_PENALTY_FACTOR * 1.5) > \
                (self.frames_in_correct_lane * LANE_REWARD_FACTOR):
@@ -373,235 +814,2450 @@ class Car:
             return max(0, modified_fitness * early_death_penalty_factor)
         return max(0, modified_fitness)
 
-    def _rotate_center(self, image_to_rotate, angle):
-        original_rect = image_to_rotate.get_rect()
-        rotated_image_intermediate = pygame.transform.rotate(image_to_rotate, angle)
-        rotated_image_rect = rotated_image_intermediate.get_rect(center=original_rect.center)
-        final_rotated_image = pygame.Surface(original_rect.size, pygame.SRCALPHA)
-        final_rotated_image.fill((0, 0, 0, 0))
-        blit_x = (original_rect.width - rotated_image_rect.width) // 2
-        blit_y = (original_rect.height - rotated_image_rect.height) // 2
-        final_rotated_image.blit(rotated_image_intermediate, (blit_x, blit_y))
-        return final_rotated_image
+class CarBatch:
+    """Struct-of-arrays state for a whole population (--engine batch, needs NumPy).
+    step() mirrors Car.update for every live car at once: stagnation, smoothing, integration,
+    corners, collision, radars and lane counters are all array operations on the batch."""
+    def __init__(self, sprite_atlas, genome_keys):
+        n = len(genome_keys)
+        self.sprite_atlas, self.num_cars = sprite_atlas, n
+        self.position = np.tile(np.asarray(INITIAL_POSITION, dtype=np.float64), (n, 1))
+        self.angle, self.target_angle = np.zeros(n), np.zeros(n)
+        self.speed, self.target_speed = np.full(n, global_initial_speed), np.full(n, global_initial_speed)
+        self.center = self.position + (CAR_SIZE_X / 2, CAR_SIZE_Y / 2)
+        self.corners = np.zeros((n, 4, 2))
+        self.radar_lengths = np.zeros((n, len(RADAR_ANGLES))); self.radar_ends = np.zeros((n, len(RADAR_ANGLES), 2), dtype=np.int64)
+        self.has_radar_data = np.zeros(n, dtype=bool)
+        self.last_nn_output = np.zeros((n, len(ACTION_LABELS)))
+        self.alive = np.ones(n, dtype=bool)
+        self.distance_driven, self.time_survived, self.stagnation_timer = np.zeros(n), np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64)
+        self.last_pos_for_stagnation_check = self.position.copy()
+        self.frames_since_last_stagnation_check = np.zeros(n, dtype=np.int64)
+        self.frames_in_correct_lane = np.zeros(n, dtype=np.int64)
+        self.frames_on_center_line = np.zeros(n, dtype=np.int64)
+        self.frames_in_wrong_lane_or_wall = np.zeros(n, dtype=np.int64)
+        self.track_raw_progress, self.track_laps, self.track_best_progress = np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64)
+        self.track_progress_checkpoint, self.frames_without_progress = np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64)
+        self.angle_smoothing_factor, self.speed_smoothing_factor = 0.07, 0.05 # Same as Car
+        half_x, half_y = CAR_SIZE_X / 2, CAR_SIZE_Y / 2
+        self.corner_offsets = np.array([(-half_x, -half_y), (half_x, -half_y), (half_x, half_y), (-half_x, half_y)])
+        self.radar_angle_offsets = np.asarray(RADAR_ANGLES, dtype=np.float64)
+        self.views = [CarView(self, i, key) for i, key in enumerate(genome_keys)]
+
+    def get_data_for_nn(self):
+        return np.where(self.has_radar_data[:, None], self.radar_lengths / RADAR_NORMALIZATION_FACTOR, 1.0)
+
+    def apply_actions(self, choices):
+        # choices: one ACTION_LABELS index per car, -1 for cars that made no decision this frame
+        target_angle, target_speed = self.target_angle, self.target_speed
+        turn_left, turn_right = choices == 0, choices == 1
+        target_angle[turn_left] = (target_angle[turn_left] + ANGLE_STEP) % 360
+        target_angle[turn_right] = (target_angle[turn_right] - ANGLE_STEP + 360) % 360
+        target_speed[choices == 2] -= global_speed_step
+        target_speed[choices == 3] += global_speed_step
+        acted = choices >= 0
+        target_speed[acted] = np.maximum(global_min_speed, np.minimum(target_speed[acted], global_max_speed))
+
+    def _check_stagnation(self, idx):
+        self.frames_since_last_stagnation_check[idx] += SIMULATION_DT
+        check_idx = idx[self.frames_since_last_stagnation_check[idx] >= STAGNATION_CHECK_INTERVAL]
+        if check_idx.size:
+            moved = self.position[check_idx] - self.last_pos_for_stagnation_check[check_idx]
+            stuck = np.hypot(moved[:, 0], moved[:, 1]) < STAGNATION_THRESHOLD_DISTANCE
+            self.stagnation_timer[check_idx[stuck]] += self.frames_since_last_stagnation_check[check_idx[stuck]]
+            self.stagnation_timer[check_idx[~stuck]] = 0
+            self.last_pos_for_stagnation_check[check_idx] = self.position[check_idx]
+            self.frames_since_last_stagnation_check[check_idx] = 0
+        self.alive[idx[self.stagnation_timer[idx] >= STAGNATION_FRAMES_LIMIT]] = False
+
+    def _radar_lengths(self, terrain, center, world_angles, cos_r, sin_r):
+        if terrain.radar_table is not None:
+            return terrain.radar_table.distances_at(center[:, 0, None], center[:, 1, None], world_angles)
+        cx, cy = center[:, 0, None], center[:, 1, None]
+        lengths = np.full(world_angles.shape, float(MAX_RADAR_DISTANCE))
+        pending = np.ones(world_angles.shape, dtype=bool)
+        for l in range(MAX_RADAR_DISTANCE):
+            codes = terrain.codes_at((cx + cos_r * l).astype(np.int64), (cy + sin_r * l).astype(np.int64))
+            hit = pending & ((codes == TERRAIN_WALL) | (codes == TERRAIN_OUT_OF_BOUNDS))
+            lengths[hit] = l; pending &= ~hit
+            if not pending.any(): break
+        return lengths
+
+    def step(self, terrain, sense=True):
+        idx = np.flatnonzero(self.alive)
+        self._check_stagnation(idx)
+        idx = idx[self.alive[idx]]
+        if idx.size == 0: return
+
+        angle = self.angle[idx]
+        old_center, old_angle = self.center[idx], angle
+        ang_diff = (self.target_angle[idx] - angle + 180) % 360 - 180
+        max_angle_change_this_frame = ANGLE_STEP * 0.45 * SIMULATION_DT
+        angle = (angle + np.maximum(-max_angle_change_this_frame, np.minimum(ang_diff * step_smoothing_factor(self.angle_smoothing_factor), max_angle_change_this_frame))) % 360
+        speed = self.speed[idx]
+        speed = speed + (self.target_speed[idx] - speed) * step_smoothing_factor(self.speed_smoothing_factor)
+        speed = np.maximum(global_min_speed, np.minimum(speed, global_max_speed))
+
+        ang_r_move = np.radians(360 - angle)
+        position = self.position[idx]
+        position[:, 0] += np.cos(ang_r_move) * speed * SIMULATION_DT
+        position[:, 1] += np.sin(ang_r_move) * speed * SIMULATION_DT
+        position[:, 0] = np.maximum(0, np.minimum(position[:, 0], terrain.width - CAR_SIZE_X))
+        position[:, 1] = np.maximum(0, np.minimum(position[:, 1], terrain.height - CAR_SIZE_Y))
+        self.angle[idx], self.speed[idx], self.position[idx] = angle, speed, position
+        self.distance_driven[idx] += np.abs(speed) * SIMULATION_DT; self.time_survived[idx] += SIMULATION_DT
+        center = position + (CAR_SIZE_X / 2, CAR_SIZE_Y / 2)
+        self.center[idx] = center
+
+        angle_rad_for_point_rotation = np.radians(angle)
+        cos_a, sin_a = np.cos(angle_rad_for_point_rotation)[:, None], np.sin(angle_rad_for_point_rotation)[:, None]
+        rel_x, rel_y = self.corner_offsets[:, 0], self.corner_offsets[:, 1]
+        corners = np.empty((idx.size, 4, 2))
+        corners[:, :, 0] = center[:, 0, None] + (rel_x * cos_a - rel_y * sin_a)
+        corners[:, :, 1] = center[:, 1, None] + (rel_x * sin_a + rel_y * cos_a)
+        self.corners[idx] = corners
+
+        corner_codes = terrain.codes_at(corners[:, :, 0].astype(np.int64), corners[:, :, 1].astype(np.int64))
+        crashed = ((corner_codes == TERRAIN_WALL) | (corner_codes == TERRAIN_OUT_OF_BOUNDS)).any(axis=1)
+        if SWEPT_COLLISION: crashed |= self._swept_collision(terrain, old_center, old_angle, center, angle)
+        self.alive[idx[crashed]] = False
+        idx, center, angle = idx[~crashed], center[~crashed], angle[~crashed]
+        if idx.size == 0: return
+        if sense: self._update_radars(terrain, idx, center, angle)
+        self._update_lanes(terrain, idx, center, angle)
+
+    def _swept_collision(self, terrain, old_center, old_angle, center, angle):
+        # Car._check_swept_collision for the stepped cars: substep k checks every car that needs more than k substeps
+        turn = (angle - old_angle + 180) % 360 - 180
+        moved = center - old_center
+        corner_travel = np.hypot(moved[:, 0], moved[:, 1]) + math.hypot(CAR_SIZE_X / 2, CAR_SIZE_Y / 2) * np.radians(np.abs(turn))
+        substeps = np.ceil(corner_travel / COLLISION_MAX_STEP_PIXELS).astype(np.int64)
+        crashed = np.zeros(angle.size, dtype=bool)
+        rel_x, rel_y = self.corner_offsets[:, 0], self.corner_offsets[:, 1]
+        for k in range(1, int(substeps.max(initial=0))):
+            sub = np.flatnonzero((k < substeps) & ~crashed)
+            t = k / substeps[sub]
+            sub_center = old_center[sub] + moved[sub] * t[:, None]
+            sub_angle_rad = np.radians(old_angle[sub] + turn[sub] * t)
+            cos_a, sin_a = np.cos(sub_angle_rad)[:, None], np.sin(sub_angle_rad)[:, None]
+            corner_xs = sub_center[:, 0, None] + (rel_x * cos_a - rel_y * sin_a)
+            corner_ys = sub_center[:, 1, None] + (rel_x * sin_a + rel_y * cos_a)
+            corner_codes = terrain.codes_at(corner_xs.astype(np.int64), corner_ys.astype(np.int64))
+            crashed[sub[((corner_codes == TERRAIN_WALL) | (corner_codes == TERRAIN_OUT_OF_BOUNDS)).any(axis=1)]] = True
+        return crashed
+
+    def _update_radars(self, terrain, idx, center, angle):
+        world_angles = angle[:, None] + self.radar_angle_offsets
+        r_ang_r = np.radians(360 - world_angles)
+        cos_r, sin_r = np.cos(r_ang_r), np.sin(r_ang_r)
+        lengths = self._radar_lengths(terrain, center, world_angles, cos_r, sin_r)
+        self.radar_lengths[idx] = lengths; self.has_radar_data[idx] = True
+        self.radar_ends[idx, :, 0] = (center[:, 0, None] + cos_r * lengths).astype(np.int64)
+        self.radar_ends[idx, :, 1] = (center[:, 1, None] + sin_r * lengths).astype(np.int64)
+
+    def _update_lanes(self, terrain, idx, center, angle):
+        offset_dist = CAR_SIZE_X * 0.38
+        math_heading_rad = np.radians(360 - angle)
+        sample_x = (center[:, 0] + (-np.sin(math_heading_rad) * offset_dist)).astype(np.int64)
+        sample_y = (center[:, 1] + np.cos(math_heading_rad) * offset_dist).astype(np.int64)
+        lane_codes = terrain.codes_at(sample_x, sample_y)
+        self.frames_in_correct_lane[idx] += (lane_codes == TERRAIN_ROAD) * SIMULATION_DT
+        self.frames_on_center_line[idx] += (lane_codes == TERRAIN_CENTER_LINE) * SIMULATION_DT
+        self.frames_in_wrong_lane_or_wall[idx] += ((lane_codes == TERRAIN_WALL) | (lane_codes == TERRAIN_OUT_OF_BOUNDS)) * SIMULATION_DT
+        if terrain.track_index is not None: self._update_track_progress(terrain.track_index, idx, center)
+
+    def _update_track_progress(self, track_index, idx, center):
+        # Car._update_track_progress for the cars in idx
+        previous_raw = self.track_raw_progress[idx]
+        raw_progress = track_index.at_many(center[:, 0].astype(np.int64), center[:, 1].astype(np.int64))
+        raw_progress = np.where(raw_progress >= 0, raw_progress, previous_raw)
+        lap_length = track_index.lap_length or 0
+        if lap_length:
+            self.track_laps[idx] += (raw_progress - previous_raw < -lap_length / 2).astype(np.int64) - (raw_progress - previous_raw > lap_length / 2)
+        self.track_raw_progress[idx] = raw_progress
+        progress = self.track_laps[idx] * lap_length + raw_progress
+        best_progress = np.maximum(self.track_best_progress[idx], progress); self.track_best_progress[idx] = best_progress
+        advanced = best_progress >= self.track_progress_checkpoint[idx] + TRACK_PROGRESS_MIN_GAIN
+        self.track_progress_checkpoint[idx[advanced]] = best_progress[advanced]
+        frames_without_progress = np.where(advanced, 0, self.frames_without_progress[idx] + SIMULATION_DT); self.frames_without_progress[idx] = frames_without_progress
+        culled = best_progress - progress > TRACK_BACKWARD_CULL_DISTANCE
+        if TRACK_PROGRESS_WINDOW_FRAMES > 0: culled |= frames_without_progress >= TRACK_PROGRESS_WINDOW_FRAMES
+        self.alive[idx[culled]] = False
+
+    def _modified_fitness(self):
+        travelled = self.track_best_progress if FITNESS_MODE == "progress" else self.distance_driven
+        base_fit = travelled * DISTANCE_FITNESS_MULTIPLIER + self.time_survived * TIME_FITNESS_MULTIPLIER
+        lane_bonus = self.frames_in_correct_lane * LANE_REWARD_FACTOR
+        lane_penalty = (self.frames_on_center_line * CENTER_LINE_PENALTY_FACTOR) + (self.frames_in_wrong_lane_or_wall * WRONG_LANE_PENALTY_FACTOR)
+        return travelled, lane_bonus, base_fit + lane_bonus - lane_penalty
+
+    def fitness_upper_bounds(self, remaining_frames):
+        return np.maximum(0, self._modified_fitness()[2] + remaining_frames * max_fitness_gain_per_frame())
+
+    def fitness_values(self):
+        # Car.get_fitness for every car
+        travelled, lane_bonus, modified_fitness = self._modified_fitness()
+        early_death = (travelled < CAR_SIZE_X * 4) | (self.time_survived < FPS * 3.5)
+        early_death_penalty_factor = np.where((self.frames_in_wrong_lane_or_wall * WRONG_LANE_PENALTY_FACTOR * 1.5) > lane_bonus, 0.005, 0.08)
+        return np.maximum(0, np.where(early_death, modified_fitness * early_death_penalty_factor, modified_fitness))
+
+class CarView(Car):
+    """One car of a CarBatch, exposing the Car attributes used for drawing and click-to-remove."""
+    def __init__(self, batch, index, genome_key):
+        self.batch, self.index = batch, index
+        self.sprite_atlas = batch.sprite_atlas
+        self.genome_key, self.id = genome_key, id(self)
+        self.has_radar_data = True
+
+    position = property(lambda self: self.batch.position[self.index].tolist())
+    center = property(lambda self: self.batch.center[self.index].tolist())
+    angle = property(lambda self: float(self.batch.angle[self.index]))
+    speed = property(lambda self: float(self.batch.speed[self.index]))
+    corners = property(lambda self: self.batch.corners[self.index].ravel().tolist())
+    radar_ends = property(lambda self: self.batch.radar_ends[self.index].ravel().tolist())
+
+    @property
+    def alive(self): return bool(self.batch.alive[self.index])
+    @alive.setter
+    def alive(self, value): self.batch.alive[self.index] = value
+
+    def get_fitness(self): return float(self.batch.fitness_values()[self.index])
+
+class CarSnapshot(Car):
+    """Frozen copy of what Car.draw and the click hit test read from one live car (Car or CarView), taken
+    by the simulation thread for --render-thread. index is the car's position in the generation's car list;
+    fitness is only filled in when --lod needs it."""
+    __slots__ = ('index', 'fitness')
+    def __init__(self, car_obj, index, fitness=0.0):
+        self.sprite_atlas, self.genome_key, self.id, self.index, self.fitness = car_obj.sprite_atlas, car_obj.genome_key, car_obj.id, index, fitness
+        self.position, self.center = array.array('d', car_obj.position), array.array('d', car_obj.center)
+        self.corners, self.radar_ends = array.array('d', car_obj.corners), array.array('d', car_obj.radar_ends)
+        self.angle, self.alive, self.has_radar_data = car_obj.angle, True, car_obj.has_radar_data
+
+    def get_fitness(self): return self.fitness
+
+def car_fitness_values(cars):
+    """Current fitness of each car (Car, CarView or CarSnapshot); the views of a CarBatch share one fitness_values() call."""
+    if cars and isinstance(cars[0], CarView):
+        batch_fitness = cars[0].batch.fitness_values()
+        return batch_fitness[[car_obj.index for car_obj in cars]].tolist()
+    return [car_obj.get_fitness() for car_obj in cars]
+
+SimulationSnapshot = collections.namedtuple("SimulationSnapshot", ["cars", "state"]) # Live CarSnapshots, HUD subset of gen_state
+SNAPSHOT_STATE_KEYS = ("frames_elapsed", "global_best_fitness", "alive_count", "car_count", "total_fitness", "num_alive_for_avg", "steps_per_frame")
+
+def take_simulation_snapshot(cars, gen_state):
+    state = {key: gen_state[key] for key in SNAPSHOT_STATE_KEYS}
+    best_car_details = gen_state["best_car_details"]
+    state["best_car_details"] = dict(best_car_details, inputs=tuple(best_car_details["inputs"]), outputs=tuple(best_car_details["outputs"])) # Copies of the car's live buffers
+    fitness_values = car_fitness_values(cars) if RENDER_LOD_TOP_K > 0 else [0.0] * len(cars)
+    return SimulationSnapshot(tuple(CarSnapshot(car_obj, i_car, fitness_values[i_car]) for i_car, car_obj in enumerate(cars) if car_obj.is_alive()), state)
+
+class SnapshotExchange:
+    """Double buffer between the simulation thread and the window for --render-thread. The simulation
+    publishes into the front slot only while wanted is set, i.e. once the window has taken the previous
+    snapshot, so the intermediate snapshots the window would drop are never built."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._front, self.wanted = None, True
+
+    def publish(self, snapshot):
+        with self._lock: self._front, self.wanted = snapshot, False
+
+    def take(self):
+        # The newest unseen snapshot, or None if nothing was published since the last take
+        with self._lock:
+            snapshot, self._front = self._front, None
+            if snapshot is not None: self.wanted = True
+        return snapshot
+
+class BatchedNetworks:
+    """The generation's feed-forward genomes compiled into padded per-layer weight tensors, so every
+    live car's radar inputs are evaluated in one batched call per frame. Node values live in one row
+    of slots per genome (inputs, outputs, hidden, plus a scratch slot that padded rows write to);
+    each layer is one einsum over the slots. Matches FeedForwardNetwork.activate to float tolerance
+    for sigmoid activation with sum aggregation, the only functions config.txt enables."""
+    def __init__(self, genomes, config):
+        genome_config = config.genome_config
+        input_keys, output_keys = list(genome_config.input_keys), list(genome_config.output_keys)
+        self.num_genomes, self.num_inputs, self.num_outputs = len(genomes), len(input_keys), len(output_keys)
+        compiled = [] # per genome: list of layers, each a list of (target_slot, bias, response, [(source_slot, weight)])
+        max_slots = self.num_inputs + self.num_outputs
+        for _, genome in genomes:
+            slots = {key: i for i, key in enumerate(input_keys + output_keys)}
+            connections = [cg.key for cg in genome.connections.values() if cg.enabled]
+            genome_layers = []
+            for layer in neat.graphs.feed_forward_layers(input_keys, output_keys, connections):
+                layer_evals = []
+                for node in sorted(layer):
+                    node_gene = genome.nodes[node]
+                    if node_gene.activation != "sigmoid" or node_gene.aggregation != "sum":
+                        raise ValueError(f"genome {genome.key} node {node} uses {node_gene.activation}/{node_gene.aggregation}")
+                    slots.setdefault(node, len(slots))
+                    links = [(slots[inode], genome.connections[(inode, onode)].weight) for inode, onode in connections if onode == node]
+                    layer_evals.append((slots[node], node_gene.bias, node_gene.response, links))
+                genome_layers.append(layer_evals)
+            compiled.append(genome_layers); max_slots = max(max_slots, len(slots))
+        self.num_slots, scratch_slot = max_slots + 1, max_slots
+        self.layers = [] # (weights (G,L,S), bias (G,L), response (G,L), target slots (G,L))
+        for depth in range(max((len(genome_layers) for genome_layers in compiled), default=0)):
+            width = max(len(genome_layers[depth]) if depth < len(genome_layers) else 0 for genome_layers in compiled)
+            weights = np.zeros((self.num_genomes, width, self.num_slots)); bias = np.zeros((self.num_genomes, width))
+            response = np.ones((self.num_genomes, width)); targets = np.full((self.num_genomes, width), scratch_slot, dtype=np.int64)
+            for g, genome_layers in enumerate(compiled):
+                if depth >= len(genome_layers): continue
+                for row, (target_slot, node_bias, node_response, links) in enumerate(genome_layers[depth]):
+                    targets[g, row], bias[g, row], response[g, row] = target_slot, node_bias, node_response
+                    for source_slot, weight in links: weights[g, row, source_slot] += weight
+            self.layers.append((weights, bias, response, targets))
+
+    def __len__(self): return self.num_genomes
+
+    def activate(self, genome_indices, inputs):
+        """Outputs (len(genome_indices), num_outputs) for one input row per selected genome."""
+        genome_indices = np.asarray(genome_indices, dtype=np.int64)
+        values = np.zeros((genome_indices.size, self.num_slots))
+        values[:, :self.num_inputs] = inputs
+        rows = np.arange(genome_indices.size)[:, None]
+        for weights, bias, response, targets in self.layers:
+            s = np.einsum('kls,ks->kl', weights[genome_indices], values)
+            z = np.clip(5.0 * (bias[genome_indices] + response[genome_indices] * s), -60.0, 60.0) # neat sigmoid_activation
+            values[rows, targets[genome_indices]] = 1.0 / (1.0 + np.exp(-z))
+        return values[:, self.num_inputs:self.num_inputs + self.num_outputs]
+
+class CompiledNetwork:
+    """One genome's feed-forward network compiled to generated Python: nodes that no output depends on (or
+    that never get all their inputs) are pruned exactly as neat.graphs.feed_forward_layers does, and every
+    remaining node is one line with its weights, bias, response, sum and sigmoid inlined. activate() returns
+    the same outputs as FeedForwardNetwork.activate; choose() returns only the index of the largest output
+    (the action simulation_step takes). Only sigmoid activation with sum aggregation is compiled."""
+    __slots__ = ('genome_key', 'num_nodes', 'source', '_activate', '_choose')
+
+    def __init__(self, genome, config):
+        genome_config = config.genome_config
+        input_keys, output_keys = list(genome_config.input_keys), list(genome_config.output_keys)
+        connections = [cg.key for cg in genome.connections.values() if cg.enabled] # Genome order, which is also neat's summation order
+        names = {key: f"i{i}" for i, key in enumerate(input_keys)}
+        lines = [f"    {', '.join(names[key] for key in input_keys)}{',' if len(input_keys) == 1 else ''} = inputs"]
+        for layer in neat.graphs.feed_forward_layers(input_keys, output_keys, connections):
+            for node in sorted(layer):
+                node_gene = genome.nodes[node]
+                if node_gene.activation != "sigmoid" or node_gene.aggregation != "sum":
+                    raise ValueError(f"genome {genome.key} node {node} uses {node_gene.activation}/{node_gene.aggregation}")
+                terms = [f"{names[inode]} * {genome.connections[(inode, onode)].weight!r}" for inode, onode in connections if onode == node]
+                names[node] = f"n{len(names)}"
+                # neat sigmoid_activation(bias + response * sum(inputs)), clamped to +-60 before the exp
+                lines.append(f"    z = 5.0 * ({node_gene.bias!r} + {node_gene.response!r} * ({' + '.join(terms) or '0.0'}))")
+                lines.append(f"    {names[node]} = 1.0 / (1.0 + exp(60.0 if z < -60.0 else (-60.0 if z > 60.0 else -z)))")
+        outputs = [names.get(key, "0.0") for key in output_keys] # An output that is never evaluated stays 0.0, as in FeedForwardNetwork
+        choose_lines = ["    best, best_index = o0, 0"] + [f"    if o{i} > best: best, best_index = o{i}, {i}" for i in range(1, len(outputs))] # First maximum, like list.index(max(...))
+        self.source = "\n".join(["def activate(inputs):"] + lines + [f"    return [{', '.join(outputs)}]", "def choose(inputs):"] + lines
+                                + [f"    {', '.join(f'o{i}' for i in range(len(outputs)))}{',' if len(outputs) == 1 else ''} = {', '.join(outputs)}"] + choose_lines + ["    return best_index"])
+        namespace = {"exp": math.exp}
+        exec(compile(self.source, f"<genome {genome.key}>", "exec"), namespace)
+        self.genome_key, self.num_nodes, self._activate, self._choose = genome.key, len(names) - len(input_keys), namespace["activate"], namespace["choose"]
+
+    def activate(self, inputs): return self._activate(inputs)
+    def choose(self, inputs): return self._choose(inputs)
+
+_compiled_networks = collections.OrderedDict()
+
+def compile_genome(genome, config):
+    """CompiledNetwork for `genome`, shared by every genome with the same structure and weights (LRU bounded by
+    COMPILED_NN_CACHE_SIZE). Networks hold no state between calls, so sharing them is safe. Raises ValueError
+    for activation or aggregation functions other than sigmoid/sum."""
+    key = (FitnessCache.genome_hash(genome), tuple(config.genome_config.input_keys), tuple(config.genome_config.output_keys))
+    net = _compiled_networks.get(key)
+    if net is None:
+        net = _compiled_networks[key] = CompiledNetwork(genome, config)
+        if len(_compiled_networks) > COMPILED_NN_CACHE_SIZE: _compiled_networks.popitem(last=False)
+    else: _compiled_networks.move_to_end(key)
+    return net
+
+def create_network(genome, config):
+    # Per-genome network: compiled when its functions allow it, neat's FeedForwardNetwork otherwise
+    try: return compile_genome(genome, config)
+    except ValueError: return neat.nn.FeedForwardNetwork.create(genome, config)
 
 class Button:
     def __init__(self,x,y,w,h,txt,fnt,col,h_col,act=None):self.rect,self.text,self.font,self.col,self.hov_col,self.act,self.is_hov=pygame.Rect(x,y,w,h),txt,fnt,col,h_col,act,False
     def draw(self,scr):cur_c=self.hov_col if self.is_hov else self.col;sh_off=2;sh_c=(max(0,cur_c[0]-30),max(0,cur_c[1]-30),max(0,cur_c[2]-30));pygame.draw.rect(scr,sh_c,self.rect.move(sh_off,sh_off),border_radius=8);pygame.draw.rect(scr,cur_c,self.rect,border_radius=8);txt_s=self.font.render(self.text,True,BUTTON_TEXT_COLOR);scr.blit(txt_s,txt_s.get_rect(center=self.rect.center))
-    def handle_event(self,evt):
+    def handle_event(self,evt,run_action=None):
+        # run_action: called with the button's action instead of running it (--render-thread queues it for the simulation)
         if evt.type==pygame.MOUSEMOTION:self.is_hov=self.rect.collidepoint(evt.pos)
-        if evt.type==pygame.MOUSEBUTTONDOWN and self.is_hov and evt.button==1 and self.act:self.act()
+        if evt.type==pygame.MOUSEBUTTONDOWN and self.is_hov and evt.button==1 and self.act:self.act() if run_action is None else run_action(self.act)
 
 def increase_max_speed():
     global global_max_speed, user_requested_speed_change
     global_max_speed+=1.0
     user_requested_speed_change = global_speed_step # Request target speed increase for all cars
+    fitness_cache.invalidate()
     print(f"Max Speed (Increased):{global_max_speed:.1f}")
 
 def decrease_max_speed():
     global global_max_speed,global_min_speed, user_requested_speed_change
     global_max_speed=max(global_min_speed+0.5,global_max_speed-1.0)
     user_requested_speed_change = -global_speed_step # Request target speed decrease
+    fitness_cache.invalidate()
     print(f"Max Speed (Decreased):{global_max_speed:.1f}")
 
+def change_time_warp(direction):
+    global time_warp_mode
+    time_warp_mode = TIME_WARP_MODES[max(0, min(len(TIME_WARP_MODES) - 1, TIME_WARP_MODES.index(time_warp_mode) + direction))]
+    print(f"Time Warp:{time_warp_mode}")
+
+def increase_time_warp(): change_time_warp(1)
+def decrease_time_warp(): change_time_warp(-1)
+
+def time_warp_frame_budget(last_draw_seconds):
+    """(max_steps, deadline) for the next rendered frame: a fixed K, or no step limit and a time.perf_counter()
+    deadline. Steps stop at whichever comes first, but at least one step always runs."""
+    if time_warp_mode == "max": return None, time.perf_counter() + 1.0 / TIME_WARP_MAX_DISPLAY_FPS
+    if time_warp_mode == "adaptive": return None, time.perf_counter() + max(0.0, 1.0 / TIME_WARP_TARGET_FPS - last_draw_seconds)
+    return int(time_warp_mode), None
+
+def time_warp_display_fps():
+    # clock.tick limit for the rendered frames; 0 means no limit
+    return {"max": 0, "adaptive": TIME_WARP_TARGET_FPS}.get(time_warp_mode, FPS)
+
+def max_fitness_gain_per_frame():
+    # Upper bound on how much fitness one frame can add, for --end-when-beaten
+    travel_per_frame = global_max_speed * (EARLY_END_PROGRESS_SLACK if FITNESS_MODE == "progress" else 1.0)
+    return travel_per_frame * DISTANCE_FITNESS_MULTIPLIER + TIME_FITNESS_MULTIPLIER + LANE_REWARD_FACTOR
+
+def attach_track_index(terrain, map_path):
+    """Sets terrain.track_index for --track-progress. Progress fitness falls back to distance without an index."""
+    global FITNESS_MODE
+    terrain.track_index = assets.track_index(map_path, terrain)
+    if terrain.track_index is None and FITNESS_MODE == "progress":
+        print("WARNING: --fitness progress needs a track progress index, using distance fitness."); FITNESS_MODE = "distance"
+
 def request_user_quit():
     global user_quit_simulation
     user_quit_simulation=True
     print("Quit requested.")
 
+class AssetManager:
+    """Process-wide asset cache: the car sprite, scaled map, terrain grid, radar table, fonts and buttons
+    are loaded, scaled and converted once per process instead of once per generation. Derived map data
+    (scaled RGBA pixels, terrain codes, radar tables) is also kept on disk in ASSET_CACHE_DIR, keyed by
+    the source file's content hash and GAME_AREA_WIDTH/GAME_AREA_HEIGHT, so new runs and worker
+    processes start without redoing any image work."""
+    def __init__(self, cache_dir=ASSET_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._memory = {}
+        self._content_hashes = {} # path -> (mtime, size, sha1)
+
+    def content_hash(self, path):
+        stat = os.stat(path)
+        cached = self._content_hashes.get(path)
+        if cached is None or cached[:2] != (stat.st_mtime, stat.st_size):
+            with open(path, 'rb') as f: cached = (stat.st_mtime, stat.st_size, hashlib.sha1(f.read()).hexdigest())
+            self._content_hashes[path] = cached
+        return cached[2]
+
+    def cache_path(self, source_path, kind):
+        # kind is a suffix such as "terrain" or "radar-h72-d108.npy"; the key also covers the game area size
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return os.path.join(self.cache_dir, f"{self.content_hash(source_path)[:16]}-{GAME_AREA_WIDTH}x{GAME_AREA_HEIGHT}-{kind}")
+
+    def _write_atomic(self, path, data):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f: f.write(data)
+        os.replace(tmp_path, path)
+
+    def car_sprite(self):
+        if "car_sprite" not in self._memory:
+            self._memory["car_sprite"] = pygame.transform.scale(pygame.image.load(CAR_IMAGE_PATH).convert_alpha(), (CAR_SIZE_X, CAR_SIZE_Y))
+        return self._memory["car_sprite"]
+
+    def sprite_atlas(self):
+        return SpriteAtlas.for_sprite(self.car_sprite())
+
+    def map_surface(self, map_path):
+        key = ("map", map_path)
+        if key not in self._memory:
+            raw_path, size = self.cache_path(map_path, "map.rgba"), (GAME_AREA_WIDTH, GAME_AREA_HEIGHT)
+            map_sfc = None
+            if os.path.exists(raw_path) and os.path.getsize(raw_path) == size[0] * size[1] * 4:
+                with open(raw_path, 'rb') as f: map_sfc = pygame.image.frombytes(f.read(), size, "RGBA").convert_alpha()
+            if map_sfc is None:
+                map_sfc = pygame.transform.scale(pygame.image.load(map_path).convert_alpha(), size)
+                self._write_atomic(raw_path, pygame.image.tobytes(map_sfc, "RGBA"))
+            self._memory[key] = map_sfc
+        return self._memory[key]
+
+    def terrain(self, map_path):
+        key = ("terrain", map_path)
+        if key not in self._memory:
+            # The color constants are part of the key, so changing a classification color rebuilds the grid
+            colors_key = hashlib.sha1(repr((OBSTACLE_WHITE_MIN_RGB, OBSTACLE_WHITE_MAX_RGB, ROAD_COLOR_RGBA, CENTER_LINE_COLOR_RGBA, FINISH_LINE_GREEN_COLOR_RGBA)).encode()).hexdigest()[:8]
+            grid_path = self.cache_path(map_path, f"terrain-{colors_key}")
+            if os.path.exists(grid_path) and os.path.getsize(grid_path) == GAME_AREA_WIDTH * GAME_AREA_HEIGHT:
+                with open(grid_path, 'rb') as f: terrain = TerrainGrid(GAME_AREA_WIDTH, GAME_AREA_HEIGHT, bytearray(f.read()))
+            else:
+                terrain = TerrainGrid.from_surface(self.map_surface(map_path))
+                self._write_atomic(grid_path, bytes(terrain.cells))
+            self._memory[key] = terrain
+        return self._memory[key]
+
+    def track_index(self, map_path, terrain=None):
+        start_xy = (int(INITIAL_POSITION[0] + CAR_SIZE_X / 2), int(INITIAL_POSITION[1] + CAR_SIZE_Y / 2))
+        key = ("track_index", map_path, start_xy)
+        if key not in self._memory:
+            index_path = self.cache_path(map_path, f"track-{start_xy[0]}x{start_xy[1]}-b{TRACK_BARRIER_OFFSET}.npy")
+            track_index = TrackProgressIndex.load_or_build(terrain or self.terrain(map_path), index_path, start_xy)
+            if track_index is None: print(f"WARNING: Car start {start_xy} is not drivable on '{map_path}', no track progress index.")
+            self._memory[key] = track_index
+        return self._memory[key]
+
+    def radar_table(self, map_path, terrain=None):
+        key = ("radar_table", map_path, RADAR_TABLE_HEADINGS)
+        if key not in self._memory:
+            table_path = self.cache_path(map_path, f"radar-h{RADAR_TABLE_HEADINGS}-d{MAX_RADAR_DISTANCE}.npy")
+            self._memory[key] = RadarTable.load_or_build(terrain or self.terrain(map_path), table_path, RADAR_TABLE_HEADINGS)
+        return self._memory[key]
+
+    def fonts(self):
+        if "fonts" not in self._memory:
+            try:
+                title_font, info_font, stats_font, button_font = pygame.font.SysFont("Arial",18,True), pygame.font.SysFont("Arial",14), pygame.font.SysFont("Arial",12), pygame.font.SysFont("Arial",14,True)
+                viz_font = pygame.font.SysFont("Arial",16,True)
+            except: title_font,info_font,stats_font,button_font,viz_font = pygame.font.Font(None,24),pygame.font.Font(None,20),pygame.font.Font(None,18),pygame.font.Font(None,20),pygame.font.Font(None,22)
+            self._memory["fonts"] = (title_font, info_font, stats_font, button_font, viz_font)
+        return self._memory["fonts"]
+
+    def waiting_panel(self, panel_size):
+        key = ("waiting_panel", tuple(panel_size))
+        if key not in self._memory:
+            empty_viz_surface=pygame.Surface(panel_size,pygame.SRCALPHA); empty_viz_surface.fill(NN_PANEL_BG_COLOR)
+            txt_s_viz_text=self.fonts()[4].render("Waiting for network...",True,(200,200,220))
+            empty_viz_surface.blit(txt_s_viz_text,txt_s_viz_text.get_rect(center=(panel_size[0]//2,panel_size[1]//2)))
+            self._memory[key] = empty_viz_surface
+        return self._memory[key]
+
+    def ui_elements(self):
+        if "ui_elements" not in self._memory:
+            button_font = self.fonts()[3]
+            btn_panel_x = WINDOW_WIDTH - 150 - VIZ_PANEL_X_OFFSET; ui_button_width=140
+            self._memory["ui_elements"] = [
+                Button(btn_panel_x,20,ui_button_width,30,"Max Speed (+)",button_font,BUTTON_COLOR,BUTTON_HOVER_COLOR,increase_max_speed),
+                Button(btn_panel_x,60,ui_button_width,30,"Max Speed (-)",button_font,BUTTON_COLOR,BUTTON_HOVER_COLOR,decrease_max_speed),
+                Button(btn_panel_x,140,ui_button_width,30,"Time Warp (+)",button_font,BUTTON_COLOR,BUTTON_HOVER_COLOR,increase_time_warp),
+                Button(btn_panel_x,180,ui_button_width,30,"Time Warp (-)",button_font,BUTTON_COLOR,BUTTON_HOVER_COLOR,decrease_time_warp),
+                Button(btn_panel_x, WINDOW_HEIGHT - 50 - VIZ_PANEL_Y_OFFSET, ui_button_width, 30, "QUIT", button_font, BUTTON_COLOR, BUTTON_HOVER_COLOR, request_user_quit)
+            ]
+        return self._memory["ui_elements"]
+
+assets = AssetManager()
+
+_text_surface_cache = collections.OrderedDict()
+
+def render_text_cached(font_obj, text_content, color):
+    # HUD values repeat a lot (alive counts, times, speeds), so rendered text surfaces are kept in a small LRU
+    cache_key = (font_obj, text_content, color)
+    rendered_text = _text_surface_cache.get(cache_key)
+    if rendered_text is None:
+        rendered_text = _text_surface_cache[cache_key] = font_obj.render(text_content, True, color)
+        if len(_text_surface_cache) > TEXT_SURFACE_CACHE_SIZE: _text_surface_cache.popitem(last=False)
+    else: _text_surface_cache.move_to_end(cache_key)
+    return rendered_text
+
+def draw_text_with_background(text_content,font_obj,pos_tuple,surface_obj,pad_x=5,pad_y=2,text_col=None, bg_col=None):
+    actual_text_color, actual_bg_color = text_col or TEXT_COLOR, bg_col or INFO_TEXT_BACKGROUND_COLOR
+    rendered_text = render_text_cached(font_obj,text_content,actual_text_color)
+    bg_rect = rendered_text.get_rect(topleft=pos_tuple); bg_rect.inflate_ip(pad_x*2,pad_y*2)
+    shadow_rect = bg_rect.move(1,1); pygame.draw.rect(surface_obj,(0,0,0,max(0, actual_bg_color[3]-150 if len(actual_bg_color)>3 else 50)),shadow_rect,border_radius=5)
+    pygame.draw.rect(surface_obj,actual_bg_color,bg_rect,border_radius=5); surface_obj.blit(rendered_text,(pos_tuple[0]+pad_x, pos_tuple[1]+pad_y))
+    return rendered_text.get_height() + pad_y*2
+
+class FrameRenderer:
+    """Retained-mode drawing for the windowed simulation. The window background (fill + scaled map) is kept
+    as a surface and each frame only restores and redraws what changed: the patches under the cars' previous
+    and current drawings, HUD text whose content changed, buttons whose hover state changed and the NN panel
+    when its picture changed. present() passes just those rectangles to pygame.display.update. The first
+    frame after invalidate() (new generation, window exposed) and every frame with --full-redraw are composed
+    from scratch and flipped. HUD text is assumed not to overlap cars, buttons or the NN panel."""
+    def __init__(self):
+        self.screen, self.background, self.background_key = None, None, None
+        self.needs_full_redraw, self.full_frame = True, True
+        self.dirty_rects, self.restored_rects, self.car_rects = [], [], []
+        self.text_slots, self.frame_text_slots = {}, {} # pos -> (text args, rect)
+        self.button_states, self.panel_state = {}, None
+        self.drawn_cars, self.hit_grid = None, None # The cars as last drawn and, once a click needed it, their CarHitGrid
+
+    def invalidate(self): self.needs_full_redraw, self.drawn_cars, self.hit_grid = True, None, None
+
+    def restore(self, rect):
+        rect = pygame.Rect(rect).clip(self.screen.get_rect())
+        self.screen.blit(self.background, rect, rect); self.dirty_rects.append(rect); self.restored_rects.append(rect)
+
+    def begin_frame(self, screen, g_map_scaled):
+        background_key = (id(screen), id(g_map_scaled), screen.get_size())
+        if background_key != self.background_key:
+            self.background = pygame.Surface(screen.get_size()).convert(screen)
+            self.background.fill(WINDOW_BG_COLOR); self.background.blit(g_map_scaled, (GAME_AREA_X_OFFSET, GAME_AREA_Y_OFFSET))
+            self.background_key, self.needs_full_redraw = background_key, True
+        self.screen = screen
+        self.full_frame, self.needs_full_redraw = self.needs_full_redraw or not DIRTY_RECT_RENDERING, False
+        self.dirty_rects, self.restored_rects, self.frame_text_slots = [], [], {}
+        if self.full_frame:
+            screen.blit(self.background, (0, 0))
+            self.car_rects, self.text_slots, self.button_states, self.panel_state = [], {}, {}, None
+
+    def draw_cars(self, cars):
+        if not self.full_frame:
+            if len(self.car_rects) > DIRTY_RECT_MAX_CAR_RECTS: self.restore(self.car_rects[0].unionall(self.car_rects))
+            else:
+                for car_rect in self.car_rects: self.restore(car_rect)
+        live_cars = [car_to_draw for car_to_draw in cars if car_to_draw.is_alive()]
+        if RENDER_LOD_TOP_K <= 0 or len(live_cars) <= RENDER_LOD_TOP_K: self.car_rects = [car_to_draw.draw(self.screen) for car_to_draw in live_cars]
+        else: self.car_rects = self._draw_cars_lod(live_cars)
+        if not self.full_frame: self.dirty_rects.extend(self.car_rects)
+        self.drawn_cars, self.hit_grid = cars, None
+
+    def _draw_cars_lod(self, live_cars):
+        """--lod: full Car.draw for the RENDER_LOD_TOP_K fittest cars and the selected car, a point or one
+        heatmap blit for all the others. Returns the drawn rects."""
+        fitness_values = car_fitness_values(live_cars)
+        detailed = set(heapq.nlargest(RENDER_LOD_TOP_K, range(len(live_cars)), key=fitness_values.__getitem__))
+        detailed.update(i_car for i_car, car_obj in enumerate(live_cars) if car_obj.genome_key == selected_car_key)
+        others = [i_car for i_car in range(len(live_cars)) if i_car not in detailed]
+        if RENDER_LOD_STYLE == "heatmap": drawn_rects = [self._draw_heatmap([live_cars[i_car] for i_car in others])]
+        else:
+            best_fitness = max(fitness_values) or 1.0
+            colors = [tuple(int(low + (high - low) * step / 7) for low, high in zip(LOD_POINT_COLOR_LOW, LOD_POINT_COLOR_HIGH)) for step in range(8)]
+            fill, offset_x, offset_y = self.screen.fill, GAME_AREA_X_OFFSET - LOD_POINT_SIZE // 2, GAME_AREA_Y_OFFSET - LOD_POINT_SIZE // 2
+            drawn_rects = []
+            for i_car in others:
+                center = live_cars[i_car].center
+                color = colors[max(0, min(7, int(7 * fitness_values[i_car] / best_fitness)))]
+                drawn_rects.append(fill(color, (int(center[0]) + offset_x, int(center[1]) + offset_y, LOD_POINT_SIZE, LOD_POINT_SIZE)))
+        # Detailed cars last, so they stay on top of the points and the heatmap
+        drawn_rects.extend(live_cars[i_car].draw(self.screen) for i_car in sorted(detailed))
+        return drawn_rects
+
+    def _draw_heatmap(self, cars):
+        # Car density per LOD_HEATMAP_CELL square, scaled up to the game area and blitted in one call
+        grid_width, grid_height = -(-GAME_AREA_WIDTH // LOD_HEATMAP_CELL), -(-GAME_AREA_HEIGHT // LOD_HEATMAP_CELL)
+        counts = collections.Counter()
+        for car_obj in cars:
+            cell_x, cell_y = int(car_obj.center[0]) // LOD_HEATMAP_CELL, int(car_obj.center[1]) // LOD_HEATMAP_CELL
+            if 0 <= cell_x < grid_width and 0 <= cell_y < grid_height: counts[cell_y * grid_width + cell_x] += 1
+        pixels = bytearray(grid_width * grid_height * 4)
+        for i_cell, count in counts.items(): pixels[i_cell * 4:i_cell * 4 + 4] = bytes((*LOD_HEATMAP_COLOR, min(255, count * LOD_HEATMAP_ALPHA_STEP)))
+        cells_surface = pygame.image.frombuffer(pixels, (grid_width, grid_height), "RGBA").convert_alpha(self.screen) # Blitting in the screen's pixel format is ~15x faster
+        heatmap = pygame.transform.scale(cells_surface, (grid_width * LOD_HEATMAP_CELL, grid_height * LOD_HEATMAP_CELL))
+        return self.screen.blit(heatmap, (GAME_AREA_X_OFFSET, GAME_AREA_Y_OFFSET)).clip(pygame.Rect(GAME_AREA_X_OFFSET, GAME_AREA_Y_OFFSET, GAME_AREA_WIDTH, GAME_AREA_HEIGHT))
+
+    def car_hit_grid(self, cars):
+        # Built on the first click after a frame and kept for the others: most frames have no click to test
+        if self.hit_grid is None or self.hit_grid.cars is not cars: self.hit_grid = CarHitGrid(cars)
+        return self.hit_grid
+
+    def draw_text(self, text_content, font_obj, pos_tuple, pad_x=5, pad_y=2, text_col=None, bg_col=None):
+        """Queues HUD text at pos_tuple (the position identifies the slot); drawn by present() only if it changed.
+        Returns the line height like draw_text_with_background."""
+        text_args = (text_content, font_obj, pad_x, pad_y, text_col, bg_col)
+        rendered_text = render_text_cached(font_obj, text_content, text_col or TEXT_COLOR)
+        bg_rect = rendered_text.get_rect(topleft=pos_tuple).inflate(pad_x*2, pad_y*2)
+        self.frame_text_slots[pos_tuple] = (text_args, bg_rect.union(bg_rect.move(1, 1)))
+        return rendered_text.get_height() + pad_y*2
+
+    def draw_buttons(self, ui_elements):
+        for ui_el in ui_elements:
+            button_state = (ui_el.is_hov, ui_el.text, tuple(ui_el.rect))
+            button_rect = ui_el.rect.union(ui_el.rect.move(2, 2)) # Button shadow is offset by 2px
+            # A button the car restore painted over is redrawn even if its state did not change
+            if self.full_frame or self.button_states.get(id(ui_el)) != button_state or button_rect.collidelist(self.restored_rects) != -1:
+                if not self.full_frame: self.restore(button_rect)
+                ui_el.draw(self.screen); self.button_states[id(ui_el)] = button_state
+
+    def draw_panel(self, panel_rect, blits):
+        # blits: (surface, position) pairs; the surfaces are cached, so their ids identify the panel picture
+        panel_state = tuple((id(surface), tuple(dest)) for surface, dest in blits)
+        if self.full_frame or panel_state != self.panel_state or panel_rect.collidelist(self.restored_rects) != -1:
+            if not self.full_frame: self.restore(panel_rect)
+            self.screen.blits(blits, doreturn=False); self.panel_state = panel_state
+
+    def _flush_text(self):
+        changed = {pos for pos, slot in self.frame_text_slots.items() if self.full_frame or self.text_slots.get(pos, (None,))[0] != slot[0]}
+        if not self.full_frame:
+            for pos, (_, old_rect) in self.text_slots.items():
+                if pos in changed or pos not in self.frame_text_slots: self.restore(old_rect)
+            for pos in changed: self.restore(self.frame_text_slots[pos][1])
+            # Lines overlap by their 1px shadows: unchanged text touching a restored or redrawn area is redrawn too
+            damaged = True
+            while damaged:
+                damaged = False
+                for pos, (_, slot_rect) in self.frame_text_slots.items():
+                    if pos not in changed and slot_rect.collidelist(self.restored_rects) != -1:
+                        changed.add(pos); self.restore(slot_rect); damaged = True
+        for pos, ((text_content, font_obj, pad_x, pad_y, text_col, bg_col), slot_rect) in self.frame_text_slots.items():
+            if pos not in changed: continue # Redrawn in frame order, so overlapping shadows stack as in a full frame
+            draw_text_with_background(text_content, font_obj, pos, self.screen, pad_x, pad_y, text_col, bg_col)
+            if not self.full_frame: self.dirty_rects.append(slot_rect)
+        self.text_slots = self.frame_text_slots
+
+    def present(self):
+        self._flush_text()
+        if self.full_frame: pygame.display.flip()
+        elif self.dirty_rects: pygame.display.update(self.dirty_rects)
+
+frame_renderer = FrameRenderer()
+
+class CarHitGrid:
+    """Uniform grid over the screen for click hit tests: every cell lists the live cars whose on-screen rect
+    overlaps it, so a click only tests the few cars of its cell instead of every car. FrameRenderer builds one
+    from the cars as they were drawn; car_at returns the highest index that was hit, like the old reverse scan.
+    The views of a whole CarBatch are binned with NumPy instead of reading every view's properties."""
+    def __init__(self, cars, cell_size=HIT_GRID_CELL_SIZE):
+        self.cars, self.cell_size, self.cells = cars, cell_size, {}
+        if cars and isinstance(cars[0], CarView) and cars is cars[0].batch.views: self._add_batch(cars[0].batch); return
+        for i_car, car_obj in enumerate(cars):
+            if not car_obj.is_alive(): continue
+            position = car_obj.position
+            left, top = int(position[0]) + GAME_AREA_X_OFFSET, int(position[1]) + GAME_AREA_Y_OFFSET
+            for cell_x in range(left // cell_size, (left + CAR_SIZE_X - 1) // cell_size + 1):
+                for cell_y in range(top // cell_size, (top + CAR_SIZE_Y - 1) // cell_size + 1):
+                    self.cells.setdefault((cell_x, cell_y), []).append(i_car)
+
+    def _add_batch(self, batch):
+        # Same cells as the loop in __init__: int() truncation, then the cells under each corner of the car rect
+        live = np.flatnonzero(batch.alive)
+        corners = batch.position[live].astype(np.int64) + (GAME_AREA_X_OFFSET, GAME_AREA_Y_OFFSET)
+        first, last = corners // self.cell_size, (corners + (CAR_SIZE_X - 1, CAR_SIZE_Y - 1)) // self.cell_size
+        cell_codes, car_indices = [], []
+        for step_x in range(2): # A car rect spans at most two cells per axis (cell_size >= the car size)
+            for step_y in range(2):
+                covered = (first[:, 0] + step_x <= last[:, 0]) & (first[:, 1] + step_y <= last[:, 1])
+                cell_codes.append(((first[covered, 0] + step_x) << 32) | (first[covered, 1] + step_y)); car_indices.append(live[covered])
+        cell_codes, car_indices = np.concatenate(cell_codes), np.concatenate(car_indices)
+        order = np.lexsort((car_indices, cell_codes)) # Ascending car index within a cell, as the loop appends them
+        cell_codes, car_indices = cell_codes[order], car_indices[order]
+        starts = np.flatnonzero(np.r_[True, cell_codes[1:] != cell_codes[:-1]]) if len(cell_codes) else cell_codes
+        car_indices, bounds = car_indices.tolist(), starts.tolist() + [len(cell_codes)]
+        for i_cell, code in enumerate(cell_codes[starts].tolist()): self.cells[(code >> 32, code & 0xFFFFFFFF)] = car_indices[bounds[i_cell]:bounds[i_cell + 1]]
+
+    def car_at(self, pos):
+        # Index into self.cars of the last live car whose rect contains pos, -1 for none
+        for i_car in reversed(self.cells.get((pos[0] // self.cell_size, pos[1] // self.cell_size), ())):
+            car_obj = self.cars[i_car]
+            if car_obj.is_alive() and car_obj.get_rect_on_screen().collidepoint(pos): return i_car
+        return -1
+
+def remove_car(cars, genomes, car_index):
+    """Click-to-remove: the car stops and its genome gets MANUAL_REMOVAL_FITNESS."""
+    car_to_remove = cars[car_index]
+    if not car_to_remove.is_alive(): return # --render-thread: it may have died since the snapshot that was clicked
+    if car_index < len(genomes) and genomes[car_index] and len(genomes[car_index]) > 1 and genomes[car_index][1]:
+         genomes[car_index][1].fitness = MANUAL_REMOVAL_FITNESS
+    print(f"Car index {car_index} (Genome: {car_to_remove.genome_key}, ID: {car_to_remove.id}) manually removed.")
+    car_to_remove.alive = False
+
+def select_car(car_obj):
+    # Right click: toggles the car --lod always draws in full detail
+    global selected_car_key
+    selected_car_key = None if selected_car_key == car_obj.genome_key else car_obj.genome_key
+    print(f"Car (Genome: {car_obj.genome_key}) {'selected' if selected_car_key is not None else 'deselected'}.")
+
+def handle_simulation_events(cars, genomes, ui_elements, commands=None):
+    """Processes pending pygame events (quit, ESC, click-to-remove, right-click select, buttons). Returns False on quit.
+    With a commands queue (--render-thread) cars are CarSnapshots, and removals and button actions are
+    queued for the simulation thread instead of being applied here."""
+    keep_running = True
+    queue_action = None if commands is None else (lambda action: commands.put((SIM_COMMAND_CALL, action)))
+    for event in pygame.event.get():
+        if event.type==pygame.QUIT: request_user_quit(); keep_running=False
+        if event.type==pygame.KEYDOWN and event.key==pygame.K_ESCAPE: request_user_quit(); keep_running=False
+        if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED): frame_renderer.invalidate() # Only a full redraw repairs an exposed window
+        if event.type==pygame.MOUSEBUTTONDOWN and event.button in (1, 3):
+            # The cars of the last drawn frame are what was clicked on; --render-thread snapshots carry their car index
+            drawn_cars = frame_renderer.drawn_cars
+            hit_grid = frame_renderer.car_hit_grid(cars if drawn_cars is None or (commands is None and drawn_cars is not cars) else drawn_cars)
+            clicked_car_index = hit_grid.car_at(event.pos)
+            if clicked_car_index != -1 and event.button == 3: select_car(hit_grid.cars[clicked_car_index])
+            elif clicked_car_index != -1:
+                if commands is not None: commands.put((SIM_COMMAND_REMOVE_CAR, hit_grid.cars[clicked_car_index].index))
+                else: remove_car(cars, genomes, clicked_car_index)
+        for ui_el in ui_elements:ui_el.handle_event(event, queue_action)
+    return keep_running
+
+SIM_COMMAND_REMOVE_CAR, SIM_COMMAND_CALL = "remove_car", "call" # --render-thread command queue entries: (command, argument)
+
+def apply_simulation_commands(commands, cars, genomes):
+    # Runs on the simulation thread between two steps, so a command never lands in the middle of one
+    while True:
+        try: command, argument = commands.get_nowait()
+        except queue.Empty: return
+        if command == SIM_COMMAND_REMOVE_CAR: remove_car(cars, genomes, argument)
+        elif command == SIM_COMMAND_CALL: argument()
+
+def control_schedule(gen_state):
+    """(control_step, sense_step) for the coming physics step: NN decisions are made every CONTROL_INTERVAL steps
+    and the radars are scanned on the step right before each decision."""
+    steps_done = gen_state["frames_elapsed"] // SIMULATION_DT
+    return steps_done % CONTROL_INTERVAL == 0, (steps_done + 1) % CONTROL_INTERVAL == 0
+
+def simulation_step(cars, nets, genomes, terrain, gen_state):
+    """Advances every live car by one frame: NN decision, Car.update and fitness bookkeeping.
+    Contains no drawing, so headless and windowed runs produce the same fitness values.
+    Returns False once the generation is over (no cars left or time limit reached)."""
+    global user_requested_speed_change
+
+    # Apply user requested speed changes globally
+    if user_requested_speed_change != 0.0:
+        for car_obj in cars:
+            if car_obj.is_alive():
+                car_obj.target_speed += user_requested_speed_change
+        user_requested_speed_change = 0.0 # Reset request
+
+    total_fitness_this_frame, num_alive_cars_for_avg_fitness = 0.0, 0
+    current_gen_best_fitness_val = -float('inf')
+    current_gen_best_car, current_gen_best_car_genome_obj, current_gen_best_car_action_idx = None, None, -1
+    global_best_fitness_local = gen_state["global_best_fitness"]
+    control_step, sense_step = control_schedule(gen_state)
+    batched_outputs = None
+    if control_step and isinstance(nets, BatchedNetworks):
+        alive_indices = [i_car for i_car, car_obj in enumerate(cars) if car_obj.is_alive() and i_car < len(nets)]
+        if alive_indices: batched_outputs = dict(zip(alive_indices, nets.activate(alive_indices, [cars[i_car].get_data_for_nn() for i_car in alive_indices]).tolist()))
+
+    for i_car, car_obj in enumerate(cars):
+        if car_obj.is_alive():
+            nn_input_data=car_obj.get_data_for_nn()
+            if i_car < len(nets) and i_car < len(genomes) and not control_step:
+                nn_choice_index = car_obj.last_nn_output.index(max(car_obj.last_nn_output)) if car_obj.has_nn_output else -1 # Holding the last decision
+            elif i_car < len(nets) and i_car < len(genomes):
+                nn_output_actions=batched_outputs[i_car] if batched_outputs is not None else nets[i_car].activate(nn_input_data)
+                if not nn_output_actions or len(nn_output_actions) != len(ACTION_LABELS): car_obj.alive = False; continue
+                last_nn_output = car_obj.last_nn_output
+                for i_output in range(len(last_nn_output)): last_nn_output[i_output] = nn_output_actions[i_output]
+                car_obj.has_nn_output = True
+                nn_choice_index=nn_output_actions.index(max(nn_output_actions))
+                if nn_choice_index==0: car_obj.target_angle = (car_obj.target_angle + ANGLE_STEP) % 360
+                elif nn_choice_index==1: car_obj.target_angle = (car_obj.target_angle - ANGLE_STEP + 360) % 360
+                elif nn_choice_index==2: car_obj.target_speed -= global_speed_step
+                elif nn_choice_index==3: car_obj.target_speed += global_speed_step
+                car_obj.target_speed = max(global_min_speed, min(car_obj.target_speed, global_max_speed)) # Clamp after NN and global adjustment
+            else: car_obj.alive = False; continue
+            car_obj.update(terrain, sense_step)
+            if car_obj.is_alive():
+                current_car_fitness = car_obj.get_fitness()
+                genomes[i_car][1].fitness = current_car_fitness
+                total_fitness_this_frame += current_car_fitness; num_alive_cars_for_avg_fitness += 1
+                if current_car_fitness > current_gen_best_fitness_val:
+                    current_gen_best_fitness_val, current_gen_best_car, current_gen_best_car_genome_obj, current_gen_best_car_action_idx = current_car_fitness, car_obj, genomes[i_car][1], nn_choice_index
+                if current_car_fitness > global_best_fitness_local: global_best_fitness_local = current_car_fitness
+    if current_gen_best_car_genome_obj:
+        # Updated in place; inputs/outputs are the best car's own buffers, which hold this step's values until its next step
+        best_car_details = gen_state["best_car_details"]
+        best_car_details["genome"], best_car_details["chosen_action_idx"], best_car_details["fitness"] = current_gen_best_car_genome_obj, current_gen_best_car_action_idx, current_gen_best_fitness_val
+        best_car_details["inputs"], best_car_details["outputs"] = current_gen_best_car.last_radar_data, current_gen_best_car.last_nn_output
+    elif num_alive_cars_for_avg_fitness == 0 and gen_state["frames_elapsed"] > 0 : gen_state["best_car_details"]["genome"] = None
+    gen_state["global_best_fitness"] = global_best_fitness_local
+    gen_state["generation_best_fitness"] = max(gen_state["generation_best_fitness"], current_gen_best_fitness_val)
+    gen_state["total_fitness"], gen_state["num_alive_for_avg"] = total_fitness_this_frame, num_alive_cars_for_avg_fitness
+
+    keep_running = True
+    current_alive_cars_count = num_alive_cars_for_avg_fitness # Every car still alive after its update was counted above
+    gen_state["alive_count"] = current_alive_cars_count
+    if current_alive_cars_count == 0 and gen_state["frames_elapsed"] > FPS :
+        keep_running = False
+        if gen_state["log_events"]: print("No cars left, ending generation.")
+    elif EARLY_GENERATION_END and current_alive_cars_count > 0 and gen_state["frames_elapsed"] % STAGNATION_CHECK_INTERVAL < SIMULATION_DT:
+        remaining_frames = GENERATION_TIME_LIMIT_SECONDS * FPS - gen_state["frames_elapsed"]
+        if max(c.fitness_upper_bound(remaining_frames) for c in cars if c.is_alive()) <= gen_state["generation_best_fitness"]:
+            keep_running = False
+            if gen_state["log_events"]: print("No car left can beat this generation's best, ending generation.")
+    gen_state["frames_elapsed"]+=SIMULATION_DT
+    if gen_state["frames_elapsed"] >= GENERATION_TIME_LIMIT_SECONDS * FPS:
+        keep_running=False
+        if gen_state["log_events"]: print(f"Time limit ({GENERATION_TIME_LIMIT_SECONDS}s) reached.")
+    return keep_running
+
+def simulation_step_batch(car_batch, nets, genomes, terrain, gen_state):
+    """simulation_step for the CarBatch engine: per-car NN decisions, then one vectorized physics step."""
+    global user_requested_speed_change
+    alive = car_batch.alive
+    if user_requested_speed_change != 0.0:
+        car_batch.target_speed[alive] += user_requested_speed_change
+        user_requested_speed_change = 0.0
+
+    control_step, sense_step = control_schedule(gen_state)
+    nn_inputs = car_batch.get_data_for_nn()
+    choices = np.full(car_batch.num_cars, -1, dtype=np.int64) # -1 everywhere on steps between decisions: the targets are held
+    if not control_step: pass
+    elif isinstance(nets, BatchedNetworks):
+        alive[min(len(nets), len(genomes)):] = False
+        alive_idx = np.flatnonzero(alive)
+        if alive_idx.size:
+            nn_output_actions = nets.activate(alive_idx, nn_inputs[alive_idx])
+            car_batch.last_nn_output[alive_idx] = nn_output_actions; choices[alive_idx] = np.argmax(nn_output_actions, axis=1)
+    else:
+        for i_car in np.flatnonzero(alive).tolist():
+            if i_car < len(nets) and i_car < len(genomes):
+                nn_output_actions=nets[i_car].activate(nn_inputs[i_car].tolist())
+                if not nn_output_actions or len(nn_output_actions) != len(ACTION_LABELS): alive[i_car] = False; continue
+                car_batch.last_nn_output[i_car] = nn_output_actions
+                choices[i_car] = nn_output_actions.index(max(nn_output_actions))
+            else: alive[i_car] = False
+    car_batch.apply_actions(choices)
+    car_batch.step(terrain, sense_step)
+
+    fitness_values = car_batch.fitness_values()
+    alive_idx = np.flatnonzero(alive)
+    for i_car, current_car_fitness in zip(alive_idx.tolist(), fitness_values[alive_idx].tolist()): genomes[i_car][1].fitness = current_car_fitness
+    gen_state["total_fitness"], gen_state["num_alive_for_avg"] = float(fitness_values[alive_idx].sum()), int(alive_idx.size)
+    if alive_idx.size:
+        best_idx = int(alive_idx[np.argmax(fitness_values[alive_idx])]); current_gen_best_fitness_val = float(fitness_values[best_idx])
+        gen_state["best_car_details"] = {"genome": genomes[best_idx][1], "inputs": nn_inputs[best_idx].tolist(), "outputs": car_batch.last_nn_output[best_idx].tolist(), "chosen_action_idx": int(np.argmax(car_batch.last_nn_output[best_idx])), "fitness": current_gen_best_fitness_val}
+        if current_gen_best_fitness_val > gen_state["global_best_fitness"]: gen_state["global_best_fitness"] = current_gen_best_fitness_val
+        gen_state["generation_best_fitness"] = max(gen_state["generation_best_fitness"], current_gen_best_fitness_val)
+    elif gen_state["frames_elapsed"] > 0: gen_state["best_car_details"]["genome"] = None
+
+    keep_running = True
+    gen_state["alive_count"] = int(alive_idx.size)
+    if alive_idx.size == 0 and gen_state["frames_elapsed"] > FPS :
+        keep_running = False
+        if gen_state["log_events"]: print("No cars left, ending generation.")
+    elif EARLY_GENERATION_END and alive_idx.size and gen_state["frames_elapsed"] % STAGNATION_CHECK_INTERVAL < SIMULATION_DT:
+        remaining_frames = GENERATION_TIME_LIMIT_SECONDS * FPS - gen_state["frames_elapsed"]
+        if car_batch.fitness_upper_bounds(remaining_frames)[alive_idx].max() <= gen_state["generation_best_fitness"]:
+            keep_running = False
+            if gen_state["log_events"]: print("No car left can beat this generation's best, ending generation.")
+    gen_state["frames_elapsed"]+=SIMULATION_DT
+    if gen_state["frames_elapsed"] >= GENERATION_TIME_LIMIT_SECONDS * FPS:
+        keep_running=False
+        if gen_state["log_events"]: print(f"Time limit ({GENERATION_TIME_LIMIT_SECONDS}s) reached.")
+    return keep_running
+
+def draw_simulation_frame(screen, cars, g_map_scaled, fonts, ui_elements, viz_rect, config_neat_obj, gen_state, generation_count):
+    title_font, info_font, stats_font, button_font, _ = fonts
+    stats_panel_x_actual = STATS_PANEL_X_OFFSET
+    btn_panel_x = WINDOW_WIDTH - 150 - VIZ_PANEL_X_OFFSET
+    best_car_details_current_gen = gen_state["best_car_details"]
+
+    frame_renderer.begin_frame(screen, g_map_scaled)
+    frame_renderer.draw_cars(cars)
+
+    y_offset_info_panel=VIZ_PANEL_Y_OFFSET + 10
+    h = frame_renderer.draw_text(f"Gen: {generation_count}",title_font,(stats_panel_x_actual,y_offset_info_panel));y_offset_info_panel+=h+3
+    h = frame_renderer.draw_text(f"Alive: {gen_state['alive_count']}/{gen_state['car_count']}",info_font,(stats_panel_x_actual,y_offset_info_panel));y_offset_info_panel+=h+1
+    h = frame_renderer.draw_text(f"Time: {gen_state['frames_elapsed']//FPS}s / {GENERATION_TIME_LIMIT_SECONDS}s",info_font,(stats_panel_x_actual,y_offset_info_panel));y_offset_info_panel+=h+5
+    current_gen_best_fit_display = best_car_details_current_gen["fitness"] if best_car_details_current_gen["fitness"] > -float('inf') else 0.0
+    h = frame_renderer.draw_text(f"Gen. Best Fit: {current_gen_best_fit_display:.0f}",stats_font,(stats_panel_x_actual,y_offset_info_panel));y_offset_info_panel+=h+1
+    h = frame_renderer.draw_text(f"Global Best Fit: {gen_state['global_best_fitness']:.0f}",stats_font,(stats_panel_x_actual,y_offset_info_panel));y_offset_info_panel+=h+1
+    avg_fitness_display = gen_state["total_fitness"] / gen_state["num_alive_for_avg"] if gen_state["num_alive_for_avg"] > 0 else 0.0
+    h = frame_renderer.draw_text(f"Gen. Avg. Fit: {avg_fitness_display:.0f}",stats_font,(stats_panel_x_actual,y_offset_info_panel));y_offset_info_panel+=h+3
+
+    best_genome_for_viz = best_car_details_current_gen["genome"]
+    if best_genome_for_viz:
+        cfg_genome_conf = config_neat_obj.genome_config
+        num_inputs, num_outputs = len(cfg_genome_conf.input_keys), len(cfg_genome_conf.output_keys)
+        num_hidden = len([nk for nk in best_genome_for_viz.nodes if nk not in cfg_genome_conf.input_keys and nk not in cfg_genome_conf.output_keys])
+        active_conns = len([c for c in best_genome_for_viz.connections.values() if c.enabled])
+        h = frame_renderer.draw_text("Best Car NN:",stats_font,(stats_panel_x_actual,y_offset_info_panel));y_offset_info_panel+=h+1
+        h = frame_renderer.draw_text(f" Inputs: {num_inputs}",stats_font,(stats_panel_x_actual,y_offset_info_panel),2,1);y_offset_info_panel+=h
+        h = frame_renderer.draw_text(f" Outputs: {num_outputs}",stats_font,(stats_panel_x_actual,y_offset_info_panel),2,1);y_offset_info_panel+=h
+        h = frame_renderer.draw_text(f" Hidden N.: {num_hidden}",stats_font,(stats_panel_x_actual,y_offset_info_panel),2,1);y_offset_info_panel+=h
+        h = frame_renderer.draw_text(f" Active Con.: {active_conns}/{len(best_genome_for_viz.connections)}",stats_font,(stats_panel_x_actual,y_offset_info_panel),2,1);y_offset_info_panel+=h
+        h = frame_renderer.draw_text(f" Genome ID: {best_genome_for_viz.key}",stats_font,(stats_panel_x_actual,y_offset_info_panel),2,1);y_offset_info_panel+=h+3
+        h = frame_renderer.draw_text("Best Car Data:",stats_font,(stats_panel_x_actual,y_offset_info_panel));y_offset_info_panel+=h+1
+        viz_inputs, viz_outputs, viz_action_idx = best_car_details_current_gen["inputs"], best_car_details_current_gen["outputs"], best_car_details_current_gen["chosen_action_idx"]
+        if viz_inputs: h = frame_renderer.draw_text(" Radars: "+", ".join([f"{v_rad:.2f}" for v_rad in viz_inputs]),stats_font,(stats_panel_x_actual,y_offset_info_panel),2,1);y_offset_info_panel+=h
+        if viz_outputs and viz_action_idx != -1 and len(viz_outputs) == len(ACTION_LABELS):
+            y_action_text_start=y_offset_info_panel
+            for i_text,val_text in enumerate(viz_outputs):
+                lbl_text, text_color_action = ACTION_LABELS[i_text], SELECTED_ACTION_COLOR if i_text==viz_action_idx else TEXT_COLOR
+                h_act_text = frame_renderer.draw_text(f" {lbl_text}: {val_text:.2f}",stats_font,(stats_panel_x_actual,y_action_text_start),2,1,text_color_action); y_action_text_start+=h_act_text
+            y_offset_info_panel = y_action_text_start
+    if PROFILER_ENABLED: y_offset_info_panel = profiler.draw_overlay(stats_font, stats_panel_x_actual, y_offset_info_panel + 6)
+
+    max_speed_text_y, max_speed_text_x_coord = 100 + VIZ_PANEL_Y_OFFSET, btn_panel_x + 5
+    frame_renderer.draw_text(f"Max Speed:{global_max_speed:.1f}",info_font,(max_speed_text_x_coord, max_speed_text_y))
+    time_warp_text = f"{time_warp_mode}x" if time_warp_mode not in ("max", "adaptive") else f"{time_warp_mode} ({gen_state['steps_per_frame']}x)"
+    frame_renderer.draw_text(f"Time Warp:{time_warp_text}",info_font,(max_speed_text_x_coord, max_speed_text_y + 120))
+    frame_renderer.draw_buttons(ui_elements)
+    if viz_rect.width>5 and viz_rect.height>5:
+        if best_genome_for_viz: frame_renderer.draw_panel(viz_rect, neat_visualization_blits(best_genome_for_viz,config_neat_obj,best_car_details_current_gen["inputs"],best_car_details_current_gen["outputs"],viz_rect))
+        else: frame_renderer.draw_panel(viz_rect, [(assets.waiting_panel(viz_rect.size), viz_rect.topleft)])
+
+def present_frame(clock, fps=FPS):
+    frame_renderer.present(); clock.tick(fps)
+
+def create_generation_cars(genomes, config_neat_obj, sprite_atlas):
+    """One car and network per genome. Returns (cars, nets, car_batch); car_batch is None for the scalar engine."""
+    batched_nets = None
+    if genomes and BATCHED_NN_ENABLED and np is not None:
+        # Tried first so the per-genome networks are only compiled when they are actually used
+        try: batched_nets = BatchedNetworks(genomes, config_neat_obj)
+        except ValueError as e: print(f"WARNING: Batched NN inference unavailable, using per-genome networks: {e}")
+    nets,cars,car_genomes=[],[],[]
+    for i,(gid,gobj) in enumerate(genomes):
+        try:
+            new_car = Car(sprite_atlas)
+            if gobj: new_car.genome_key = gobj.key
+            if batched_nets is None: nets.append(create_network(gobj,config_neat_obj))
+            gobj.fitness=0.0
+            cars.append(new_car); car_genomes.append(gobj)
+        except Exception as e:
+            g_key_str = str(gobj.key) if gobj and hasattr(gobj, 'key') else "N/A"
+            print(f"ERROR: NN/Car creation failed for genome {gid} (Key: {g_key_str}): {e}"); continue
+    if batched_nets is not None and len(cars) == len(genomes): nets = batched_nets
+    elif batched_nets is not None: nets = [create_network(gobj, config_neat_obj) for gobj in car_genomes] # Batched rows must line up with the cars
+    car_batch = None
+    if cars and PHYSICS_ENGINE == "batch" and np is not None:
+        car_batch = CarBatch(sprite_atlas, [car_obj.genome_key for car_obj in cars]); cars = car_batch.views
+    return cars, nets, car_batch
+
+def new_generation_state(global_best_fitness, num_cars):
+    return {"frames_elapsed": 0, "global_best_fitness": global_best_fitness, "generation_best_fitness": -float('inf'), "alive_count": num_cars, "car_count": num_cars, "total_fitness": 0.0, "num_alive_for_avg": 0, "log_events": True, "steps_per_frame": 1, "car_steps": 0,
+            "best_car_details": {"genome": None, "inputs": [], "outputs": [], "chosen_action_idx": -1, "fitness": -float('inf')}}
+
+def step_generation(cars, nets, car_batch, genomes, terrain, gen_state):
+    gen_state["car_steps"] += gen_state["alive_count"]
+    if car_batch is not None: keep_running = simulation_step_batch(car_batch, nets, genomes, terrain, gen_state)
+    else: keep_running = simulation_step(cars, nets, genomes, terrain, gen_state)
+    if "recorder" in gen_state: gen_state["recorder"].record(cars, car_batch)
+    return keep_running
+
+def final_fitness_flags(cars, gen_state):
+    # A car's fitness is final once it is dead or the generation ran its full time; cars still alive after
+    # a quit or an early end (--end-when-beaten) only have a truncated fitness
+    completed = gen_state["frames_elapsed"] >= GENERATION_TIME_LIMIT_SECONDS * FPS
+    return [completed or not car_obj.is_alive() for car_obj in cars]
+
+class FitnessCache:
+    """Fitness of genomes that were already simulated, keyed by a structural hash of the genome (nodes,
+    connections, weights, biases, enabled flags) plus the map and the settings that change the simulation.
+    The simulation is deterministic, so elites that DefaultReproduction carries over unchanged are looked up
+    instead of driven again. LRU bounded by FITNESS_CACHE_SIZE. Changing the max speed mid-run calls
+    invalidate(), which also stops the running generation from storing its (mixed speed) results."""
+    def __init__(self, max_entries=FITNESS_CACHE_SIZE):
+        self.max_entries, self.entries = max_entries, collections.OrderedDict()
+        self.epoch = 0 # Bumped by invalidate()
+
+    @staticmethod
+    def genome_hash(genome):
+        nodes = sorted((node_key, node.bias, node.response, node.activation, node.aggregation) for node_key, node in genome.nodes.items())
+        connections = sorted((conn_key, conn.weight, conn.enabled) for conn_key, conn in genome.connections.items())
+        return hashlib.sha1(repr((nodes, connections)).encode()).hexdigest()
+
+    @staticmethod
+    def simulation_key():
+        return (assets.content_hash(MAP_IMAGE_PATH), FPS, global_initial_speed, global_min_speed, global_speed_step) + tuple(sorted(get_simulation_settings().items()))
+
+    def lookup(self, genomes, simulation_key):
+        """Writes the cached fitness to every hit. Returns (genomes still to simulate, best cached fitness)."""
+        to_simulate, best_fitness = [], -float('inf')
+        for genome_id, gobj in genomes:
+            key = (self.genome_hash(gobj), simulation_key)
+            fitness = self.entries.get(key)
+            if fitness is None: to_simulate.append((genome_id, gobj)); continue
+            self.entries.move_to_end(key)
+            gobj.fitness = fitness; best_fitness = max(best_fitness, fitness)
+        return to_simulate, best_fitness
+
+    def store(self, genomes, final_flags, simulation_key, epoch):
+        if epoch != self.epoch or len(final_flags) != len(genomes): return
+        for (_, gobj), final in zip(genomes, final_flags):
+            if not final or gobj.fitness is None or gobj.fitness < 0: continue # Truncated, or removed by a click
+            key = (self.genome_hash(gobj), simulation_key)
+            self.entries[key] = gobj.fitness; self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries: self.entries.popitem(last=False)
+
+    def invalidate(self):
+        self.entries.clear(); self.epoch += 1
+
+fitness_cache = FitnessCache()
+
+# --- TRAJECTORY RECORDING (--record) AND REPLAY (--replay) ---
+TRAJECTORY_MAGIC = b"CARTRAJ1" # Followed by one byte, b"l" or b"b": the byte order of the arrays
+TRAJECTORY_CHUNK_HEADER = struct.Struct("<4sI") # Chunk tag, payload size in bytes
+TRAJECTORY_FRAMES_HEADER = struct.Struct("<III") # Start of every FRMS payload: first frame, frames, cars
+trajectory_writer = None # TrajectoryWriter while --record is on
+
+def write_trajectory_chunk(file_obj, tag, *payload_parts):
+    file_obj.write(TRAJECTORY_CHUNK_HEADER.pack(tag, sum(len(part) for part in payload_parts)))
+    for part in payload_parts: file_obj.write(part)
+
+def read_frames_chunk(file_obj, byteswap=False):
+    """Reads the next FRMS chunk: (first frame, frames, cars, values, actions), or None at the end of the file.
+    values holds x, y, angle, speed per car and frame (float32), actions the chosen action (int8, -1: not alive)."""
+    while True:
+        header = file_obj.read(TRAJECTORY_CHUNK_HEADER.size)
+        if len(header) < TRAJECTORY_CHUNK_HEADER.size: return None
+        tag, size = TRAJECTORY_CHUNK_HEADER.unpack(header)
+        payload = file_obj.read(size)
+        if len(payload) < size: return None # Truncated by a crash mid-write
+        if tag == b"FRMS": break
+    first_frame, num_frames, num_cars = TRAJECTORY_FRAMES_HEADER.unpack_from(payload)
+    values_end = TRAJECTORY_FRAMES_HEADER.size + num_frames * num_cars * 16
+    values, actions = array.array('f'), array.array('b')
+    values.frombytes(payload[TRAJECTORY_FRAMES_HEADER.size:values_end]); actions.frombytes(payload[values_end:])
+    if byteswap: values.byteswap()
+    return first_frame, num_frames, num_cars, values, actions
+
+class TrajectoryRecorder:
+    """Per-frame x, y, angle, speed and chosen action of every car of one generation (or one worker's slice),
+    appended to array('f')/array('b') buffers and written to a spool file every TRAJECTORY_CHUNK_FRAMES
+    frames, so memory stays at one chunk whatever the population and generation length.
+    TrajectoryWriter.append_generation copies the top-K cars from the spools into the recording."""
+    def __init__(self, spool_path, num_cars):
+        self.spool_path, self.num_cars = spool_path, num_cars
+        self.spool = open(spool_path, 'wb')
+        self.frames, self.chunk_start = 0, 0
+        self.values, self.actions = array.array('f'), array.array('b')
+
+    def record(self, cars, car_batch=None):
+        if car_batch is not None:
+            car_state = np.column_stack((car_batch.position, car_batch.angle, car_batch.speed)).astype(np.float32)
+            self.values.frombytes(car_state.tobytes())
+            self.actions.frombytes(np.where(car_batch.alive, np.argmax(car_batch.last_nn_output, axis=1), -1).astype(np.int8).tobytes())
+        else:
+            for car_obj in cars:
+                self.values.extend((car_obj.position[0], car_obj.position[1], car_obj.angle, car_obj.speed))
+                nn_output = car_obj.last_nn_output
+                self.actions.append(nn_output.index(max(nn_output)) if car_obj.is_alive() and car_obj.has_nn_output else -1)
+        self.frames += 1
+        if self.frames - self.chunk_start >= TRAJECTORY_CHUNK_FRAMES: self._flush()
+
+    def _flush(self):
+        if self.frames == self.chunk_start: return
+        write_trajectory_chunk(self.spool, b"FRMS", TRAJECTORY_FRAMES_HEADER.pack(self.chunk_start, self.frames - self.chunk_start, self.num_cars),
+                               self.values.tobytes(), self.actions.tobytes())
+        self.values, self.actions, self.chunk_start = array.array('f'), array.array('b'), self.frames
+
+    def close(self):
+        self._flush(); self.spool.close()
+        return self.spool_path
+
+class TrajectoryWriter:
+    """The --record file: TRAJECTORY_MAGIC, then per generation a GENR chunk (JSON: generation, map, fps and the
+    recorded cars' genome keys and fitness, best first, and the simulation run, as generations restart at 1 each run), FRMS chunks of up to TRAJECTORY_CHUNK_FRAMES frames
+    with one column per recorded car, and a GEND chunk. Every chunk starts with its tag and size, so
+    TrajectoryReader indexes a recording without reading the frames. Flushed after every generation."""
+    def __init__(self, path, top_k=RECORD_TOP_K):
+        self.path, self.top_k, self.run = path, top_k, 1 # run: set by the main loop at the start of every simulation run
+        self.file = open(path, 'wb'); self.file.write(TRAJECTORY_MAGIC + sys.byteorder[0].encode())
+        atexit.register(self.close)
+
+    def spool_path(self, index=0): return f"{self.path}.{os.getpid()}-{index}.spool"
+
+    def append_generation(self, generation, spools):
+        """spools: (spool path, genomes in spool car order) per recorder of this generation, one per worker slice
+        with --workers. Keeps the top_k cars by fitness over all spools, then deletes the spool files."""
+        ranked = sorted(((gobj.fitness or 0.0, spool_index, car_index, gobj.key) for spool_index, (_, spool_genomes) in enumerate(spools)
+                         for car_index, (_, gobj) in enumerate(spool_genomes)), key=lambda entry: entry[0], reverse=True)
+        if self.top_k > 0: ranked = ranked[:self.top_k]
+        spool_columns = [[] for _ in spools] # Per spool: (column in the recording, car index in the spool)
+        for column, (_, spool_index, car_index, _) in enumerate(ranked): spool_columns[spool_index].append((column, car_index))
+        meta = {"run": self.run, "generation": generation, "map": MAP_IMAGE_PATH, "fps": FPS / SIMULATION_DT, "cars": [{"genome": key, "fitness": fitness} for fitness, _, _, key in ranked]}
+        write_trajectory_chunk(self.file, b"GENR", json.dumps(meta).encode())
+        num_columns, total_frames = len(ranked), 0
+        spool_files = [open(spool_path, 'rb') for spool_path, _ in spools]
+        try:
+            while True: # Recorders flush every TRAJECTORY_CHUNK_FRAMES frames, so the spools' n-th chunks cover the same frames
+                chunks = [read_frames_chunk(spool_file) for spool_file in spool_files]
+                if all(chunk is None for chunk in chunks): break
+                num_frames = max(chunk[1] for chunk in chunks if chunk is not None)
+                values, actions = array.array('f', [0.0]) * (num_frames * num_columns * 4), array.array('b', [-1]) * (num_frames * num_columns)
+                for chunk, columns in zip(chunks, spool_columns):
+                    if chunk is None or not columns: continue # A slice whose cars all died earlier stays not alive
+                    _, chunk_frames, num_cars, chunk_values, chunk_actions = chunk
+                    for frame in range(chunk_frames):
+                        for column, car_index in columns:
+                            src, dst = frame * num_cars + car_index, frame * num_columns + column
+                            values[dst * 4:dst * 4 + 4] = chunk_values[src * 4:src * 4 + 4]; actions[dst] = chunk_actions[src]
+                write_trajectory_chunk(self.file, b"FRMS", TRAJECTORY_FRAMES_HEADER.pack(total_frames, num_frames, num_columns), values.tobytes(), actions.tobytes())
+                total_frames += num_frames
+        finally:
+            for spool_file in spool_files: spool_file.close()
+            for spool_path, _ in spools: os.remove(spool_path)
+        write_trajectory_chunk(self.file, b"GEND", struct.pack("<I", total_frames))
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed: self.file.close()
+        for spool_path in glob.glob(f"{glob.escape(self.path)}.{os.getpid()}-*.spool"): os.remove(spool_path) # Left by an interrupted generation
+
+class TrajectoryReader:
+    """Indexes a --record file from its chunk headers and reads frames one chunk at a time (the last chunk read
+    is kept), so seeking through a long recording never loads more than one chunk."""
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        header = self.file.read(len(TRAJECTORY_MAGIC) + 1)
+        if header[:len(TRAJECTORY_MAGIC)] != TRAJECTORY_MAGIC: raise ValueError(f"'{path}' is not a trajectory recording")
+        self.byteswap = header[len(TRAJECTORY_MAGIC):] != sys.byteorder[0].encode()
+        self.generations, self._chunk_key, self._chunk = [], None, None # generations: {"meta", "chunks": [(first frame, offset)], "frames"}
+        file_size = os.fstat(self.file.fileno()).st_size
+        while True:
+            chunk_header = self.file.read(TRAJECTORY_CHUNK_HEADER.size)
+            if len(chunk_header) < TRAJECTORY_CHUNK_HEADER.size: break
+            tag, size = TRAJECTORY_CHUNK_HEADER.unpack(chunk_header)
+            offset = self.file.tell() - TRAJECTORY_CHUNK_HEADER.size
+            if offset + TRAJECTORY_CHUNK_HEADER.size + size > file_size: break # Truncated by a crash mid-write
+            if tag == b"GENR": self.generations.append({"meta": json.loads(self.file.read(size)), "chunks": [], "frames": 0}); continue
+            if tag == b"FRMS" and self.generations:
+                first_frame, num_frames, _ = TRAJECTORY_FRAMES_HEADER.unpack(self.file.read(TRAJECTORY_FRAMES_HEADER.size))
+                generation = self.generations[-1]; generation["chunks"].append((first_frame, offset)); generation["frames"] = first_frame + num_frames
+                size -= TRAJECTORY_FRAMES_HEADER.size
+            self.file.seek(size, os.SEEK_CUR)
+        self.generations = [generation for generation in self.generations if generation["frames"] > 0]
+
+    def frame(self, generation_index, frame):
+        """(values, actions, row) of the chunk holding `frame`; car i of that frame is at row * cars + i."""
+        chunks = self.generations[generation_index]["chunks"]
+        chunk_index = max(0, bisect.bisect_right([first_frame for first_frame, _ in chunks], frame) - 1)
+        if self._chunk_key != (generation_index, chunk_index):
+            self.file.seek(chunks[chunk_index][1])
+            self._chunk, self._chunk_key = read_frames_chunk(self.file, self.byteswap), (generation_index, chunk_index)
+        first_frame, num_frames, _, values, actions = self._chunk
+        return values, actions, min(frame - first_frame, num_frames - 1)
+
+def run_replay(path, screen, clock):
+    """--replay: plays a --record file back in the simulation window from the recorded car states alone, no
+    networks and no physics. Space pauses, Left/Right seek (one frame while paused), Up/Down change the speed,
+    PageUp/PageDown switch generation, Home restarts the generation, Esc quits."""
+    try: reader = TrajectoryReader(path)
+    except (OSError, ValueError) as e: print(f"ERROR: Replay not loaded: {e}"); return
+    if not reader.generations: print(f"ERROR: No recorded generations in '{path}'."); return
+    title_font, info_font, stats_font, _, _ = assets.fonts()
+    sprite_atlas = assets.sprite_atlas()
+    generation_index, frame_position, speed_index, paused = 0, 0.0, REPLAY_SPEEDS.index(1), False
+    cars, g_map_scaled = None, None
+    while True:
+        generation = reader.generations[generation_index]; meta = generation["meta"]
+        if cars is None:
+            try: g_map_scaled = assets.map_surface(meta["map"])
+            except pygame.error as e: print(f"ERROR: Map not loaded: {e}"); return
+            cars = [Car(sprite_atlas) for _ in meta["cars"]]; frame_renderer.invalidate()
+            pygame.display.set_caption(f"NEAT Car Evolution - Replay Run {meta.get('run', 1)} Gen: {meta['generation']}")
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE): return
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED): frame_renderer.invalidate()
+            if event.type != pygame.KEYDOWN: continue
+            if event.key == pygame.K_SPACE: paused = not paused
+            elif event.key in (pygame.K_RIGHT, pygame.K_LEFT):
+                frame_position += (1 if paused else REPLAY_SEEK_SECONDS * meta["fps"]) * (1 if event.key == pygame.K_RIGHT else -1)
+            elif event.key == pygame.K_UP: speed_index = min(len(REPLAY_SPEEDS) - 1, speed_index + 1)
+            elif event.key == pygame.K_DOWN: speed_index = max(0, speed_index - 1)
+            elif event.key == pygame.K_HOME: frame_position = 0.0
+            elif event.key in (pygame.K_PAGEUP, pygame.K_PAGEDOWN):
+                generation_index = max(0, min(len(reader.generations) - 1, generation_index + (1 if event.key == pygame.K_PAGEDOWN else -1)))
+                frame_position, cars = 0.0, None
+        if cars is None: continue
+        frame_position = max(0.0, min(frame_position, generation["frames"] - 1))
+        values, actions, row = reader.frame(generation_index, int(frame_position))
+        num_cars, alive_count = len(cars), 0
+        for car_index, car_obj in enumerate(cars):
+            base = row * num_cars + car_index
+            car_obj.position[0], car_obj.position[1], car_obj.angle, car_obj.speed = values[base * 4], values[base * 4 + 1], values[base * 4 + 2], values[base * 4 + 3]
+            car_corner_points(car_obj.position[0] + CAR_SIZE_X / 2, car_obj.position[1] + CAR_SIZE_Y / 2, car_obj.angle, car_obj.corners)
+            car_obj.alive = actions[base] >= 0; alive_count += car_obj.alive
+
+        frame_renderer.begin_frame(screen, g_map_scaled)
+        frame_renderer.draw_cars(cars)
+        x, y = STATS_PANEL_X_OFFSET, VIZ_PANEL_Y_OFFSET + 10
+        h = frame_renderer.draw_text(f"Replay Run {meta.get('run', 1)} Gen: {meta['generation']}", title_font, (x, y)); y += h + 3
+        h = frame_renderer.draw_text(f"Generation {generation_index + 1}/{len(reader.generations)} in recording", info_font, (x, y)); y += h + 1
+        h = frame_renderer.draw_text(f"Alive: {alive_count}/{num_cars}", info_font, (x, y)); y += h + 1
+        h = frame_renderer.draw_text(f"Time: {int(frame_position) / meta['fps']:.1f}s / {generation['frames'] / meta['fps']:.1f}s", info_font, (x, y)); y += h + 1
+        h = frame_renderer.draw_text("Paused" if paused else f"Speed: {REPLAY_SPEEDS[speed_index]:g}x", info_font, (x, y)); y += h + 5
+        h = frame_renderer.draw_text("Recorded cars (best first):", stats_font, (x, y)); y += h + 1
+        for rank, car_meta in enumerate(meta["cars"][:10]):
+            action = actions[row * num_cars + rank]
+            action_text = ACTION_LABELS[action] if 0 <= action < len(ACTION_LABELS) else "-"
+            h = frame_renderer.draw_text(f" #{rank + 1} Genome {car_meta['genome']}: {car_meta['fitness']:.0f} ({action_text})", stats_font, (x, y), 2, 1); y += h
+        y += 5
+        for help_line in ("Space: pause", "Left/Right: seek", "Up/Down: speed", "PgUp/PgDn: generation", "Home: restart", "Esc: quit"):
+            h = frame_renderer.draw_text(help_line, stats_font, (x, y), 2, 1); y += h
+        frame_renderer.present(); clock.tick(FPS)
+        if not paused: frame_position += REPLAY_SPEEDS[speed_index] * meta["fps"] / FPS # Recorded at one frame per physics step
+
+# --- PARALLEL EVALUATION (--workers N) ---
+_worker_terrain, _worker_config, _worker_shared_map = None, None, None
+_parallel_evaluator = None
+
+def get_simulation_settings():
+    # Module globals a worker must mirror so its slice simulates exactly like the main process would
+    return {"global_max_speed": global_max_speed, "PHYSICS_ENGINE": PHYSICS_ENGINE, "BATCHED_NN_ENABLED": BATCHED_NN_ENABLED,
+            "RADAR_TABLE_ENABLED": RADAR_TABLE_ENABLED, "GENERATION_TIME_LIMIT_SECONDS": GENERATION_TIME_LIMIT_SECONDS, "MAP_IMAGE_PATH": MAP_IMAGE_PATH,
+            "TRACK_PROGRESS_ENABLED": TRACK_PROGRESS_ENABLED, "TRACK_PROGRESS_WINDOW_FRAMES": TRACK_PROGRESS_WINDOW_FRAMES, "FITNESS_MODE": FITNESS_MODE, "EARLY_GENERATION_END": EARLY_GENERATION_END,
+            "SIMULATION_DT": SIMULATION_DT, "CONTROL_INTERVAL": CONTROL_INTERVAL, "SWEPT_COLLISION": SWEPT_COLLISION}
+
+def apply_simulation_settings(settings):
+    globals().update(settings)
+
+def _init_parallel_worker(shared_map_name, map_width, map_height, config_neat_obj, settings):
+    global _worker_terrain, _worker_config, _worker_shared_map
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl+C is handled by the main process, which terminates the pool
+    signal.signal(signal.SIGTERM, signal.SIG_DFL) # Forked after pygame.init: drop SDL's handler so Pool.terminate works
+    _worker_shared_map = shared_memory.SharedMemory(name=shared_map_name) # Attach, never copied per generation
+    _worker_terrain = TerrainGrid(map_width, map_height, _worker_shared_map.buf[:map_width * map_height])
+    _worker_config = config_neat_obj
+    apply_simulation_settings(settings)
+    if RADAR_TABLE_ENABLED and np is not None: _worker_terrain.radar_table = assets.radar_table(MAP_IMAGE_PATH, _worker_terrain)
+    if TRACK_PROGRESS_ENABLED and np is not None: attach_track_index(_worker_terrain, MAP_IMAGE_PATH)
+
+def simulate_genomes_headless(genomes, config_neat_obj, terrain, spool_path=None):
+    """Runs one whole generation for `genomes` without events or drawing; fitness is written to the genomes.
+    With spool_path the trajectories are recorded there (gen_state["spool_path"], None if nothing was recorded)."""
+    cars, nets, car_batch = create_generation_cars(genomes, config_neat_obj, None)
+    gen_state = new_generation_state(0.0, len(cars)); gen_state["log_events"] = False
+    if spool_path is not None and cars and len(cars) == len(genomes): gen_state["recorder"] = TrajectoryRecorder(spool_path, len(cars))
+    while cars and step_generation(cars, nets, car_batch, genomes, terrain, gen_state): pass
+    gen_state["final_fitness"] = final_fitness_flags(cars, gen_state) if len(cars) == len(genomes) else []
+    gen_state["spool_path"] = gen_state.pop("recorder").close() if "recorder" in gen_state else None
+    return gen_state
+
+def _evaluate_genome_slice(task):
+    genome_slice, settings, spool_path = task
+    apply_simulation_settings(settings)
+    gen_state = simulate_genomes_headless(genome_slice, _worker_config, _worker_terrain, spool_path)
+    return [gobj.fitness for _, gobj in genome_slice], gen_state["final_fitness"], gen_state["spool_path"], gen_state["car_steps"]
+
+class ParallelEvaluator:
+    """Splits each generation across a multiprocessing pool; every worker runs the headless simulation
+    step for its slice of cars. The classified map is published once through multiprocessing.shared_memory
+    and workers attach to it in their initializer, so only genomes and fitness values cross processes."""
+    def __init__(self, num_workers, terrain, config_neat_obj):
+        self.num_workers = num_workers
+        self.shared_map = shared_memory.SharedMemory(create=True, size=len(terrain.cells))
+        self.shared_map.buf[:len(terrain.cells)] = terrain.cells
+        self.pool = multiprocessing.Pool(num_workers, initializer=_init_parallel_worker,
+                                         initargs=(self.shared_map.name, terrain.width, terrain.height, config_neat_obj, get_simulation_settings()))
+        atexit.register(self.close)
+
+    def evaluate(self, genomes, poll_callback=None, trajectory_writer=None):
+        """Writes fitness to every genome and returns (best fitness, final_fitness_flags in genome order, trajectory
+        spools, car steps simulated). With trajectory_writer every slice records to its own spool; the spools are (spool path, slice)
+        pairs for TrajectoryWriter.append_generation. poll_callback runs while waiting; returning False aborts
+        (None is returned)."""
+        slices = [genomes[i::self.num_workers] for i in range(self.num_workers)] # Strided, so slow and fast genomes mix
+        slices = [genome_slice for genome_slice in slices if genome_slice]
+        settings = get_simulation_settings()
+        tasks = [(genome_slice, settings, trajectory_writer.spool_path(i) if trajectory_writer is not None else None) for i, genome_slice in enumerate(slices)]
+        async_result = self.pool.map_async(_evaluate_genome_slice, tasks)
+        while not async_result.ready():
+            if poll_callback is not None and poll_callback() is False: return None
+            async_result.wait(0.05)
+        best_fitness, final_by_genome, spools, car_steps = -float('inf'), {}, [], 0
+        for genome_slice, (slice_fitness, slice_final, spool_path, slice_car_steps) in zip(slices, async_result.get()):
+            for (_, gobj), fitness in zip(genome_slice, slice_fitness): gobj.fitness = fitness; best_fitness = max(best_fitness, fitness)
+            car_steps += slice_car_steps
+            if len(slice_final) == len(genome_slice): final_by_genome.update((id(gobj), final) for (_, gobj), final in zip(genome_slice, slice_final))
+            if spool_path is not None: spools.append((spool_path, genome_slice))
+        return best_fitness, [final_by_genome.get(id(gobj), False) for _, gobj in genomes], spools, car_steps
+
+    def close(self):
+        if self.pool is None: return
+        self.pool.terminate(); self.pool.join(); self.pool = None
+        self.shared_map.close(); self.shared_map.unlink()
+
+# --- DISTRIBUTED EVALUATION (--distributed HOST:PORT, --worker HOST:PORT) ---
+_distributed_task_queue, _distributed_result_queue, _distributed_job_board = None, None, None
+
+class DistributedJobBoard:
+    """Lives in the coordinator's manager process: the current job (NEAT config and map content hash), the
+    map bytes workers download once per hash, and the generation whose tasks are still wanted."""
+    def __init__(self):
+        self._job, self._maps, self._generation = None, {}, None
+
+    def publish_job(self, job, map_bytes):
+        self._job, self._maps = job, {job["map_hash"]: map_bytes}
+
+    def job(self): return self._job
+    def map_data(self, map_hash): return self._maps.get(map_hash)
+    def set_generation(self, generation): self._generation = generation
+    def generation(self): return self._generation
+
+def _get_distributed_task_queue():
+    global _distributed_task_queue
+    if _distributed_task_queue is None: _distributed_task_queue = queue.Queue()
+    return _distributed_task_queue
+
+def _get_distributed_result_queue():
+    global _distributed_result_queue
+    if _distributed_result_queue is None: _distributed_result_queue = queue.Queue()
+    return _distributed_result_queue
+
+def _get_distributed_job_board():
+    global _distributed_job_board
+    if _distributed_job_board is None: _distributed_job_board = DistributedJobBoard()
+    return _distributed_job_board
+
+class DistributedQueueManager(BaseManager): pass
+DistributedQueueManager.register("get_task_queue", callable=_get_distributed_task_queue)
+DistributedQueueManager.register("get_result_queue", callable=_get_distributed_result_queue)
+DistributedQueueManager.register("get_job_board", callable=_get_distributed_job_board)
+
+def parse_address(text):
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+def is_loopback_host(host):
+    # The manager protocol unpickles whatever an authenticated peer sends, so only loopback binds may use a generated key
+    try: return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError): return False
+
+def _init_manager_server():
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # The coordinator shuts the server down itself
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+class DistributedEvaluator:
+    """Coordinator side of distributed evaluation: a multiprocessing.managers server holds a task queue, a
+    result queue and a DistributedJobBoard. Each generation is cut into batches of DISTRIBUTED_BATCH_SIZE
+    genomes; --worker processes (run_distributed_worker) take batches and send back fitness values only.
+    Batches without a result after the timeout, or far slower than the rest, are queued again and the first
+    result wins. Calling the evaluator as (genomes, config) makes it a neat fitness function by itself."""
+    def __init__(self, address, config_neat_obj, authkey, local_workers=0):
+        self.config = config_neat_obj
+        self.manager = DistributedQueueManager(address=address, authkey=authkey.encode())
+        self.manager.start(_init_manager_server)
+        self.tasks, self.results, self.board = self.manager.get_task_queue(), self.manager.get_result_queue(), self.manager.get_job_board()
+        self.address, self.job_id, self.map_hash, self.generation = self.manager.address, 0, None, 0
+        connect_host = "127.0.0.1" if self.address[0] in ("", "0.0.0.0") else self.address[0]
+        worker_env = dict(os.environ, **{DISTRIBUTED_AUTHKEY_ENV: authkey})
+        self.local_workers = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker", f"{connect_host}:{self.address[1]}"], env=worker_env)
+                              for _ in range(local_workers)]
+        print(f"Distributed coordinator listening on {self.address[0]}:{self.address[1]} ({local_workers} local workers)")
+        atexit.register(self.close)
+
+    def _publish_job(self):
+        # A new job id whenever the map changes, so workers reload their terrain and tables
+        map_hash = assets.content_hash(MAP_IMAGE_PATH)
+        if map_hash == self.map_hash: return
+        with open(MAP_IMAGE_PATH, 'rb') as f: map_bytes = f.read()
+        self.job_id, self.map_hash = self.job_id + 1, map_hash
+        self.board.publish_job({"job_id": self.job_id, "config": self.config, "map_hash": map_hash, "map_ext": os.path.splitext(MAP_IMAGE_PATH)[1]}, map_bytes)
+
+    def evaluate(self, genomes, poll_callback=None, trajectory_writer=None):
+        """Same contract as ParallelEvaluator.evaluate. Trajectories stay on the workers, so nothing is recorded
+        (the spool list is always empty)."""
+        self._publish_job()
+        self.generation += 1; self.board.set_generation(self.generation)
+        num_batches = max(1, -(-len(genomes) // DISTRIBUTED_BATCH_SIZE))
+        batches = [genomes[i::num_batches] for i in range(num_batches)] # Strided, so slow and fast genomes mix
+        settings = get_simulation_settings()
+        dispatched_at, slowest_batch_seconds = {}, 0.0
+        def dispatch(batch_index):
+            dispatched_at[batch_index] = time.perf_counter()
+            self.tasks.put((self.job_id, self.generation, batch_index, batches[batch_index], settings))
+        for batch_index in range(num_batches): dispatch(batch_index)
+        best_fitness, final_by_genome, car_steps = -float('inf'), {}, 0
+        while dispatched_at:
+            if poll_callback is not None and poll_callback() is False: return None
+            if self.local_workers and all(proc.poll() is not None for proc in self.local_workers): raise RuntimeError("All local distributed workers exited.")
+            try: generation, batch_index, batch_fitness, batch_final, batch_car_steps, worker_name = self.results.get(timeout=0.05)
+            except queue.Empty:
+                now = time.perf_counter()
+                straggler_seconds = max(DISTRIBUTED_STRAGGLER_MIN_SECONDS, DISTRIBUTED_STRAGGLER_FACTOR * slowest_batch_seconds) if slowest_batch_seconds else DISTRIBUTED_TASK_TIMEOUT_SECONDS
+                for batch_index, sent in list(dispatched_at.items()):
+                    if now - sent > min(DISTRIBUTED_TASK_TIMEOUT_SECONDS, straggler_seconds):
+                        print(f"Distributed batch {batch_index} of generation {self.generation} unanswered after {now - sent:.1f}s, dispatching it again."); dispatch(batch_index)
+                continue
+            if generation != self.generation or batch_index not in dispatched_at: continue # Late duplicate of a re-dispatched batch
+            slowest_batch_seconds = max(slowest_batch_seconds, time.perf_counter() - dispatched_at.pop(batch_index))
+            batch = batches[batch_index]
+            for (_, gobj), fitness in zip(batch, batch_fitness): gobj.fitness = fitness; best_fitness = max(best_fitness, fitness)
+            car_steps += batch_car_steps
+            if len(batch_final) == len(batch): final_by_genome.update((id(gobj), final) for (_, gobj), final in zip(batch, batch_final))
+        return best_fitness, [final_by_genome.get(id(gobj), False) for _, gobj in genomes], [], car_steps
+
+    def __call__(self, genomes, config):
+        self.evaluate(list(genomes))
+
+    def close(self):
+        if self.manager is None: return
+        for proc in self.local_workers: proc.terminate()
+        for proc in self.local_workers: proc.wait()
+        self.manager.shutdown(); self.manager = None
+
+def _distributed_worker_map_path(board, job):
+    # The map is downloaded once per content hash; the derived terrain and tables are cached by AssetManager under the same hash
+    map_path = os.path.join(ASSET_CACHE_DIR, "maps", job["map_hash"] + job["map_ext"])
+    if not os.path.exists(map_path):
+        os.makedirs(os.path.dirname(map_path), exist_ok=True)
+        assets._write_atomic(map_path, board.map_data(job["map_hash"]))
+    return map_path
+
+def run_distributed_worker(address, authkey):
+    """--worker HOST:PORT: takes batches from a --distributed coordinator until it goes away. Each batch
+    is simulated headless with the coordinator's settings; only fitness values are sent back."""
+    global MAP_IMAGE_PATH
+    signal.signal(signal.SIGTERM, signal.SIG_DFL) # The coordinator terminates its local workers
+    manager = DistributedQueueManager(address=address, authkey=authkey.encode())
+    for attempt in range(50):
+        try: manager.connect(); break
+        except ConnectionRefusedError: time.sleep(0.2)
+    else: print(f"ERROR: No distributed coordinator at {address[0]}:{address[1]}."); return
+    tasks, results, board = manager.get_task_queue(), manager.get_result_queue(), manager.get_job_board()
+    worker_name, job, map_path, batches_done = f"{socket.gethostname()}:{os.getpid()}", None, None, 0
+    print(f"Distributed worker {worker_name} connected to {address[0]}:{address[1]}")
+    try:
+        while True:
+            try: job_id, generation, batch_index, batch, settings = tasks.get(timeout=1.0)
+            except queue.Empty: continue
+            if generation != board.generation(): continue # Left over from a generation that has already finished
+            if job is None or job["job_id"] != job_id:
+                job = board.job(); map_path = _distributed_worker_map_path(board, job)
+            apply_simulation_settings(settings); MAP_IMAGE_PATH = map_path
+            terrain = assets.terrain(map_path)
+            if RADAR_TABLE_ENABLED and np is not None: terrain.radar_table = assets.radar_table(map_path, terrain)
+            if TRACK_PROGRESS_ENABLED and np is not None: attach_track_index(terrain, map_path)
+            gen_state = simulate_genomes_headless(batch, job["config"], terrain)
+            results.put((generation, batch_index, [gobj.fitness for _, gobj in batch], gen_state["final_fitness"], gen_state["car_steps"], worker_name))
+            batches_done += 1
+    except (EOFError, ConnectionError, KeyboardInterrupt): pass # Coordinator shut down
+    print(f"Distributed worker {worker_name} stopped after {batches_done} batches.")
+
+def run_generation_parallel(genomes, config_neat_obj, terrain, screen, clock, g_map_scaled, fonts, ui_elements, viz_rect, gen_state, generation_count):
+    global _parallel_evaluator
+    if _parallel_evaluator is None and DISTRIBUTED_ADDRESS is not None: _parallel_evaluator = DistributedEvaluator(DISTRIBUTED_ADDRESS, config_neat_obj, DISTRIBUTED_AUTHKEY, DISTRIBUTED_LOCAL_WORKERS)
+    if _parallel_evaluator is None: _parallel_evaluator = ParallelEvaluator(PARALLEL_WORKERS, terrain, config_neat_obj)
+    workers_text = f"{PARALLEL_WORKERS} workers" if DISTRIBUTED_ADDRESS is None else f"the workers of {DISTRIBUTED_ADDRESS[0]}:{DISTRIBUTED_ADDRESS[1]}"
+    def poll_ui():
+        if not handle_simulation_events([], genomes, ui_elements): return False
+        if not HEADLESS_MODE:
+            # Workers own the cars; the window only shows the map, the HUD and the buttons while they run
+            draw_simulation_frame(screen, [], g_map_scaled, fonts, ui_elements, viz_rect, config_neat_obj, gen_state, generation_count)
+            frame_renderer.draw_text(f"Evaluating {len(genomes)} genomes on {workers_text}...", fonts[1], (GAME_AREA_X_OFFSET + 10, GAME_AREA_Y_OFFSET + 10))
+            present_frame(clock)
+        return True
+    result = _parallel_evaluator.evaluate(genomes, poll_ui, trajectory_writer)
+    if result is None: return
+    best_fitness, gen_state["final_fitness"], gen_state["trajectory_spools"], gen_state["car_steps"] = result
+    gen_state["global_best_fitness"] = max(gen_state["global_best_fitness"], best_fitness)
+
+def render_thread_display_fps():
+    # --render-thread redraw rate: the simulation sets its own pace, so "max" and "adaptive" only cap the window
+    return {"max": TIME_WARP_MAX_DISPLAY_FPS, "adaptive": TIME_WARP_TARGET_FPS}.get(time_warp_mode, FPS)
+
+def _simulation_thread_main(cars, nets, car_batch, genomes, terrain, gen_state, exchange, commands, failures):
+    """--render-thread: steps the generation until it ends or a quit is requested. Queued UI commands are applied
+    between steps; numeric time warps are paced at K * FPS steps per second, max and adaptive run unthrottled."""
+    try:
+        running, next_step_time, steps_since_snapshot = True, time.perf_counter(), 0
+        while running and not user_quit_simulation:
+            apply_simulation_commands(commands, cars, genomes)
+            running = step_generation(cars, nets, car_batch, genomes, terrain, gen_state); steps_since_snapshot += 1
+            if exchange.wanted:
+                gen_state["steps_per_frame"], steps_since_snapshot = steps_since_snapshot, 0
+                exchange.publish(take_simulation_snapshot(cars, gen_state))
+            if time_warp_mode in ("max", "adaptive"): continue
+            next_step_time += 1.0 / (int(time_warp_mode) * FPS)
+            delay = next_step_time - time.perf_counter()
+            if delay > 0: time.sleep(delay)
+            elif delay < -0.25: next_step_time = time.perf_counter() # Fell behind: carry on from now instead of bursting to catch up
+    except BaseException as e: failures.append(e)
+
+def run_generation_threaded(cars, nets, car_batch, genomes, terrain, screen, clock, g_map_scaled, fonts, ui_elements, viz_rect, config_neat_obj, gen_state, generation_count):
+    """--render-thread: the simulation runs on its own thread and this (pygame) thread draws the latest
+    SimulationSnapshot at the display rate, so a slow frame never stalls physics. Clicks and buttons go
+    back through a command queue applied at step boundaries; gen_state belongs to the simulation thread
+    until it has finished."""
+    exchange, commands, failures = SnapshotExchange(), queue.SimpleQueue(), []
+    snapshot = take_simulation_snapshot(cars, gen_state)
+    sim_thread = threading.Thread(target=_simulation_thread_main, args=(cars, nets, car_batch, genomes, terrain, gen_state, exchange, commands, failures), name="simulation", daemon=True)
+    sim_thread.start()
+    while sim_thread.is_alive():
+        snapshot = exchange.take() or snapshot
+        handle_simulation_events(snapshot.cars, genomes, ui_elements, commands) # A quit stops the simulation thread through user_quit_simulation
+        draw_simulation_frame(screen, snapshot.cars, g_map_scaled, fonts, ui_elements, viz_rect, config_neat_obj, snapshot.state, generation_count)
+        present_frame(clock, render_thread_display_fps())
+    sim_thread.join()
+    apply_simulation_commands(commands, cars, genomes) # Clicks from the last frame still count, as they would between two steps
+    if failures: raise failures[0]
+
 def run_simulation(genomes,config_neat_obj,screen,clock,sim_globals_param):
-    global global_max_speed, user_quit_simulation, user_requested_speed_change
+    global user_quit_simulation
 
     current_generation_count_local=sim_globals_param["current_generation_count"]
     global_best_fitness_local=sim_globals_param["global_best_fitness"]
+    if stats_reporter is not None and stats_reporter.global_best_fitness is not None: global_best_fitness_local = stats_reporter.global_best_fitness # HUD "Global Best Fit"
     current_generation_count_local+=1
     pygame.display.set_caption(f"NEAT Car Evolution - Gen: {current_generation_count_local}")
+    if PROFILER_ENABLED: profiler.begin_generation(current_generation_count_local)
 
-    try:
-        car_sprite_surface = pygame.image.load(CAR_IMAGE_PATH).convert_alpha()
-        car_sprite_surface = pygame.transform.scale(car_sprite_surface, (CAR_SIZE_X, CAR_SIZE_Y))
+    try: sprite_atlas = assets.sprite_atlas()
     except pygame.error as e:
         print(f"ERROR: Car image '{CAR_IMAGE_PATH}' not loaded: {e}"); request_user_quit(); raise UserQuitException()
 
-    nets,cars=[],[]
-    for i,(gid,gobj) in enumerate(genomes):
-        try:
-            new_car = Car(car_sprite_surface)
-            if gobj: new_car.genome_key = gobj.key
-            nets.append(neat.nn.FeedForwardNetwork.create(gobj,config_neat_obj))
-            gobj.fitness=0.0
-            cars.append(new_car)
-        except Exception as e:
-            g_key_str = str(gobj.key) if gobj and hasattr(gobj, 'key') else "N/A"
-            print(f"ERROR: NN/Car creation failed for genome {gid} (Key: {g_key_str}): {e}"); continue
-    if not cars:
-        print("WARNING: No cars created, skipping generation."); sim_globals_param["current_generation_count"]=current_generation_count_local; sim_globals_param["global_best_fitness"]=global_best_fitness_local; return
-
-    try:
-        g_map_orig=pygame.image.load('map-d.png').convert_alpha()
-        g_map_scaled=pygame.transform.scale(g_map_orig,(GAME_AREA_WIDTH,GAME_AREA_HEIGHT))
+    try: g_map_scaled = assets.map_surface(MAP_IMAGE_PATH)
     except pygame.error as e: print(f"ERROR: Map not loaded: {e}"); request_user_quit();raise UserQuitException()
-
-    try:
-        title_font, info_font, stats_font, button_font = pygame.font.SysFont("Arial",18,True), pygame.font.SysFont("Arial",14), pygame.font.SysFont("Arial",12), pygame.font.SysFont("Arial",14,True)
-    except: title_font,info_font,stats_font,button_font = pygame.font.Font(None,24),pygame.font.Font(None,20),pygame.font.Font(None,18),pygame.font.Font(None,20)
+    terrain = assets.terrain(MAP_IMAGE_PATH)
+    if RADAR_TABLE_ENABLED: terrain.radar_table = assets.radar_table(MAP_IMAGE_PATH)
+    if TRACK_PROGRESS_ENABLED: attach_track_index(terrain, MAP_IMAGE_PATH)
 
     viz_rect=pygame.Rect(VIZ_PANEL_X_OFFSET,VIZ_PANEL_Y_OFFSET,VIZ_PANEL_WIDTH,VIZ_PANEL_HEIGHT)
-    stats_panel_x_actual=STATS_PANEL_X_OFFSET
-    btn_panel_x = WINDOW_WIDTH - 150 - VIZ_PANEL_X_OFFSET; ui_button_width=140
-    ui_elements=[
-        Button(btn_panel_x,20,ui_button_width,30,"Max Speed (+)",button_font,BUTTON_COLOR,BUTTON_HOVER_COLOR,increase_max_speed),
-        Button(btn_panel_x,60,ui_button_width,30,"Max Speed (-)",button_font,BUTTON_COLOR,BUTTON_HOVER_COLOR,decrease_max_speed),
-        Button(btn_panel_x, WINDOW_HEIGHT - 50 - VIZ_PANEL_Y_OFFSET, ui_button_width, 30, "QUIT", button_font, BUTTON_COLOR, BUTTON_HOVER_COLOR, request_user_quit)
-    ]
-    generation_frames_elapsed, max_frames_per_generation = 0, GENERATION_TIME_LIMIT_SECONDS * FPS
+    fonts, ui_elements = assets.fonts(), assets.ui_elements()
+    frame_renderer.invalidate()
+
+    # Unchanged elites get their cached fitness; only the rest of the population is simulated. Not with --record:
+    # the elites are usually the generation's best cars, so they are simulated again to be in the recording
+    cache_key, cache_epoch, cached_best_fitness = None, fitness_cache.epoch, -float('inf')
+    if FITNESS_CACHE_ENABLED and trajectory_writer is None:
+        cache_key = fitness_cache.simulation_key()
+        genomes, cached_best_fitness = fitness_cache.lookup(genomes, cache_key)
+        global_best_fitness_local = max(global_best_fitness_local, cached_best_fitness)
+    if not genomes:
+        if PROFILER_ENABLED: profiler.end_generation()
+        sim_globals_param["current_generation_count"]=current_generation_count_local; sim_globals_param["global_best_fitness"]=global_best_fitness_local; return
+
+    if PARALLEL_WORKERS > 0 or DISTRIBUTED_ADDRESS is not None:
+        gen_state = new_generation_state(global_best_fitness_local, len(genomes))
+        run_generation_parallel(genomes, config_neat_obj, terrain, screen, clock, g_map_scaled, fonts, ui_elements, viz_rect, gen_state, current_generation_count_local)
+        if cache_key is not None and "final_fitness" in gen_state: fitness_cache.store(genomes, gen_state["final_fitness"], cache_key, cache_epoch)
+        if gen_state.get("trajectory_spools"): trajectory_writer.append_generation(current_generation_count_local, gen_state["trajectory_spools"])
+        if stats_reporter is not None: stats_reporter.add_car_steps(gen_state["car_steps"])
+        if PROFILER_ENABLED: profiler.end_generation()
+        sim_globals_param["current_generation_count"]=current_generation_count_local
+        sim_globals_param["global_best_fitness"]=gen_state["global_best_fitness"]
+        if user_quit_simulation:raise UserQuitException()
+        return
+
+    cars, nets, car_batch = create_generation_cars(genomes, config_neat_obj, sprite_atlas)
+    if not cars:
+        print("WARNING: No cars created, skipping generation."); sim_globals_param["current_generation_count"]=current_generation_count_local; sim_globals_param["global_best_fitness"]=global_best_fitness_local; return
+    gen_state = new_generation_state(global_best_fitness_local, len(cars))
+    gen_state["generation_best_fitness"] = cached_best_fitness # --end-when-beaten also has to beat the cached elites
+    if trajectory_writer is not None and len(cars) == len(genomes): gen_state["recorder"] = TrajectoryRecorder(trajectory_writer.spool_path(), len(cars))
     running_this_generation = True
-    best_car_details_current_gen = {"genome": None, "inputs": [], "outputs": [], "chosen_action_idx": -1, "fitness": -float('inf')}
+    last_draw_seconds = 0.0
+    if RENDER_THREAD_ENABLED and not HEADLESS_MODE:
+        run_generation_threaded(cars, nets, car_batch, genomes, terrain, screen, clock, g_map_scaled, fonts, ui_elements, viz_rect, config_neat_obj, gen_state, current_generation_count_local)
+        running_this_generation = False
 
     while running_this_generation:
         if user_quit_simulation: running_this_generation=False; break
-        for event in pygame.event.get():
-            if event.type==pygame.QUIT: request_user_quit(); running_this_generation=False
-            if event.type==pygame.KEYDOWN and event.key==pygame.K_ESCAPE: request_user_quit(); running_this_generation=False
-            if event.type==pygame.MOUSEBUTTONDOWN and event.button==1:
-                mouse_pos=event.pos; clicked_car_index = -1
-                for i_car_click in range(len(cars) - 1, -1, -1):
-                    car_clicked_obj = cars[i_car_click]
-                    if car_clicked_obj.is_alive() and car_clicked_obj.get_rect_on_screen().collidepoint(mouse_pos): clicked_car_index = i_car_click; break
-                if clicked_car_index != -1:
-                    car_to_remove = cars[clicked_car_index]
-                    if clicked_car_index < len(genomes) and genomes[clicked_car_index] and len(genomes[clicked_car_index]) > 1 and genomes[clicked_car_index][1]:
-                         genomes[clicked_car_index][1].fitness = -1000.0
-                    print(f"Car index {clicked_car_index} (Genome: {car_to_remove.genome_key}, ID: {car_to_remove.id}) manually removed.")
-                    car_to_remove.alive = False
-            for ui_el in ui_elements:ui_el.handle_event(event)
+        # Headless: nobody can click, so only poll occasionally to keep the SDL event queue drained
+        if not HEADLESS_MODE or gen_state["frames_elapsed"] % HEADLESS_EVENT_POLL_INTERVAL < SIMULATION_DT:
+            running_this_generation = handle_simulation_events(cars, genomes, ui_elements)
         if not running_this_generation: break
 
-        # Apply user requested speed changes globally
-        if user_requested_speed_change != 0.0:
-            for car_obj in cars:
-                if car_obj.is_alive():
-                    car_obj.target_speed += user_requested_speed_change
-            user_requested_speed_change = 0.0 # Reset request
-
-        total_fitness_this_frame, num_alive_cars_for_avg_fitness = 0.0, 0
-        current_gen_best_fitness_val = -float('inf')
-        current_gen_best_car_genome_obj, current_gen_best_car_inputs, current_gen_best_car_outputs, current_gen_best_car_action_idx = None, [], [], -1
-
-        for i_car, car_obj in enumerate(cars):
-            if car_obj.is_alive():
-                nn_input_data=car_obj.get_data_for_nn()
-                if i_car < len(nets) and i_car < len(genomes):
-                    nn_output_actions=nets[i_car].activate(nn_input_data)
-                    car_obj.last_nn_output, car_obj.last_radar_data = list(nn_output_actions), list(nn_input_data)
-                    if not nn_output_actions or len(nn_output_actions) != len(ACTION_LABELS): car_obj.alive = False; continue
-                    nn_choice_index=nn_output_actions.index(max(nn_output_actions))
-                    if nn_choice_index==0: car_obj.target_angle = (car_obj.target_angle + ANGLE_STEP) % 360
-                    elif nn_choice_index==1: car_obj.target_angle = (car_obj.target_angle - ANGLE_STEP + 360) % 360
-                    elif nn_choice_index==2: car_obj.target_speed -= global_speed_step
-                    elif nn_choice_index==3: car_obj.target_speed += global_speed_step
-                    car_obj.target_speed = max(global_min_speed, min(car_obj.target_speed, global_max_speed)) # Clamp after NN and global adjustment
-                else: car_obj.alive = False; continue
-                car_obj.update(g_map_scaled)
-                if car_obj.is_alive():
-                    current_car_fitness = car_obj.get_fitness()
-                    genomes[i_car][1].fitness = current_car_fitness
-                    total_fitness_this_frame += current_car_fitness; num_alive_cars_for_avg_fitness += 1
-                    if current_car_fitness > current_gen_best_fitness_val:
-                        current_gen_best_fitness_val, current_gen_best_car_genome_obj = current_car_fitness, genomes[i_car][1]
-                        current_gen_best_car_inputs, current_gen_best_car_outputs, current_gen_best_car_action_idx = list(car_obj.last_radar_data), list(car_obj.last_nn_output), nn_choice_index
-                    if current_car_fitness > global_best_fitness_local: global_best_fitness_local = current_car_fitness
-        if current_gen_best_car_genome_obj:
-             best_car_details_current_gen = {"genome": current_gen_best_car_genome_obj, "inputs": current_gen_best_car_inputs, "outputs": current_gen_best_car_outputs, "chosen_action_idx": current_gen_best_car_action_idx, "fitness": current_gen_best_fitness_val}
-        elif num_alive_cars_for_avg_fitness == 0 and generation_frames_elapsed > 0 : best_car_details_current_gen["genome"] = None
-
-        current_alive_cars_count = sum(1 for c in cars if c.is_alive())
-        if current_alive_cars_count == 0 and generation_frames_elapsed > FPS : print("No cars left, ending generation."); running_this_generation = False
-        generation_frames_elapsed+=1
-        if generation_frames_elapsed >= max_frames_per_generation: print(f"Time limit ({GENERATION_TIME_LIMIT_SECONDS}s) reached."); running_this_generation=False
-
-        screen.fill((30,32,44)); screen.blit(g_map_scaled,(GAME_AREA_X_OFFSET,GAME_AREA_Y_OFFSET))
-        for car_to_draw in cars:
-            if car_to_draw.is_alive():car_to_draw.draw(screen)
-
-        def draw_text_with_background(text_content,font_obj,pos_tuple,surface_obj,pad_x=5,pad_y=2,text_col=None, bg_col=None):
-            actual_text_color, actual_bg_color = text_col or TEXT_COLOR, bg_col or INFO_TEXT_BACKGROUND_COLOR
-            rendered_text = font_obj.render(text_content,True,actual_text_color)
-            bg_rect = rendered_text.get_rect(topleft=pos_tuple); bg_rect.inflate_ip(pad_x*2,pad_y*2)
-            shadow_rect = bg_rect.move(1,1); pygame.draw.rect(surface_obj,(0,0,0,max(0, actual_bg_color[3]-150 if len(actual_bg_color)>3 else 50)),shadow_rect,border_radius=5)
-            pygame.draw.rect(surface_obj,actual_bg_color,bg_rect,border_radius=5); surface_obj.blit(rendered_text,(pos_tuple[0]+pad_x, pos_tuple[1]+pad_y))
-            return rendered_text.get_height() + pad_y*2
-
-        y_offset_info_panel=VIZ_PANEL_Y_OFFSET + 10
-        h = draw_text_with_background(f"Gen: {current_generation_count_local}",title_font,(stats_panel_x_actual,y_offset_info_panel),screen);y_offset_info_panel+=h+3
-        h = draw_text_with_background(f"Alive: {current_alive_cars_count}/{len(cars)}",info_font,(stats_panel_x_actual,y_offset_info_panel),screen);y_offset_info_panel+=h+1
-        h = draw_text_with_background(f"Time: {generation_frames_elapsed//FPS}s / {GENERATION_TIME_LIMIT_SECONDS}s",info_font,(stats_panel_x_actual,y_offset_info_panel),screen);y_offset_info_panel+=h+5
-        current_gen_best_fit_display = best_car_details_current_gen["fitness"] if best_car_details_current_gen["fitness"] > -float('inf') else 0.0
-        h = draw_text_with_background(f"Gen. Best Fit: {current_gen_best_fit_display:.0f}",stats_font,(stats_panel_x_actual,y_offset_info_panel),screen);y_offset_info_panel+=h+1
-        h = draw_text_with_background(f"Global Best Fit: {global_best_fitness_local:.0f}",stats_font,(stats_panel_x_actual,y_offset_info_panel),screen);y_offset_info_panel+=h+1
-        avg_fitness_display = total_fitness_this_frame / num_alive_cars_for_avg_fitness if num_alive_cars_for_avg_fitness > 0 else 0.0
-        h = draw_text_with_background(f"Gen. Avg. Fit: {avg_fitness_display:.0f}",stats_font,(stats_panel_x_actual,y_offset_info_panel),screen);y_offset_info_panel+=h+3
-
-        best_genome_for_viz = best_car_details_current_gen["genome"]
-        if best_genome_for_viz:
-            cfg_genome_conf = config_neat_obj.genome_config
-            num_inputs, num_outputs = len(cfg_genome_conf.input_keys), len(cfg_genome_conf.output_keys)
-            num_hidden = len([nk for nk in best_genome_for_viz.nodes if nk not in cfg_genome_conf.input_keys and nk not in cfg_genome_conf.output_keys])
-            active_conns = len([c for c in best_genome_for_viz.connections.values() if c.enabled])
-            h = draw_text_with_background("Best Car NN:",stats_font,(stats_panel_x_actual,y_offset_info_panel),screen);y_offset_info_panel+=h+1
-            h = draw_text_with_background(f" Inputs: {num_inputs}",stats_font,(stats_panel_x_actual,y_offset_info_panel),screen,2,1);y_offset_info_panel+=h
-            h = draw_text_with_background(f" Outputs: {num_outputs}",stats_font,(stats_panel_x_actual,y_offset_info_panel),screen,2,1);y_offset_info_panel+=h
-            h = draw_text_with_background(f" Hidden N.: {num_hidden}",stats_font,(stats_panel_x_actual,y_offset_info_panel),screen,2,1);y_offset_info_panel+=h
-            h = draw_text_with_background(f" Active Con.: {active_conns}/{len(best_genome_for_viz.connections)}",stats_font,(stats_panel_x_actual,y_offset_info_panel),screen,2,1);y_offset_info_panel+=h
-            h = draw_text_with_background(f" Genome ID: {best_genome_for_viz.key}",stats_font,(stats_panel_x_actual,y_offset_info_panel),screen,2,1);y_offset_info_panel+=h+3
-            h = draw_text_with_background("Best Car Data:",stats_font,(stats_panel_x_actual,y_offset_info_panel),screen);y_offset_info_panel+=h+1
-            viz_inputs, viz_outputs, viz_action_idx = best_car_details_current_gen["inputs"], best_car_details_current_gen["outputs"], best_car_details_current_gen["chosen_action_idx"]
-            if viz_inputs: h = draw_text_with_background(" Radars: "+", ".join([f"{v_rad:.2f}" for v_rad in viz_inputs]),stats_font,(stats_panel_x_actual,y_offset_info_panel),screen,2,1);y_offset_info_panel+=h
-            if viz_outputs and viz_action_idx != -1 and len(viz_outputs) == len(ACTION_LABELS):
-                y_action_text_start=y_offset_info_panel
-                for i_text,val_text in enumerate(viz_outputs):
-                    lbl_text, text_color_action = ACTION_LABELS[i_text], SELECTED_ACTION_COLOR if i_text==viz_action_idx else TEXT_COLOR
-                    h_act_text = draw_text_with_background(f" {lbl_text}: {val_text:.2f}",stats_font,(stats_panel_x_actual,y_action_text_start),screen,2,1,text_color_action); y_action_text_start+=h_act_text
-                y_offset_info_panel = y_action_text_start
-
-        max_speed_text_y, max_speed_text_x_coord = 100 + VIZ_PANEL_Y_OFFSET, btn_panel_x + 5
-        draw_text_with_background(f"Max Speed:{global_max_speed:.1f}",info_font,(max_speed_text_x_coord, max_speed_text_y),screen)
-        for ui_el_draw in ui_elements:ui_el_draw.draw(screen)
-        if viz_rect.width>5 and viz_rect.height>5:
-            if best_genome_for_viz: draw_neat_visualization(screen,best_genome_for_viz,config_neat_obj,best_car_details_current_gen["inputs"],best_car_details_current_gen["outputs"],viz_rect)
-            else:
-                empty_viz_surface=pygame.Surface(viz_rect.size,pygame.SRCALPHA); empty_viz_surface.fill(NN_PANEL_BG_COLOR)
-                try:font_viz_text=pygame.font.SysFont("Arial",16,True)
-                except:font_viz_text=pygame.font.Font(None,22)
-                msg_viz_text="Waiting for network...";txt_s_viz_text=font_viz_text.render(msg_viz_text,True,(200,200,220))
-                empty_viz_surface.blit(txt_s_viz_text,txt_s_viz_text.get_rect(center=(viz_rect.width//2,viz_rect.height//2))); screen.blit(empty_viz_surface,viz_rect.topleft)
-        pygame.display.flip();clock.tick(FPS)
+        # Time warp: K simulation steps per rendered frame. The steps are the same whatever K is, only
+        # how often events are polled and the window is redrawn changes.
+        max_steps, step_deadline = (1, None) if HEADLESS_MODE else time_warp_frame_budget(last_draw_seconds)
+        steps_this_frame = 0
+        while running_this_generation and (max_steps is None or steps_this_frame < max_steps):
+            if PROFILER_ENABLED: profiler.count_frame(gen_state["alive_count"])
+            running_this_generation = step_generation(cars, nets, car_batch, genomes, terrain, gen_state); steps_this_frame += 1
+            if step_deadline is not None and time.perf_counter() >= step_deadline: break
+
+        if HEADLESS_MODE: continue # No drawing and no frame limiter, run as fast as the CPU allows
+        gen_state["steps_per_frame"] = steps_this_frame
+        draw_start = time.perf_counter()
+        draw_simulation_frame(screen, cars, g_map_scaled, fonts, ui_elements, viz_rect, config_neat_obj, gen_state, current_generation_count_local)
+        last_draw_seconds = time.perf_counter() - draw_start
+        present_frame(clock, time_warp_display_fps())
+
+    global_best_fitness_local = gen_state["global_best_fitness"]
+    if cache_key is not None and len(cars) == len(genomes): fitness_cache.store(genomes, final_fitness_flags(cars, gen_state), cache_key, cache_epoch)
+    if "recorder" in gen_state: trajectory_writer.append_generation(current_generation_count_local, [(gen_state.pop("recorder").close(), genomes)])
+    if stats_reporter is not None: stats_reporter.add_car_steps(gen_state["car_steps"])
+    if PROFILER_ENABLED: profiler.end_generation()
 
     sim_globals_param["current_generation_count"]=current_generation_count_local
     sim_globals_param["global_best_fitness"]=global_best_fitness_local
     if user_quit_simulation:raise UserQuitException()
 
+# --- TRAINING STATS (--stats-log) ---
+class StreamingStatsReporter(neat.reporting.BaseReporter):
+    """Replaces neat.StatisticsReporter, which keeps every generation's best genome and species fitness
+    lists forever. Each generation's summary (fitness best/mean/stdev, species sizes, genome complexity,
+    wall time, car steps per second) is appended as one JSON line to a buffered log and only the last
+    STATS_WINDOW_GENERATIONS summaries stay in memory. One reporter spans every run of the process; the
+    newest summary's global_best_fitness drives the HUD's "Global Best Fit"."""
+    def __init__(self, path=None, window_size=STATS_WINDOW_GENERATIONS):
+        self.window = collections.deque(maxlen=window_size)
+        self.log_file = open(path, 'a', buffering=STATS_LOG_BUFFER_BYTES) if path else None
+        if self.log_file is not None: atexit.register(self.close)
+        self.run, self.generation, self.generation_start, self.car_steps, self.last_flush = 0, 0, time.perf_counter(), 0, time.perf_counter()
+
+    @property
+    def global_best_fitness(self): return self.window[-1]["global_best_fitness"] if self.window else None
+
+    def start_run(self): self.run += 1
+    def add_car_steps(self, car_steps): self.car_steps += car_steps
+
+    def start_generation(self, generation):
+        self.generation, self.generation_start, self.car_steps = generation, time.perf_counter(), 0
+
+    def post_evaluate(self, config, population, species, best_genome):
+        seconds = time.perf_counter() - self.generation_start
+        fitnesses = [gobj.fitness for gobj in population.values() if gobj.fitness is not None]
+        sizes = [gobj.size() for gobj in population.values()] # (nodes, enabled connections)
+        best_fitness = best_genome.fitness if best_genome is not None and best_genome.fitness is not None else max(fitnesses, default=0.0)
+        best_nodes, best_connections = best_genome.size() if best_genome is not None else (0, 0)
+        previous_best = self.global_best_fitness
+        summary = {"time": round(time.time(), 3), "run": self.run, "generation": self.generation, "population": len(population),
+                   "best_fitness": best_fitness, "mean_fitness": neat.math_util.mean(fitnesses) if fitnesses else 0.0, "stdev_fitness": neat.math_util.stdev(fitnesses) if len(fitnesses) > 1 else 0.0,
+                   "global_best_fitness": best_fitness if previous_best is None else max(previous_best, best_fitness),
+                   "species": {str(sid): len(s.members) for sid, s in species.species.items()},
+                   "best_genome": {"key": best_genome.key, "nodes": best_nodes, "connections": best_connections} if best_genome is not None else None,
+                   "mean_nodes": neat.math_util.mean([s[0] for s in sizes]) if sizes else 0.0, "mean_connections": neat.math_util.mean([s[1] for s in sizes]) if sizes else 0.0,
+                   "generation_seconds": round(seconds, 4), "car_steps": self.car_steps, "car_steps_per_second": round(self.car_steps / seconds, 1) if seconds > 0 else 0.0}
+        self.window.append(summary)
+        if self.log_file is None: return
+        self.log_file.write(json.dumps(summary) + "\n")
+        if time.perf_counter() - self.last_flush >= STATS_LOG_FLUSH_SECONDS: self.log_file.flush(); self.last_flush = time.perf_counter()
+
+    def close(self):
+        if self.log_file is None: return
+        self.log_file.close(); self.log_file = None
+
+stats_reporter = None # StreamingStatsReporter of the training runs (__main__)
+
+# --- CHECKPOINTS (--checkpoint, --resume, --export-best) ---
+CHECKPOINT_MAGIC, BEST_GENOME_MAGIC = b"CARCKPT1", b"CARGENM1"
+CHECKPOINT_HEADER = struct.Struct("<8sIIQ") # Magic, format version, generation, payload size; the payload is a zlib-compressed pickle
+CHECKPOINT_FORMAT_VERSION = 1
+
+def write_checkpoint_file(path, magic, generation, payload):
+    """Header + zlib(payload) to a temporary file, fsync'd and renamed over path, so a crash leaves either the
+    previous file or the new one. magic None writes payload as it is (the exported .py network)."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        if magic is None: f.write(payload)
+        else:
+            data = zlib.compress(payload, 6)
+            f.write(CHECKPOINT_HEADER.pack(magic, CHECKPOINT_FORMAT_VERSION, generation, len(data))); f.write(data)
+        f.flush(); os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def read_checkpoint_file(path, magic):
+    # The unpickled payload of a write_checkpoint_file file; ValueError if it is not one (or is truncated)
+    with open(path, 'rb') as f:
+        header = f.read(CHECKPOINT_HEADER.size)
+        if len(header) != CHECKPOINT_HEADER.size: raise ValueError(f"{path}: truncated header")
+        file_magic, version, _, size = CHECKPOINT_HEADER.unpack(header)
+        if file_magic != magic or version != CHECKPOINT_FORMAT_VERSION: raise ValueError(f"{path}: not a version {CHECKPOINT_FORMAT_VERSION} {magic.decode()} file")
+        data = f.read(size)
+    if len(data) != size: raise ValueError(f"{path}: truncated payload")
+    return pickle.loads(zlib.decompress(data))
+
+def take_counter(owner, name):
+    # Next value of the itertools.count at owner.<name>, which is replaced by a count starting at that value, so the
+    # run keeps the same keys; None while neat has not created the counter yet. neat's counters all step by 1.
+    counter = getattr(owner, name)
+    if counter is None: return None
+    next_value = next(counter); setattr(owner, name, itertools.count(next_value))
+    return next_value
+
+def training_state(config, population, species_set, neat_population, run_state):
+    """Everything --resume needs to continue after the generation that just ended (called from end_generation,
+    when `population` is already the next generation): genomes, species, the innovation counters neat keeps in
+    itertools.count objects, the `random` state, plus the main loop's run_state."""
+    return dict(run_state, generation=neat_population.generation + 1, population=population, species=species_set.species, genome_to_species=species_set.genome_to_species,
+                next_species_key=take_counter(species_set, "indexer"), next_genome_key=take_counter(neat_population.reproduction, "genome_indexer"),
+                next_node_key=take_counter(config.genome_config, "node_indexer"), ancestors=neat_population.reproduction.ancestors,
+                best_genome=neat_population.best_genome, random_state=random.getstate())
+
+def restore_population(state, config):
+    """neat.Population continuing from a training_state; the caller adds the reporters again."""
+    species_set = config.species_set_type(config.species_set_config, neat.reporting.ReporterSet())
+    species_set.species, species_set.genome_to_species, species_set.indexer = state["species"], state["genome_to_species"], itertools.count(state["next_species_key"])
+    population = neat.Population(config, (state["population"], species_set, state["generation"]))
+    species_set.reporters = population.reporters
+    population.reproduction.genome_indexer, population.reproduction.ancestors = itertools.count(state["next_genome_key"]), state["ancestors"]
+    if state["next_node_key"] is not None: config.genome_config.node_indexer = itertools.count(state["next_node_key"])
+    population.best_genome = state["best_genome"]
+    random.setstate(state["random_state"])
+    return population
+
+def exported_genome_fitness(path):
+    # Fitness of the genome already in an --export-best file, so a new run only replaces it with a fitter one; -inf for none
+    if not path or not os.path.exists(path): return -float('inf')
+    try: return read_checkpoint_file(path, BEST_GENOME_MAGIC)["fitness"]
+    except (OSError, ValueError, KeyError, pickle.UnpicklingError, zlib.error) as e:
+        print(f"WARNING: '{path}' is not a readable best genome export ({e}); the next best genome replaces it."); return -float('inf')
+
+def load_best_genome(path):
+    """(genome, neat.Config) from an --export-best file, e.g. for CompiledNetwork(genome, config) in a replay or benchmark."""
+    exported = read_checkpoint_file(path, BEST_GENOME_MAGIC)
+    return exported["genome"], exported["config"]
+
+class TrainingCheckpointer(neat.reporting.BaseReporter):
+    """Saves the training state at the end of every generation: it is pickled right away (the next generation
+    mutates it), but only written every CHECKPOINT_EVERY_GENERATIONS generations or CHECKPOINT_EVERY_SECONDS, and
+    once more by close() so a quit keeps the last completed generation. Compression and the atomic write run on
+    a background thread; if it falls behind only the newest state per file is written. A new best genome is
+    exported to best_genome_path the same way, with its CompiledNetwork source next to it as a .py file, but only
+    once it beats the genome already in that file (from this run or an earlier one)."""
+    def __init__(self, path, best_genome_path=None, every_generations=CHECKPOINT_EVERY_GENERATIONS, every_seconds=CHECKPOINT_EVERY_SECONDS):
+        self.path, self.best_genome_path, self.every_generations, self.every_seconds = path, best_genome_path, every_generations, every_seconds
+        self.neat_population, self.run_state, self.latest, self.latest_written = None, None, None, True
+        self.generations_since_write, self.last_write_time, self.exported_fitness = 0, time.perf_counter(), exported_genome_fitness(best_genome_path)
+        self._jobs, self._lock, self._wakeup, self._stopping = {}, threading.Lock(), threading.Event(), False
+        self._writer = threading.Thread(target=self._writer_main, name="checkpoint-writer", daemon=True); self._writer.start()
+        atexit.register(self.close)
+
+    def watch(self, neat_population, run_state):
+        # run_state() returns the main loop's part of the state (run number, best genome across runs, ...)
+        self.neat_population, self.run_state = neat_population, run_state
+
+    def end_generation(self, config, population, species_set):
+        state = training_state(config, population, species_set, self.neat_population, self.run_state())
+        state["exported_fitness"] = self.exported_fitness
+        self.latest, self.latest_written = (state["generation"], pickle.dumps(state, pickle.HIGHEST_PROTOCOL)), False
+        self.generations_since_write += 1
+        if self.generations_since_write >= self.every_generations or time.perf_counter() - self.last_write_time >= self.every_seconds: self.flush()
+        best_genome = self.neat_population.best_genome
+        if best_genome is not None and best_genome.fitness is not None and best_genome.fitness > self.exported_fitness: self.export_best(best_genome, config)
+
+    def flush(self):
+        if self.latest_written or self.latest is None or not self.path: return
+        self._submit(self.path, CHECKPOINT_MAGIC, *self.latest)
+        self.latest_written, self.generations_since_write, self.last_write_time = True, 0, time.perf_counter()
+
+    def export_best(self, genome, config):
+        if not self.best_genome_path: return
+        try: network_source = compile_genome(genome, config).source
+        except ValueError: network_source = None # Not compilable; the .py is skipped
+        self._submit(self.best_genome_path, BEST_GENOME_MAGIC, 0, pickle.dumps({"genome": genome, "config": config, "fitness": genome.fitness, "network_source": network_source}, pickle.HIGHEST_PROTOCOL))
+        if network_source is not None:
+            header = f"# Best genome {genome.key} (fitness {genome.fitness:.2f}) exported by v-1.py: activate(radar inputs) -> outputs, choose(radar inputs) -> ACTION_LABELS index\n"
+            self._submit(os.path.splitext(self.best_genome_path)[0] + ".py", None, 0, f"{header}from math import exp\n\nACTION_LABELS = {ACTION_LABELS!r}\n\n{network_source}\n".encode())
+        self.exported_fitness = genome.fitness
+
+    def _submit(self, path, magic, generation, payload):
+        with self._lock: self._jobs[path] = (magic, generation, payload)
+        self._wakeup.set()
+
+    def _writer_main(self):
+        while True:
+            self._wakeup.wait()
+            with self._lock: jobs, self._jobs, stopping = self._jobs, {}, self._stopping; self._wakeup.clear()
+            for path, (magic, generation, payload) in jobs.items():
+                try: write_checkpoint_file(path, magic, generation, payload)
+                except OSError as e: print(f"WARNING: Could not write '{path}': {e}")
+            if stopping: return
+
+    def close(self):
+        if not self._writer.is_alive(): return
+        self.flush()
+        with self._lock: self._stopping = True
+        self._wakeup.set(); self._writer.join()
+
+# --- PROFILING (--profile) ---
+PROFILED_PHASES = [ # (phase, owner, attribute): owner.attribute is timed under `phase`; "__module__" is this module
+    ("setup", "__module__", "create_generation_cars"), ("events", "__module__", "handle_simulation_events"),
+    ("nn_activate", BatchedNetworks, "activate"), ("nn_activate", neat.nn.FeedForwardNetwork, "activate"), ("nn_activate", CompiledNetwork, "activate"),
+    ("radars", Car, "_update_radars"), ("radars", CarBatch, "_radar_lengths"), ("collision", Car, "_check_collision"), ("lane", Car, "_check_lane_position"),
+    ("collision", Car, "_check_swept_collision"), ("collision", CarBatch, "_swept_collision"), ("lane", CarBatch, "_update_lanes"),
+    ("car_physics", Car, "update"), ("car_physics", CarBatch, "step"), # CarBatch.step does the end-pose collision check inline
+    ("draw_cars", Car, "draw"), ("nn_panel", "__module__", "neat_visualization_blits"), ("nn_panel", FrameRenderer, "draw_panel"), ("hud_text", "__module__", "draw_text_with_background"),
+    ("hud_text", Button, "draw"), ("draw_other", "__module__", "draw_simulation_frame"), ("present", "__module__", "present_frame"),
+]
+
+class PhaseProfiler:
+    """Wall-clock time per phase of the run_simulation loop, summed per generation. install() wraps the
+    PROFILED_PHASES functions in place, so without --profile nothing is wrapped and the hot path is
+    unchanged. Phase times are exclusive (a phase's time excludes phases nested inside it) and whatever
+    no phase covers is reported as "other"."""
+    def __init__(self):
+        self.phases = list(dict.fromkeys(phase for phase, _, _ in PROFILED_PHASES))
+        self.export_file, self.export_writer = None, None
+        self._nested_seconds = 0.0
+        self.begin_generation(0)
+
+    def _timed(self, phase, func):
+        profiler, perf_counter = self, time.perf_counter
+        def timed(*args, **kwargs):
+            outer_nested, profiler._nested_seconds = profiler._nested_seconds, 0.0
+            start = perf_counter()
+            try: return func(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                profiler.seconds[phase] += elapsed - profiler._nested_seconds
+                profiler._nested_seconds = outer_nested + elapsed
+        return timed
+
+    def install(self):
+        module = sys.modules[__name__]
+        for phase, owner, attribute in PROFILED_PHASES:
+            owner = module if owner == "__module__" else owner
+            setattr(owner, attribute, self._timed(phase, getattr(owner, attribute)))
+
+    def open_export(self, path):
+        # .json/.jsonl: one JSON object per line, anything else: CSV with a header row
+        self.export_file = open(path, 'w', newline='')
+        if not path.endswith((".json", ".jsonl")):
+            self.export_writer = csv.writer(self.export_file); self.export_writer.writerow(self.row_fields())
+        atexit.register(self.export_file.close)
+
+    def row_fields(self):
+        return ["generation", "frames", "seconds", "frames_per_second", "alive_start", "alive_end", "car_steps", "car_steps_per_second"] + [f"{phase}_ms" for phase in self.phases + ["other"]]
+
+    def begin_generation(self, generation):
+        self.generation, self.frames, self.car_steps, self.alive_start, self.alive_end = generation, 0, 0, None, 0
+        self.seconds = dict.fromkeys(self.phases, 0.0)
+        self.start_time = time.perf_counter()
+
+    def count_frame(self, alive_count):
+        if self.alive_start is None: self.alive_start = alive_count
+        self.frames += 1; self.car_steps += alive_count; self.alive_end = alive_count
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start_time
+        phase_ms = {phase: self.seconds[phase] * 1000.0 for phase in self.phases}
+        phase_ms["other"] = max(0.0, elapsed * 1000.0 - sum(phase_ms.values()))
+        return elapsed, phase_ms
+
+    def end_generation(self):
+        elapsed, phase_ms = self.summary()
+        row = [self.generation, self.frames, round(elapsed, 4), round(self.frames / elapsed, 1) if elapsed > 0 else 0.0, self.alive_start or 0, self.alive_end,
+               self.car_steps, round(self.car_steps / elapsed, 1) if elapsed > 0 else 0.0] + [round(phase_ms[phase], 3) for phase in self.phases + ["other"]]
+        if self.export_file is not None:
+            if self.export_writer is not None: self.export_writer.writerow(row)
+            else: self.export_file.write(json.dumps(dict(zip(self.row_fields(), row))) + "\n")
+            self.export_file.flush()
+        return row
+
+    def draw_overlay(self, font, x, y):
+        """Live ms/frame per phase for the running generation, drawn into the stats panel. Returns the new y."""
+        elapsed, phase_ms = self.summary()
+        frames = max(1, self.frames)
+        h = frame_renderer.draw_text(f"Profile ({self.car_steps / elapsed if elapsed > 0 else 0.0:,.0f} car-steps/s):", font, (x, y)); y += h + 1
+        for phase in self.phases + ["other"]:
+            h = frame_renderer.draw_text(f" {phase}: {phase_ms[phase] / frames:.2f} ms", font, (x, y), 2, 1); y += h
+        return y
+
+profiler = PhaseProfiler()
+
+# --- BENCHMARK (--benchmark) ---
+def latency_percentile(sorted_values, fraction):
+    if not sorted_values: return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+def process_memory_mb():
+    """(resident, peak resident) of this process in MB: VmRSS/VmHWM on Linux, (None, ru_maxrss) elsewhere, Nones without either."""
+    try:
+        with open("/proc/self/status") as f: fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["VmRSS"].split()[0]) / 1024, int(fields["VmHWM"].split()[0]) / 1024
+    except (OSError, KeyError, ValueError): pass
+    try:
+        import resource
+        return None, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    except ImportError: return None, None
+
+def reset_peak_memory():
+    # Linux: "5" in clear_refs resets VmHWM to the current RSS, so a forked case stops inheriting the parent's peak
+    try:
+        with open("/proc/self/clear_refs", "w") as f: f.write("5")
+    except OSError: pass
+
+def run_benchmark_case(map_path, population_size, config_neat_obj, terrain):
+    """BENCHMARK_GENERATIONS headless generations of a fixed-seed population on one map, timing every
+    step_generation call. Returns the case result as a JSON-ready dict; peak_rss_mb is the peak resident memory
+    above start_rss_mb, what the process (the parent's state included after a fork) held when the case began."""
+    reset_peak_memory(); start_rss_mb = process_memory_mb()[0]
+    random.seed(BENCHMARK_SEED) # neat draws the initial genomes and all mutations from `random`
+    config_neat_obj.pop_size = population_size
+    population = neat.Population(config_neat_obj)
+    frame_times, best_fitness, car_steps = [], [], 0
+    def evaluate(genomes, config):
+        nonlocal car_steps
+        cars, nets, car_batch = create_generation_cars(genomes, config, None)
+        gen_state = new_generation_state(0.0, len(cars)); gen_state["log_events"] = False
+        keep_running = bool(cars)
+        while keep_running:
+            alive_before_step = gen_state["alive_count"]
+            frame_start = time.perf_counter()
+            keep_running = step_generation(cars, nets, car_batch, genomes, terrain, gen_state)
+            frame_times.append(time.perf_counter() - frame_start); car_steps += alive_before_step
+        best_fitness.append(round(max(gobj.fitness for _, gobj in genomes), 6))
+    wall_start = time.perf_counter()
+    population.run(evaluate, BENCHMARK_GENERATIONS)
+    wall_seconds, step_seconds = time.perf_counter() - wall_start, sum(frame_times)
+    frame_times.sort()
+    peak_rss_mb = process_memory_mb()[1]
+    if peak_rss_mb is not None and start_rss_mb is not None: peak_rss_mb = max(0.0, peak_rss_mb - start_rss_mb)
+    return {"map": map_path, "population": population_size, "generations": len(best_fitness), "frames": len(frame_times), "car_steps": car_steps,
+            "step_seconds": round(step_seconds, 4), "wall_seconds": round(wall_seconds, 4),
+            "car_steps_per_second": round(car_steps / step_seconds, 1) if step_seconds > 0 else 0.0,
+            "frame_latency_ms": {name: round(latency_percentile(frame_times, fraction) * 1000.0, 4) for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))},
+            "start_rss_mb": round(start_rss_mb, 1) if start_rss_mb is not None else None,
+            "peak_rss_mb": round(peak_rss_mb, 1) if peak_rss_mb is not None else None, "best_fitness": best_fitness}
+
+def measure_step_allocations(terrain, num_cars=BENCHMARK_ALLOC_CARS, frames=BENCHMARK_ALLOC_FRAMES):
+    """Steps num_cars scalar Cars under tracemalloc, each steering toward its longer diagonal radar instead of
+    using a network. Measures from the second traced step on, when every per-car value has been replaced by a
+    traced object once. Car.update only churns number objects, which CPython recycles, so neither the live nor
+    the peak traced memory should grow with the number of car steps. Returns (live_bytes_growth, peak_bytes, car_steps)."""
+    import tracemalloc
+    cars, frame_schedule = [Car(None) for _ in range(num_cars)], [None] * frames # No ints above the small-int cache while tracing
+    for i_car, car_obj in enumerate(cars): car_obj.angle = car_obj.target_angle = (i_car - num_cars // 2) % 360
+    def step_cars():
+        for car_obj in cars:
+            if not car_obj.alive: continue
+            radar_data = car_obj.last_radar_data
+            car_obj.target_angle = (car_obj.angle + 10 * ANGLE_STEP * (radar_data[3] - radar_data[1])) % 360
+            car_obj.update(terrain)
+            if car_obj.alive: car_obj.get_fitness()
+    tracemalloc.start()
+    try:
+        step_cars()
+        steps_before = sum(car_obj.time_survived for car_obj in cars)
+        start_bytes = tracemalloc.get_traced_memory()[0]; tracemalloc.reset_peak()
+        for _ in frame_schedule: step_cars()
+        live_bytes, peak_bytes = tracemalloc.get_traced_memory()
+    finally: tracemalloc.stop()
+    return live_bytes - start_bytes, peak_bytes - start_bytes, (sum(car_obj.time_survived for car_obj in cars) - steps_before) // SIMULATION_DT
+
+def measure_trajectories(config_neat_obj, terrain, num_cars=BENCHMARK_TRAJECTORY_CARS, mutations=BENCHMARK_TRAJECTORY_MUTATIONS):
+    """Runs one generation of fixed-seed genomes with the scalar and with the batch engine, recording every car's
+    x, y, angle and speed each frame as doubles. Returns the JSON-ready result: the two runs must match frame for
+    frame, and the digest (SHA-256 of the scalar run) lets --bench-baseline catch a change of the simulation."""
+    global PHYSICS_ENGINE
+    random.seed(BENCHMARK_SEED)
+    genome_config, genomes = config_neat_obj.genome_config, []
+    for key in range(num_cars):
+        genome = config_neat_obj.genome_type(key); genome.configure_new(genome_config)
+        for _ in range(mutations): genome.mutate(genome_config)
+        genomes.append((key, genome))
+    runs, engine_before = {}, PHYSICS_ENGINE
+    try:
+        for engine in ("scalar", "batch") if np is not None else ("scalar",):
+            PHYSICS_ENGINE = engine
+            cars, nets, car_batch = create_generation_cars(genomes, config_neat_obj, None)
+            gen_state = new_generation_state(0.0, len(cars)); gen_state["log_events"] = False
+            frames, keep_running = [], bool(cars)
+            while keep_running:
+                keep_running = step_generation(cars, nets, car_batch, genomes, terrain, gen_state)
+                frames.append(array.array('d', [value for car_obj in cars for value in (*car_obj.position, car_obj.angle, car_obj.speed)]).tobytes())
+            runs[engine] = (frames, [gobj.fitness for _, gobj in genomes])
+    finally: PHYSICS_ENGINE = engine_before
+    scalar_frames, scalar_fitness = runs["scalar"]
+    batch_frames, batch_fitness = runs.get("batch", runs["scalar"])
+    first_mismatch = next((i_frame for i_frame, (a, b) in enumerate(itertools.zip_longest(scalar_frames, batch_frames)) if a != b), None)
+    return {"cars": num_cars, "mutations": mutations, "frames": len(scalar_frames), "compared_engines": list(runs),
+            "digest": hashlib.sha256(b"".join(scalar_frames)).hexdigest(), "first_mismatch_frame": first_mismatch,
+            "passed": first_mismatch is None and scalar_fitness == batch_fitness}
+
+def measure_compiled_networks(config_neat_obj, num_genomes=BENCHMARK_NN_GENOMES, mutations=BENCHMARK_NN_MUTATIONS, calls=BENCHMARK_NN_CALLS):
+    """Compares CompiledNetwork with neat's FeedForwardNetwork on fixed-seed genomes mutated `mutations` times
+    each (so they have hidden and disabled nodes) and random radar inputs. Returns the JSON-ready result:
+    outputs must match exactly, the timings are microseconds per call."""
+    random.seed(BENCHMARK_SEED)
+    genome_config, num_inputs = config_neat_obj.genome_config, len(config_neat_obj.genome_config.input_keys)
+    genomes = []
+    for key in range(num_genomes):
+        genome = config_neat_obj.genome_type(key); genome.configure_new(genome_config)
+        for _ in range(mutations): genome.mutate(genome_config)
+        genomes.append(genome)
+    inputs = [[random.random() for _ in range(num_inputs)] for _ in range(calls)]
+    mismatches, seconds, nodes = 0, {"neat": 0.0, "compiled": 0.0, "compiled_choose": 0.0}, [0, 0]
+    for genome in genomes:
+        reference, compiled = neat.nn.FeedForwardNetwork.create(genome, config_neat_obj), compile_genome(genome, config_neat_obj)
+        nodes[0] += len(genome.nodes); nodes[1] += compiled.num_nodes
+        for x in inputs:
+            outputs = reference.activate(x)
+            mismatches += outputs != compiled.activate(x) or outputs.index(max(outputs)) != compiled.choose(x)
+        for name, activate in (("neat", reference.activate), ("compiled", compiled.activate), ("compiled_choose", compiled.choose)):
+            start = time.perf_counter()
+            for x in inputs: activate(x)
+            seconds[name] += time.perf_counter() - start
+    per_call_us = {name: round(total / (num_genomes * calls) * 1e6, 3) for name, total in seconds.items()}
+    return {"genomes": num_genomes, "mutations": mutations, "calls": num_genomes * calls, "nodes": nodes[0], "evaluated_nodes": nodes[1],
+            "per_call_us": per_call_us, "mismatches": mismatches, "passed": mismatches == 0}
+
+def _benchmark_case_process(result_conn, map_path, population_size, config_neat_obj, terrain):
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # The parent terminates us on Ctrl+C
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try: result_conn.send(run_benchmark_case(map_path, population_size, config_neat_obj, terrain))
+    finally: result_conn.close()
+
+def run_benchmark_case_isolated(map_path, population_size, config_neat_obj, terrain):
+    # A fresh forked process per case keeps peak RSS per case (it never goes down) and stops one case's
+    # allocator state from leaking into the next; the case subtracts what it inherited from the parent. Without fork the case runs in-process.
+    if "fork" not in multiprocessing.get_all_start_methods(): return run_benchmark_case(map_path, population_size, config_neat_obj, terrain)
+    fork_ctx = multiprocessing.get_context("fork")
+    parent_conn, child_conn = fork_ctx.Pipe(duplex=False)
+    case_process = fork_ctx.Process(target=_benchmark_case_process, args=(child_conn, map_path, population_size, config_neat_obj, terrain))
+    case_process.start(); child_conn.close()
+    try: return parent_conn.recv()
+    except EOFError: raise RuntimeError(f"benchmark case {map_path} / {population_size} died (exit code {case_process.exitcode})")
+    finally:
+        if case_process.is_alive(): case_process.terminate()
+        case_process.join()
+
+def compare_benchmark_to_baseline(report, baseline, threshold):
+    """Prints every case against the baseline report; returns False if any case lost more than
+    `threshold` of its car-steps/s, or if the trajectory digest changed although both runs simulated the
+    same thing. Fitness is only compared in that case too."""
+    baseline_cases = {(case["map"], case["population"]): case for case in baseline.get("results", [])}
+    same_simulation = all(report["settings"].get(k) == baseline.get("settings", {}).get(k) for k in ("seed", "generations", "seconds_per_generation", "radar_table", "track_progress", "fitness_mode", "early_end", "dt", "control_interval", "swept_collision"))
+    regressions = 0
+    trajectories, base_trajectories = report.get("trajectories", {}), baseline.get("trajectories", {})
+    if same_simulation and base_trajectories.get("map") == trajectories.get("map") and base_trajectories.get("digest") not in (None, trajectories.get("digest")):
+        print(f"\nTrajectory digest differs from baseline ({base_trajectories['digest'][:16]} -> {trajectories['digest'][:16]}): the seeded scalar run no longer moves the same")
+        regressions += 1
+    print(f"\nBaseline comparison (fail below {1.0 - threshold:.2f}x):")
+    for case in report["results"]:
+        base_case = baseline_cases.get((case["map"], case["population"]))
+        if base_case is None: print(f"  {case['map']:<10} pop {case['population']:>5}: not in baseline"); continue
+        ratio = case["car_steps_per_second"] / base_case["car_steps_per_second"] if base_case["car_steps_per_second"] else 1.0
+        regressed = ratio < 1.0 - threshold; regressions += regressed
+        print(f"  {case['map']:<10} pop {case['population']:>5}: {ratio:5.2f}x ({base_case['car_steps_per_second']:,.0f} -> {case['car_steps_per_second']:,.0f} car-steps/s){'  REGRESSION' if regressed else ''}")
+        if same_simulation and base_case.get("best_fitness") != case["best_fitness"]:
+            print(f"    WARNING: best fitness differs from baseline ({base_case.get('best_fitness')} -> {case['best_fitness']}), the simulation is no longer the same")
+    return regressions == 0
+
+def run_benchmark(config_neat_obj, output_path, baseline_path=None, threshold=BENCHMARK_REGRESSION_THRESHOLD):
+    """Runs every BENCHMARK_MAPS x BENCHMARK_POPULATIONS case headless, writes the JSON report to
+    output_path and, with a baseline report, returns False when throughput regressed."""
+    global GENERATION_TIME_LIMIT_SECONDS
+    GENERATION_TIME_LIMIT_SECONDS = BENCHMARK_SECONDS
+    settings = {"engine": PHYSICS_ENGINE if np is not None else "scalar", "batched_nn": BATCHED_NN_ENABLED and np is not None, "radar_table": RADAR_TABLE_ENABLED,
+                "track_progress": TRACK_PROGRESS_ENABLED, "fitness_mode": FITNESS_MODE, "early_end": EARLY_GENERATION_END,
+                "dt": SIMULATION_DT, "control_interval": CONTROL_INTERVAL, "swept_collision": SWEPT_COLLISION,
+                "seed": BENCHMARK_SEED, "generations": BENCHMARK_GENERATIONS, "seconds_per_generation": BENCHMARK_SECONDS, "fps": FPS,
+                "python": sys.version.split()[0], "numpy": np.__version__ if np is not None else None}
+    print(f"Benchmark: {settings}")
+    results = []
+    for map_path in BENCHMARK_MAPS:
+        terrain = assets.terrain(map_path)
+        if RADAR_TABLE_ENABLED: terrain.radar_table = assets.radar_table(map_path)
+        if TRACK_PROGRESS_ENABLED: attach_track_index(terrain, map_path)
+        for population_size in BENCHMARK_POPULATIONS:
+            case = run_benchmark_case_isolated(map_path, population_size, config_neat_obj, terrain); results.append(case)
+            latency = case["frame_latency_ms"]
+            print(f"  {map_path:<10} pop {population_size:>5}: {case['car_steps_per_second']:>12,.0f} car-steps/s | frame p50 {latency['p50']:.2f}ms p90 {latency['p90']:.2f}ms "
+                  f"p99 {latency['p99']:.2f}ms max {latency['max']:.2f}ms | peak RSS +{case['peak_rss_mb']} MB over {case['start_rss_mb']} MB | {case['frames']} frames")
+    live_bytes, peak_bytes, alloc_car_steps = measure_step_allocations(assets.terrain(BENCHMARK_MAPS[0]))
+    allocations = {"map": BENCHMARK_MAPS[0], "cars": BENCHMARK_ALLOC_CARS, "frames": BENCHMARK_ALLOC_FRAMES, "car_steps": alloc_car_steps,
+                   "live_bytes_growth": live_bytes, "peak_bytes": peak_bytes, "passed": live_bytes <= BENCHMARK_ALLOC_LIMIT_BYTES and peak_bytes <= BENCHMARK_ALLOC_LIMIT_BYTES}
+    print(f"  Allocations ({BENCHMARK_MAPS[0]}, {alloc_car_steps} scalar car steps under tracemalloc): live +{live_bytes} B, peak {peak_bytes} B "
+          f"(limit {BENCHMARK_ALLOC_LIMIT_BYTES} B) -> {'OK' if allocations['passed'] else 'FAIL'}")
+    trajectories = measure_trajectories(config_neat_obj, assets.terrain(BENCHMARK_MAPS[0])); trajectories["map"] = BENCHMARK_MAPS[0]
+    mismatch_text = "identical" if trajectories["first_mismatch_frame"] is None else f"first mismatch at frame {trajectories['first_mismatch_frame']}"
+    print(f"  Trajectories ({BENCHMARK_MAPS[0]}, {trajectories['cars']} cars x {trajectories['frames']} frames, {' vs '.join(trajectories['compared_engines'])}): "
+          f"{mismatch_text}, digest {trajectories['digest'][:16]} -> {'OK' if trajectories['passed'] else 'FAIL'}")
+    compiled_nn = measure_compiled_networks(config_neat_obj)
+    print(f"  Compiled networks ({compiled_nn['calls']} calls, {compiled_nn['evaluated_nodes']} of {compiled_nn['nodes']} nodes kept): neat {compiled_nn['per_call_us']['neat']:.2f}us, "
+          f"compiled {compiled_nn['per_call_us']['compiled']:.2f}us, argmax {compiled_nn['per_call_us']['compiled_choose']:.2f}us per call, "
+          f"{compiled_nn['mismatches']} mismatches -> {'OK' if compiled_nn['passed'] else 'FAIL'}")
+    report = {"settings": settings, "results": results, "allocations": allocations, "trajectories": trajectories, "compiled_nn": compiled_nn}
+    with open(output_path, 'w') as f: json.dump(report, f, indent=2)
+    print(f"Benchmark report written to {output_path}")
+    if not report["allocations"]["passed"]: print(f"FAILED: stepping scalar cars allocated more than {BENCHMARK_ALLOC_LIMIT_BYTES} bytes")
+    if not report["trajectories"]["passed"]: print("FAILED: the scalar and batch engines produced different trajectories")
+    if not report["compiled_nn"]["passed"]: print("FAILED: compiled networks disagree with neat's FeedForwardNetwork")
+    checks_passed = report["allocations"]["passed"] and report["trajectories"]["passed"] and report["compiled_nn"]["passed"]
+    if baseline_path is None: return checks_passed
+    with open(baseline_path) as f: baseline = json.load(f)
+    return compare_benchmark_to_baseline(report, baseline, threshold) and checks_passed
+
+# --- HYPERPARAMETER SWEEP (--sweep SPEC.json) ---
+def load_sweep_spec(path):
+    """Reads a sweep spec and returns it with defaults filled in. A spec is JSON:
+        {"search": "grid" | "random", "samples": 20, "seed": 0, "seeds": [0, 1], "generations": 50,
+         "seconds_per_generation": 70, "map": "map.png", "parameters": {name: values, ...}}
+    A parameter is a config.txt option (pop_size, conn_add_prob, ...) or one of SWEEP_FITNESS_CONSTANTS
+    (LANE_REWARD_FACTOR, ...). Its values are a list, or for "random" also {"min": a, "max": b}."""
+    with open(path) as f: spec = json.load(f)
+    spec.setdefault("search", "grid"); spec.setdefault("samples", 10); spec.setdefault("seed", 0); spec.setdefault("seeds", [0])
+    spec.setdefault("generations", SWEEP_GENERATIONS); spec.setdefault("seconds_per_generation", SWEEP_SECONDS); spec.setdefault("map", MAP_IMAGE_PATH)
+    if spec["search"] not in ("grid", "random"): raise ValueError(f"sweep search must be 'grid' or 'random', not {spec['search']!r}")
+    if not spec.get("parameters"): raise ValueError("sweep spec has no parameters")
+    for name, values in spec["parameters"].items():
+        if isinstance(values, dict) and (spec["search"] != "random" or not {"min", "max"} <= values.keys()): raise ValueError(f"sweep parameter {name}: ranges need \"search\": \"random\" and min/max")
+        if not isinstance(values, (list, dict)) or not values: raise ValueError(f"sweep parameter {name}: expected a list of values or a min/max range")
+    return spec
+
+def sweep_variants(spec):
+    # Every combination for "grid"; spec["samples"] independent draws (seeded by spec["seed"]) for "random"
+    names = sorted(spec["parameters"])
+    if spec["search"] == "grid":
+        combinations = [[]]
+        for name in names: combinations = [combination + [value] for combination in combinations for value in spec["parameters"][name]]
+        return [dict(zip(names, combination)) for combination in combinations]
+    rng, variants = random.Random(spec["seed"]), []
+    for _ in range(spec["samples"]):
+        variant = {}
+        for name in names:
+            values = spec["parameters"][name]
+            if isinstance(values, list): variant[name] = rng.choice(values)
+            elif isinstance(values["min"], int) and isinstance(values["max"], int): variant[name] = rng.randint(values["min"], values["max"])
+            else: variant[name] = rng.uniform(values["min"], values["max"])
+        variants.append(variant)
+    return variants
+
+def write_sweep_config(base_config_path, variant, output_path):
+    """Writes base_config_path with the variant's config.txt options replaced. Returns the module constants of the
+    variant ({name: value}); raises ValueError for a name that is neither."""
+    parser = configparser.ConfigParser(); parser.read(base_config_path)
+    constants = {}
+    for name, value in variant.items():
+        if name in SWEEP_FITNESS_CONSTANTS: constants[name] = value; continue
+        sections = [section for section in parser.sections() if parser.has_option(section, name)]
+        if not sections: raise ValueError(f"sweep parameter {name} is neither a {base_config_path} option nor a fitness constant ({', '.join(SWEEP_FITNESS_CONSTANTS)})")
+        parser.set(sections[0], name, str(value))
+    with open(output_path, 'w') as f: parser.write(f)
+    return constants
+
+def _init_sweep_worker():
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # The main process terminates the pool on Ctrl+C
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+def _run_sweep_training(task):
+    """One headless training run of one variant and seed, in a fresh pool process (maxtasksperchild=1), so the
+    variant's constants and the seeded `random` cannot leak into other runs. Every generation's summary is
+    streamed to log_path by a StreamingStatsReporter. Returns the run's result dict."""
+    global GENERATION_TIME_LIMIT_SECONDS, MAP_IMAGE_PATH
+    variant_name, config_path, constants, seed, generations, seconds_per_generation, map_path, log_path = task
+    globals().update(constants)
+    GENERATION_TIME_LIMIT_SECONDS, MAP_IMAGE_PATH = seconds_per_generation, map_path
+    terrain = assets.terrain(map_path) # Loaded by the main process before the pool forked
+    if RADAR_TABLE_ENABLED: terrain.radar_table = assets.radar_table(map_path)
+    if TRACK_PROGRESS_ENABLED: attach_track_index(terrain, map_path)
+    random.seed(seed) # neat draws the initial genomes and all mutations from `random`
+    config_neat_obj = neat.Config(neat.DefaultGenome, neat.DefaultReproduction, neat.DefaultSpeciesSet, neat.DefaultStagnation, config_path)
+    population, reporter = neat.Population(config_neat_obj), StreamingStatsReporter(log_path)
+    population.add_reporter(reporter); reporter.start_run()
+    result = {"variant": variant_name, "seed": seed, "generations": 0, "threshold_generation": None, "threshold_seconds": None, "best_fitness": -float('inf'), "car_steps": 0, "log": log_path}
+    run_start = time.perf_counter()
+    def evaluate(genomes, config):
+        gen_state = simulate_genomes_headless(genomes, config, terrain)
+        reporter.add_car_steps(gen_state["car_steps"])
+        result["generations"] += 1; result["car_steps"] += gen_state["car_steps"]
+        result["best_fitness"] = max(result["best_fitness"], max((gobj.fitness for _, gobj in genomes), default=-float('inf')))
+        if result["threshold_generation"] is None and result["best_fitness"] >= config.fitness_threshold:
+            result["threshold_generation"], result["threshold_seconds"] = result["generations"], round(time.perf_counter() - run_start, 3)
+    try: population.run(evaluate, generations) # Stops by itself at fitness_threshold
+    finally: reporter.close()
+    result["wall_seconds"] = round(time.perf_counter() - run_start, 3)
+    result["car_steps_per_second"] = round(result["car_steps"] / result["wall_seconds"], 1) if result["wall_seconds"] > 0 else 0.0
+    return result
+
+def rank_sweep_variants(variants, runs):
+    """Per-variant summary of its runs, best first: most runs reaching fitness_threshold, then the shortest
+    mean time to reach it, then the highest mean best fitness."""
+    summaries = []
+    for variant_name, parameters in variants.items():
+        variant_runs = [run for run in runs if run["variant"] == variant_name]
+        if not variant_runs: continue
+        solved = [run for run in variant_runs if run["threshold_generation"] is not None]
+        summaries.append({"variant": variant_name, "parameters": parameters, "runs": len(variant_runs), "solved": len(solved),
+                          "mean_threshold_generation": round(neat.math_util.mean([run["threshold_generation"] for run in solved]), 2) if solved else None,
+                          "mean_threshold_seconds": round(neat.math_util.mean([run["threshold_seconds"] for run in solved]), 3) if solved else None,
+                          "mean_best_fitness": round(neat.math_util.mean([run["best_fitness"] for run in variant_runs]), 3),
+                          "max_best_fitness": round(max(run["best_fitness"] for run in variant_runs), 3),
+                          "car_steps_per_second": round(neat.math_util.mean([run["car_steps_per_second"] for run in variant_runs]), 1)})
+    summaries.sort(key=lambda s: (-s["solved"] / s["runs"], s["mean_threshold_seconds"] if s["solved"] else float('inf'), -s["mean_best_fitness"]))
+    for rank, summary in enumerate(summaries, 1): summary["rank"] = rank
+    return summaries
+
+def run_sweep(spec_path, output_dir=SWEEP_OUTPUT_DIR, num_workers=None):
+    """--sweep: every variant x seed of the spec as an independent headless training run on a process pool.
+    Writes output_dir/variants/<variant>.cfg, output_dir/runs/<variant>-s<seed>.jsonl (one line per generation)
+    and output_dir/summary.json with the ranked variants. Returns True if every run finished."""
+    spec = load_sweep_spec(spec_path)
+    os.makedirs(os.path.join(output_dir, "variants"), exist_ok=True); os.makedirs(os.path.join(output_dir, "runs"), exist_ok=True)
+    variants, tasks = {}, []
+    for i_variant, parameters in enumerate(sweep_variants(spec)):
+        variant_name = f"v{i_variant:03d}"; config_path = os.path.join(output_dir, "variants", f"{variant_name}.cfg")
+        constants = write_sweep_config(CONFIG_PATH, parameters, config_path); variants[variant_name] = parameters
+        for seed in spec["seeds"]:
+            log_path = os.path.join(output_dir, "runs", f"{variant_name}-s{seed}.jsonl")
+            if os.path.exists(log_path): os.remove(log_path) # StreamingStatsReporter appends
+            tasks.append((variant_name, config_path, constants, seed, spec["generations"], spec["seconds_per_generation"], spec["map"], log_path))
+    terrain = assets.terrain(spec["map"]) # Before the pool forks, so no run redoes the map work
+    if RADAR_TABLE_ENABLED: assets.radar_table(spec["map"])
+    if TRACK_PROGRESS_ENABLED: assets.track_index(spec["map"], terrain)
+    num_workers = num_workers or os.cpu_count() or 1
+    print(f"Sweep: {len(variants)} variants x {len(spec['seeds'])} seeds = {len(tasks)} runs of up to {spec['generations']} generations on {num_workers} processes")
+    runs, pool = [], multiprocessing.Pool(num_workers, initializer=_init_sweep_worker, maxtasksperchild=1)
+    try:
+        for result in pool.imap_unordered(_run_sweep_training, tasks):
+            runs.append(result)
+            reached = f"threshold at generation {result['threshold_generation']} ({result['threshold_seconds']:.1f}s)" if result["threshold_generation"] else "threshold not reached"
+            print(f"  [{len(runs)}/{len(tasks)}] {result['variant']} seed {result['seed']}: best {result['best_fitness']:.2f}, {reached}, {result['car_steps_per_second']:,.0f} car-steps/s")
+        pool.close()
+    except KeyboardInterrupt: print("Sweep interrupted, summarizing the finished runs."); pool.terminate()
+    pool.join()
+    ranking = rank_sweep_variants(variants, runs)
+    with open(os.path.join(output_dir, "summary.json"), 'w') as f: json.dump({"spec": spec, "ranking": ranking, "runs": sorted(runs, key=lambda run: (run["variant"], run["seed"]))}, f, indent=2)
+    print(f"\nSweep ranking (fitness_threshold reached / runs, mean time to threshold, mean best fitness):")
+    for summary in ranking:
+        time_text = f"gen {summary['mean_threshold_generation']:.1f} / {summary['mean_threshold_seconds']:.1f}s" if summary["solved"] else "-"
+        print(f"  #{summary['rank']:<3} {summary['variant']} {summary['solved']}/{summary['runs']} {time_text:>20} | best {summary['mean_best_fitness']:>10.2f} | "
+              f"{summary['car_steps_per_second']:>10,.0f} car-steps/s | {json.dumps(summary['parameters'])}")
+    print(f"Sweep summary written to {os.path.join(output_dir, 'summary.json')}")
+    return len(runs) == len(tasks)
+
+def parse_command_line_args():
+    parser = argparse.ArgumentParser(description="NEAT car evolution simulator")
+    parser.add_argument("--headless", action="store_true", help="train without a display or frame limiter (SDL dummy video driver)")
+    parser.add_argument("--radar-table", action="store_true", help="read radars from a cached per-heading distance table (needs NumPy)")
+    parser.add_argument("--engine", choices=["scalar", "batch"], default="scalar", help="per-car Car objects or the vectorized CarBatch engine (needs NumPy)")
+    parser.add_argument("--no-batched-nn", action="store_true", help="activate one neat FeedForwardNetwork per car instead of BatchedNetworks")
+    parser.add_argument("--workers", type=int, default=0, help="evaluate each generation on N worker processes (0 = in-process)")
+    parser.add_argument("--distributed", metavar="HOST:PORT", help="coordinate distributed evaluation: serve each generation's batches to --worker processes on this address")
+    parser.add_argument("--worker", metavar="HOST:PORT", help="run as a headless distributed worker for the --distributed coordinator at HOST:PORT")
+    parser.add_argument("--authkey", default=DISTRIBUTED_AUTHKEY, help=f"shared secret of the --distributed coordinator and its workers (required for a non-loopback --distributed address; --worker falls back to ${DISTRIBUTED_AUTHKEY_ENV})")
+    parser.add_argument("--local-workers", type=int, default=DISTRIBUTED_LOCAL_WORKERS, help="with --distributed, also start N worker processes on this machine")
+    parser.add_argument("--no-fitness-cache", action="store_true", help="re-simulate unchanged elite genomes instead of reusing their cached fitness")
+    parser.add_argument("--dt", type=int, default=SIMULATION_DT, help="frames of simulated time per physics step (> 1 turns on --swept-collision)")
+    parser.add_argument("--control-every", type=int, default=CONTROL_INTERVAL, help="physics steps per radar scan and NN decision")
+    parser.add_argument("--swept-collision", action="store_true", help="check car corners between the old and the new pose so fast cars cannot tunnel through thin walls")
+    parser.add_argument("--track-progress", action="store_true", help="index progress along the track and cull cars that stop advancing (needs NumPy)")
+    parser.add_argument("--progress-window", type=float, default=TRACK_PROGRESS_WINDOW_FRAMES / FPS, help="seconds a car may go without forward progress before it is culled (0 = no limit)")
+    parser.add_argument("--fitness", choices=["distance", "progress"], default=FITNESS_MODE, help="score distance driven or best track progress (progress implies --track-progress)")
+    parser.add_argument("--end-when-beaten", action="store_true", help="end a generation once no live car can still beat its best fitness")
+    parser.add_argument("--time-warp", choices=TIME_WARP_MODES, default=time_warp_mode, help="simulation steps per rendered frame (adaptive holds --target-fps)")
+    parser.add_argument("--render-thread", action="store_true", help="step the simulation on its own thread; the window draws its latest snapshot")
+    parser.add_argument("--target-fps", type=int, default=TIME_WARP_TARGET_FPS, help="display FPS the adaptive time warp aims for")
+    parser.add_argument("--lod", type=int, default=RENDER_LOD_TOP_K, help="draw only the K fittest cars (and the right-click selected one) in full detail (0 = every car)")
+    parser.add_argument("--lod-style", choices=["points", "heatmap"], default=RENDER_LOD_STYLE, help="how --lod draws the other cars")
+    parser.add_argument("--full-redraw", action="store_true", help="compose and flip every frame from scratch instead of updating dirty rectangles")
+    parser.add_argument("--sprite-angle-step", type=float, default=SPRITE_ATLAS_ANGLE_RESOLUTION, help="degrees between pre-rotated car sprites")
+    parser.add_argument("--check-radar-table", action="store_true", help="compare the radar table against the pixel-marching radar and exit")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="write the training state here every --checkpoint-every generations or --checkpoint-seconds (\"\" = off)")
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY_GENERATIONS, help="generations between checkpoints")
+    parser.add_argument("--checkpoint-seconds", type=float, default=CHECKPOINT_EVERY_SECONDS, help="seconds between checkpoints")
+    parser.add_argument("--resume", action="store_true", help="continue the training saved in --checkpoint")
+    parser.add_argument("--overwrite-checkpoint", action="store_true", help="start a new training even though --checkpoint holds an earlier one (it is replaced)")
+    parser.add_argument("--export-best", default=BEST_GENOME_PATH, help="keep the best genome so far in this file, and its network as a standalone .py next to it (\"\" = off)")
+    parser.add_argument("--stats-log", default=STATS_LOG_PATH, help="append per-generation training statistics as JSON lines to this file (\"\" = none)")
+    parser.add_argument("--profile", action="store_true", help="time each phase of the simulation loop and show it in the stats panel")
+    parser.add_argument("--profile-output", help="append one row of phase timings per generation (.csv, or .json/.jsonl for JSON lines); implies --profile")
+    parser.add_argument("--record", metavar="PATH", help="record every generation's car trajectories to a chunked binary file for --replay")
+    parser.add_argument("--record-top", type=int, default=RECORD_TOP_K, help="cars per generation kept by --record, best fitness first (0 = every car)")
+    parser.add_argument("--replay", metavar="PATH", help="play a --record file back in the window (no networks, no physics) and exit")
+    parser.add_argument("--sweep", metavar="SPEC", help="run the headless training runs of a JSON sweep spec on a process pool, rank the variants and exit")
+    parser.add_argument("--sweep-output", default=SWEEP_OUTPUT_DIR, help="directory for the --sweep variant configs, run logs and summary.json")
+    parser.add_argument("--sweep-workers", type=int, default=0, help="processes for --sweep (0 = one per CPU)")
+    parser.add_argument("--benchmark", action="store_true", help="run the headless benchmark over maps x population sizes and exit")
+    parser.add_argument("--bench-maps", default=",".join(BENCHMARK_MAPS), help="comma separated map images for --benchmark")
+    parser.add_argument("--bench-populations", default=",".join(map(str, BENCHMARK_POPULATIONS)), help="comma separated population sizes for --benchmark")
+    parser.add_argument("--bench-generations", type=int, default=BENCHMARK_GENERATIONS, help="generations per benchmark case")
+    parser.add_argument("--bench-seconds", type=int, default=BENCHMARK_SECONDS, help="simulated seconds per benchmark generation")
+    parser.add_argument("--bench-output", default="benchmark.json", help="where --benchmark writes its JSON report")
+    parser.add_argument("--bench-baseline", help="earlier --benchmark report; exit 1 if car-steps/s dropped by more than --bench-threshold")
+    parser.add_argument("--bench-threshold", type=float, default=BENCHMARK_REGRESSION_THRESHOLD, help="allowed throughput loss vs --bench-baseline (0.10 = 10%%)")
+    return parser.parse_args()
+
 if __name__=="__main__":
+    cli_args = parse_command_line_args()
+    if cli_args.headless or cli_args.check_radar_table or cli_args.benchmark or cli_args.worker or cli_args.sweep:
+        HEADLESS_MODE = True
+        os.environ["SDL_VIDEODRIVER"] = "dummy" # set_mode/convert_alpha still need a (virtual) display
+    if cli_args.radar_table or cli_args.check_radar_table:
+        if np is None: print("WARNING: --radar-table needs NumPy, using the pixel-marching radar.")
+        else: RADAR_TABLE_ENABLED = True
+    if cli_args.engine == "batch" and np is None: print("WARNING: --engine batch needs NumPy, using the scalar engine.")
+    PHYSICS_ENGINE = cli_args.engine
+    if (cli_args.track_progress or cli_args.fitness == "progress") and np is None: print("WARNING: --track-progress needs NumPy, using distance fitness without culling.")
+    else: TRACK_PROGRESS_ENABLED, FITNESS_MODE = cli_args.track_progress or cli_args.fitness == "progress", cli_args.fitness
+    TRACK_PROGRESS_WINDOW_FRAMES = max(0, int(cli_args.progress_window * FPS))
+    EARLY_GENERATION_END = cli_args.end_when_beaten
+    FITNESS_CACHE_ENABLED = not cli_args.no_fitness_cache
+    SIMULATION_DT, CONTROL_INTERVAL = max(1, cli_args.dt), max(1, cli_args.control_every)
+    SWEPT_COLLISION = cli_args.swept_collision or SIMULATION_DT > 1
+    BATCHED_NN_ENABLED = not cli_args.no_batched_nn
+    PARALLEL_WORKERS = max(0, cli_args.workers)
+    DISTRIBUTED_ADDRESS, DISTRIBUTED_AUTHKEY = parse_address(cli_args.distributed) if cli_args.distributed else None, cli_args.authkey
+    if DISTRIBUTED_ADDRESS is not None and DISTRIBUTED_AUTHKEY is None:
+        if not is_loopback_host(DISTRIBUTED_ADDRESS[0]):
+            print(f"ERROR: --distributed {cli_args.distributed} is reachable from other hosts; pass a secret --authkey (workers run any pickle it authenticates)."); pygame.quit(); sys.exit(1)
+        DISTRIBUTED_AUTHKEY = secrets.token_hex(16)
+        print(f"Distributed authkey for --worker processes: {DISTRIBUTED_AUTHKEY}")
+    DISTRIBUTED_LOCAL_WORKERS = max(0, cli_args.local_workers)
+    SPRITE_ATLAS_ANGLE_RESOLUTION = max(0.1, cli_args.sprite_angle_step)
+    DIRTY_RECT_RENDERING = not cli_args.full_redraw
+    RENDER_LOD_TOP_K, RENDER_LOD_STYLE = max(0, cli_args.lod), cli_args.lod_style
+    time_warp_mode, TIME_WARP_TARGET_FPS = cli_args.time_warp, max(1, cli_args.target_fps)
+    PROFILER_ENABLED = cli_args.profile or cli_args.profile_output is not None
+    RENDER_THREAD_ENABLED = cli_args.render_thread and not PROFILER_ENABLED
+    STATS_LOG_PATH = cli_args.stats_log
+    CHECKPOINT_PATH, BEST_GENOME_PATH = cli_args.checkpoint, cli_args.export_best
+    CHECKPOINT_EVERY_GENERATIONS, CHECKPOINT_EVERY_SECONDS = max(1, cli_args.checkpoint_every), max(0.0, cli_args.checkpoint_seconds)
+    if cli_args.render_thread and PROFILER_ENABLED: print("WARNING: --render-thread is ignored with --profile (the phase timers assume one thread).")
+    if PROFILER_ENABLED:
+        profiler.install()
+        if cli_args.profile_output: profiler.open_export(cli_args.profile_output)
+    BENCHMARK_MAPS = [m for m in cli_args.bench_maps.split(",") if m]
+    BENCHMARK_POPULATIONS = [int(n) for n in cli_args.bench_populations.split(",") if n]
+    BENCHMARK_GENERATIONS, BENCHMARK_SECONDS = max(1, cli_args.bench_generations), max(1, cli_args.bench_seconds)
     pygame.init(); pygame.font.init()
     main_screen, main_clock = pygame.display.set_mode((WINDOW_WIDTH,WINDOW_HEIGHT)), pygame.time.Clock()
     local_dir = os.path.dirname(__file__)
-    config_path_abs, car_img_path_abs, map_path_abs = os.path.join(local_dir,CONFIG_PATH), os.path.join(local_dir,CAR_IMAGE_PATH), os.path.join(local_dir, 'map-d.png')
+    config_path_abs, car_img_path_abs, map_path_abs = os.path.join(local_dir,CONFIG_PATH), os.path.join(local_dir,CAR_IMAGE_PATH), os.path.join(local_dir, MAP_IMAGE_PATH)
     if not all(os.path.exists(f) for f in [config_path_abs, car_img_path_abs, map_path_abs]):
         print(f"ERROR: Missing files. Config: {config_path_abs}, Car: {car_img_path_abs}, Map: {map_path_abs}"); pygame.quit();sys.exit()
     try: config_neat_main=neat.Config(neat.DefaultGenome,neat.DefaultReproduction,neat.DefaultSpeciesSet,neat.DefaultStagnation,config_path_abs)
     except Exception as e: print(f"ERROR: NEAT config error ({config_path_abs}): {e}"); pygame.quit();sys.exit()
 
+    if cli_args.worker:
+        worker_authkey = DISTRIBUTED_AUTHKEY or os.environ.get(DISTRIBUTED_AUTHKEY_ENV)
+        if not worker_authkey: print(f"ERROR: --worker needs the coordinator's key: --authkey KEY or ${DISTRIBUTED_AUTHKEY_ENV}."); pygame.quit(); sys.exit(1)
+        run_distributed_worker(parse_address(cli_args.worker), worker_authkey)
+        pygame.quit(); sys.exit()
+
+    if cli_args.check_radar_table:
+        if not RADAR_TABLE_ENABLED: pygame.quit(); sys.exit(1)
+        check_terrain = assets.terrain(MAP_IMAGE_PATH)
+        mean_err, p95_err, max_err = verify_radar_table(check_terrain, assets.radar_table(MAP_IMAGE_PATH))
+        radar_check_passed = mean_err <= RADAR_TABLE_MAX_MEAN_ERROR
+        print(f"Radar table vs marching: mean {mean_err:.2f}px, p95 {p95_err:.2f}px, max {max_err:.2f}px "
+              f"(tolerance: mean <= {RADAR_TABLE_MAX_MEAN_ERROR:.2f}px) -> {'OK' if radar_check_passed else 'FAILED'}")
+        pygame.quit(); sys.exit(0 if radar_check_passed else 1)
+
+    if cli_args.replay:
+        run_replay(cli_args.replay, main_screen, main_clock)
+        pygame.quit(); sys.exit()
+    if cli_args.record and DISTRIBUTED_ADDRESS is not None: print("WARNING: --record is ignored with --distributed (trajectories stay on the workers).")
+    elif cli_args.record: trajectory_writer = TrajectoryWriter(cli_args.record, max(0, cli_args.record_top))
+
+    if cli_args.benchmark:
+        try: benchmark_passed = run_benchmark(config_neat_main, cli_args.bench_output, cli_args.bench_baseline, cli_args.bench_threshold)
+        except KeyboardInterrupt: print("Benchmark interrupted."); benchmark_passed = False
+        pygame.quit(); sys.exit(0 if benchmark_passed else 1)
+
+    if cli_args.sweep:
+        try: sweep_completed = run_sweep(cli_args.sweep, cli_args.sweep_output, max(0, cli_args.sweep_workers))
+        except (OSError, ValueError) as e: print(f"ERROR: Sweep failed: {e}"); sweep_completed = False
+        pygame.quit(); sys.exit(0 if sweep_completed else 1)
+
+    stats_reporter = StreamingStatsReporter(STATS_LOG_PATH)
     max_simulation_runs, current_simulation_run_count = 0, 0
     overall_best_genome_ever_across_runs, overall_highest_fitness_ever = None, -float('inf')
+    if CHECKPOINT_PATH and os.path.exists(CHECKPOINT_PATH) and not (cli_args.resume or cli_args.overwrite_checkpoint):
+        print(f"ERROR: '{CHECKPOINT_PATH}' holds an earlier training run. Continue it with --resume, start over with --overwrite-checkpoint, or pick another --checkpoint path.")
+        pygame.quit(); sys.exit(1)
+    checkpointer = TrainingCheckpointer(CHECKPOINT_PATH, BEST_GENOME_PATH) if CHECKPOINT_PATH or BEST_GENOME_PATH else None
+    resume_state = None
+    if cli_args.resume:
+        try: resume_state = read_checkpoint_file(CHECKPOINT_PATH, CHECKPOINT_MAGIC)
+        except (OSError, ValueError, pickle.UnpicklingError, zlib.error) as e: print(f"ERROR: Cannot resume from '{CHECKPOINT_PATH}': {e}"); pygame.quit(); sys.exit(1)
+        current_simulation_run_count, global_max_speed = resume_state["run"] - 1, resume_state["global_max_speed"]
+        overall_best_genome_ever_across_runs, overall_highest_fitness_ever = resume_state["overall_best_genome"], resume_state["overall_highest_fitness"]
+        stats_reporter.run = resume_state["run"] - 1; stats_reporter.window.extend(resume_state["stats_window"])
+        if checkpointer is not None: checkpointer.exported_fitness = max(checkpointer.exported_fitness, resume_state["exported_fitness"])
+    def current_run_state():
+        # The main loop's part of a checkpoint; simulation_globals_dict is already up to date when a generation ends
+        return {"run": current_simulation_run_count, "simulation_globals": dict(simulation_globals_dict), "global_max_speed": global_max_speed,
+                "overall_best_genome": overall_best_genome_ever_across_runs, "overall_highest_fitness": overall_highest_fitness_ever, "stats_window": list(stats_reporter.window)}
 
     while not user_quit_simulation and (max_simulation_runs==0 or current_simulation_run_count<max_simulation_runs):
         current_simulation_run_count+=1
         print(f"\n\n***** STARTING SIMULATION RUN #{current_simulation_run_count} *****\n")
-        population_main=neat.Population(config_neat_main); population_main.add_reporter(neat.StdOutReporter(True)); population_main.add_reporter(neat.StatisticsReporter())
-        simulation_globals_dict = {"current_generation_count": 0, "global_best_fitness": overall_highest_fitness_ever if overall_highest_fitness_ever > -float('inf') else 0.0}
+        if resume_state is not None:
+            population_main, simulation_globals_dict = restore_population(resume_state, config_neat_main), resume_state["simulation_globals"]
+            print(f"Resumed from '{CHECKPOINT_PATH}' at generation {population_main.generation}."); resume_state = None
+        else:
+            population_main = neat.Population(config_neat_main)
+            simulation_globals_dict = {"current_generation_count": 0, "global_best_fitness": overall_highest_fitness_ever if overall_highest_fitness_ever > -float('inf') else 0.0}
+        population_main.add_reporter(neat.StdOutReporter(True)); population_main.add_reporter(stats_reporter); stats_reporter.start_run()
+        if trajectory_writer is not None: trajectory_writer.run = current_simulation_run_count
+        if checkpointer is not None: population_main.add_reporter(checkpointer); checkpointer.watch(population_main, current_run_state)
         winner_genome_this_run=None
         try:
             max_generations_per_run_limit=100
-            winner_genome_this_run=population_main.run(lambda g, c: run_simulation(g, c, main_screen, main_clock, simulation_globals_dict), max_generations_per_run_limit)
+            winner_genome_this_run=population_main.run(lambda g, c: run_simulation(g, c, main_screen, main_clock, simulation_globals_dict), max_generations_per_run_limit - population_main.generation)
             run_actual_best_fitness = simulation_globals_dict["global_best_fitness"]
             if run_actual_best_fitness > overall_highest_fitness_ever:
                  overall_highest_fitness_ever = run_actual_best_fitness; best_genome_candidate = None
@@ -617,11 +3273,15 @@ if __name__=="__main__":
             if winner_genome_this_run: print(f"\nThreshold met for run #{current_simulation_run_count} (Fitness: {winner_genome_this_run.fitness:.2f}).")
             elif not user_quit_simulation: print(f"\nRun #{current_simulation_run_count} limit reached.")
             if overall_best_genome_ever_across_runs: print(f"Current Overall Best Fitness: {overall_highest_fitness_ever:.2f} (Genome: {overall_best_genome_ever_across_runs.key})")
-        except UserQuitException: print("User quit.");user_quit_simulation=True;break
+        except (UserQuitException, KeyboardInterrupt): print("User quit.");user_quit_simulation=True;break
         except (pygame.error, SystemExit) as e: print(f"System/Pygame error: {e}"); user_quit_simulation=True;break
         except Exception as general_err: import traceback; print(f"Unexpected error: {general_err}"); traceback.print_exc(); user_quit_simulation=True;break
         if user_quit_simulation:break
 
+    if checkpointer is not None:
+        if overall_best_genome_ever_across_runs and overall_highest_fitness_ever > checkpointer.exported_fitness: checkpointer.export_best(overall_best_genome_ever_across_runs, config_neat_main)
+        checkpointer.close()
+        if BEST_GENOME_PATH and checkpointer.exported_fitness > -float('inf'): print(f"Best genome (fitness {checkpointer.exported_fitness:.2f}) exported to '{BEST_GENOME_PATH}'.")
     if overall_best_genome_ever_across_runs: print(f"\n\n***** BEST OVERALL GENOME (Fitness: {overall_highest_fitness_ever:.2f}, ID: {overall_best_genome_ever_across_runs.key}) *****")
     elif not user_quit_simulation: print("\n\nNo genome met threshold or was noteworthy.")
     pygame.quit(); print("Pygame closed. Simulation ended."); sys.exit()
\ No newline at end of file